@@ -0,0 +1,258 @@
+### End-to-end benchmark of the pipeline ###
+# Runs every stage of the pipeline on a synthetic corpus of corpus_generator.py and records how it performs:
+    # generate -> writing the Cricsheet zips
+    # ingest -> cricsheet_ingest.ingest_to_store, parsing the zips into the Parquet match store
+    # load -> db_loader.load_all into an embedded SQLite database (tables, scorecards, rollups)
+    # queries -> every insight of insights.py with its default parameters, on SQLite and on DuckDB over
+    #            the match store, `--repeat` times each after a warm-up run (no result cache)
+    # eda -> the summaries of eda_data.py and the rendering of every chart of eda_visuals.py
+# Every stage runs in its own fresh process, so its peak memory is its own. The results (seconds,
+# throughput, latency percentiles, peak RSS) are written to a JSON file, and compared with a baseline
+# JSON of an earlier run when one is given : any metric worse than the baseline by more than
+# --threshold is reported as a regression and the script exits with status 1.
+
+# Tools used:
+    # corpus_generator -> the seeded synthetic corpus
+    # multiprocessing (spawn) -> one clean process per stage
+    # resource -> the peak RSS of a stage (not available on Windows, reported as null there)
+    # numpy -> the latency percentiles
+
+# Usage : python benchmark.py [--matches N] [--seasons N] [--teams N] [--players N] [--seed N]
+#                             [--repeat N] [--workers N] [--stages generate,ingest,load,queries,eda]
+#                             [--work-dir <directory>] [--output <results.json>]
+#                             [--baseline <baseline.json>] [--threshold 0.2]
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import corpus_generator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ["generate", "ingest", "load", "queries", "eda"]
+PERCENTILES = (50, 95, 99)
+DEFAULT_THRESHOLD = 0.20
+# metric -> True when a higher value is better #
+METRICS = {"seconds": False, "throughput": True, "peak_rss_mb": False,
+           "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of the worker processes it waited for, in MB."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on Linux, bytes on macOS #
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_stats(seconds):
+    """p50 / p95 / p99 latencies in milliseconds of a list of durations in seconds."""
+    if not seconds:
+        return {}
+    values = np.percentile(np.asarray(seconds) * 1000, PERCENTILES)
+    return {f"p{percentile}_ms": round(float(value), 3) for percentile, value in zip(PERCENTILES, values)}
+
+
+### The stages : each returns (items processed, unit of the items, details) ###
+def stage_generate(paths, config):
+    written = corpus_generator.generate(paths["corpus"], config["matches"], seasons=config["seasons"],
+                                        teams=config["teams"], players=config["players"], seed=config["seed"])
+    deliveries = sum(count for _, _, count in written.values())
+    return sum(matches for _, matches, _ in written.values()), "matches", {"deliveries": deliveries}
+
+
+def stage_ingest(paths, config):
+    import cricsheet_ingest
+    written = cricsheet_ingest.ingest_to_store(paths["corpus"], paths["store"], config["workers"], full=True)
+    return sum(written.values()), "deliveries", {"deliveries_by_format": written}
+
+
+def stage_load(paths, config):
+    import db_loader
+    if os.path.exists(paths["sqlite"]):
+        os.remove(paths["sqlite"])
+    conn = sqlite3.connect(paths["sqlite"])
+    try:
+        loaded = db_loader.load_all(conn, paths["store"], full=True)
+    finally:
+        conn.close()
+    return sum(loaded.values()), "rows", {"rows_by_table": loaded}
+
+
+def _time_insights(backend, repeat):
+    """{insight: [seconds of every run]} of every insight, after one warm-up run each."""
+    import insights
+    timings = {}
+    conn = backend.connect()
+    try:
+        for name, insight in insights.queries_for("wide").items():
+            sql, params = insight.compile(placeholder=backend.placeholder)
+            backend.run(conn, sql, params)
+            timings[name] = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                backend.run(conn, sql, params)
+                timings[name].append(time.perf_counter() - start)
+    finally:
+        backend.close(conn)
+    return timings
+
+
+def stage_queries(paths, config):
+    import query_backends
+    backends = {"sqlite": query_backends.SQLiteBackend(paths["sqlite"]),
+                "duckdb": query_backends.DuckDBBackend(paths["store"])}
+    runs = []
+    details = {}
+    for name, backend in backends.items():
+        timings = _time_insights(backend, config["repeat"])
+        details[name] = {insight: latency_stats(seconds) for insight, seconds in timings.items()}
+        runs.extend(seconds for insight_runs in timings.values() for seconds in insight_runs)
+    return len(runs), "queries", {"latencies": runs, "insights": details}
+
+
+def stage_eda(paths, config):
+    import eda_data
+    import eda_visuals
+    # the charts are rendered into the benchmark directory, never into the configured data directory #
+    eda_visuals.store_dir = paths["store"]
+    eda_visuals.data_dir = paths["charts"]
+    os.makedirs(paths["charts"], exist_ok=True)
+    shutil.rmtree(os.path.join(paths["store"], eda_data.SUMMARY_DIR), ignore_errors=True)
+    start = time.perf_counter()
+    summaries = eda_data.SummaryCache(paths["store"], eda_visuals.CHART_SUMMARIES).load()
+    summary_seconds = time.perf_counter() - start
+    runs = {}
+    for file_name in eda_visuals.CHARTS:
+        start = time.perf_counter()
+        eda_visuals.render_chart(file_name, summaries)
+        runs[file_name] = time.perf_counter() - start
+    return len(runs), "charts", {"latencies": list(runs.values()), "summary_seconds": round(summary_seconds, 4),
+                                 "charts": {file_name: round(seconds * 1000, 3) for file_name, seconds in runs.items()}}
+
+
+STAGE_FUNCTIONS = {"generate": stage_generate, "ingest": stage_ingest, "load": stage_load,
+                   "queries": stage_queries, "eda": stage_eda}
+
+
+def measure(stage, paths, config):
+    """Runs one stage (in the worker process) and returns its metrics. The output of the stage is discarded."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        items, unit, details = STAGE_FUNCTIONS[stage](paths, config)
+    seconds = time.perf_counter() - start
+    metrics = {"seconds": round(seconds, 4), "items": items, "unit": unit,
+               "throughput": round(items / seconds, 3) if seconds else None, "peak_rss_mb": peak_rss_mb()}
+    metrics.update(latency_stats(details.pop("latencies", [])))
+    metrics.update(details)
+    return metrics
+
+
+def run_stage(stage, paths, config):
+    """Runs one stage in a fresh spawned process, so imports, caches and peak memory start from scratch."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as worker:
+        return worker.submit(measure, stage, paths, config).result()
+
+
+### Baseline comparison ###
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """The metrics of results worse than the baseline by more than threshold (a fraction),
+    as (stage, metric, baseline value, current value, relative change) tuples."""
+    regressions = []
+    for stage, metrics in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            before, after = previous.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((stage, metric, before, after, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the pipeline on a synthetic corpus.")
+    parser.add_argument("--matches", type=int, default=100, help="matches per format of the synthetic corpus")
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--teams", type=int, default=10)
+    parser.add_argument("--players", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of every insight")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes of the ingest stage")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated stages to run, in pipeline order")
+    parser.add_argument("--work-dir", help="directory of the corpus, store and database (a temporary one by default)")
+    parser.add_argument("--output", default="benchmark_results.json", help="file the results are written to")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative change counted as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages {', '.join(unknown)}, expected {', '.join(STAGES)}")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+
+    config = {"matches": args.matches, "seasons": args.seasons, "teams": args.teams, "players": args.players,
+              "seed": args.seed, "repeat": args.repeat, "workers": args.workers}
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="cric_benchmark_")
+    paths = {"corpus": os.path.join(work_dir, "corpus"), "store": os.path.join(work_dir, "match_store"),
+             "sqlite": os.path.join(work_dir, "cricket.db"), "charts": os.path.join(work_dir, "charts")}
+
+    results = {"config": config, "python": platform.python_version(), "platform": platform.platform(),
+               "cpus": os.cpu_count(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+    try:
+        for stage in [stage for stage in STAGES if stage in stages]:
+            metrics = run_stage(stage, paths, config)
+            results["stages"][stage] = metrics
+            latency = f", p95 {metrics['p95_ms']:.1f} ms" if "p95_ms" in metrics else ""
+            memory = f", peak {metrics['peak_rss_mb']:.0f} MB" if metrics["peak_rss_mb"] is not None else ""
+            print(f"{stage:>8}: {metrics['seconds']:8.2f}s  {metrics['items']} {metrics['unit']} "
+                  f"({metrics['throughput']:,.1f}/s{latency}{memory})")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"Results written to {args.output}.")
+
+    if baseline is None:
+        return 0
+    if baseline.get("config") != config:
+        print("Warning: the baseline was recorded with a different configuration, the comparison may not be meaningful.")
+    regressions = compare(results, baseline, args.threshold)
+    for stage, metric, before, after, change in regressions:
+        print(f"REGRESSION {stage}.{metric}: {before} -> {after} ({change:+.1%})")
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%} against {args.baseline}.")
+        return 1
+    print(f"No regression beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
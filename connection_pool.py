@@ -0,0 +1,136 @@
+### Connection pool of the insights app ###
+# Streamlit reruns the whole script on every widget change, opening (and closing) a connection per
+# rerun makes the connection setup dominate the cheap insights. The pool keeps up to `size`
+# connections of a query backend open and shares them across reruns and sessions:
+    # a connection is health checked (backend.ping) when it is handed out and reopened if it went away
+    # a caller waits at most `timeout` seconds for a free connection before PoolTimeout is raised,
+    # so many simultaneous users queue up instead of hitting the server's connection limit
+    # the time spent waiting is measured and reported by stats()
+
+# Tools used:
+    # queue / threading -> the idle connections and the bookkeeping shared by the sessions
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_TIMEOUT = 10.0  # seconds a caller waits for a free connection
+
+
+class PoolTimeout(Exception):
+    """No connection was freed within the pool timeout."""
+
+
+class ConnectionPool:
+    """A bounded pool of connections of one query backend (see query_backends.py)."""
+
+    def __init__(self, backend, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()  # the most recently used connection is the least likely to have timed out
+        self.opened = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.reconnects = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        try:
+            return self.backend.connect()
+        except BaseException:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    def acquire(self):
+        """Hands out a healthy connection, opening one while the pool is not full and waiting for
+        one otherwise. Returns (connection, seconds waited)."""
+        start = time.perf_counter()
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                conn = self._open()
+            else:
+                try:
+                    conn = self.idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No free {self.backend.name} connection within {self.timeout:g}s "
+                                      f"(pool size {self.size}).") from None
+        waited = time.perf_counter() - start
+
+        if not self.backend.ping(conn):
+            try:
+                self.backend.close(conn)
+            except self.backend.errors:
+                pass  # it is already gone
+            conn = self._open()
+            with self.lock:
+                self.reconnects += 1
+
+        with self.lock:
+            self.checkouts += 1
+            if waited > 0.001:
+                self.waits += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn, waited
+
+    def release(self, conn):
+        """Gives a connection back to the pool."""
+        self.idle.put(conn)
+
+    def discard(self, conn):
+        """Closes a broken connection instead of giving it back, freeing its slot."""
+        try:
+            self.backend.close(conn)
+        except self.backend.errors:
+            pass
+        with self.lock:
+            self.opened -= 1
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as (conn, waited) : released afterwards, discarded on a backend error."""
+        conn, waited = self.acquire()
+        try:
+            yield conn, waited
+        except self.backend.errors:
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": self.size,
+                "open": self.opened,
+                "idle": self.idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": 1000 * self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": 1000 * self.wait_max,
+                "reconnects": self.reconnects,
+            }
+
+    def close(self):
+        """Closes the idle connections."""
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(conn)
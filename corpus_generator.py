@@ -0,0 +1,215 @@
+### Synthetic Cricsheet corpus generator ###
+# Writes tests_json.zip / odis_json.zip / t20s_json.zip / ipl_json.zip files in the Cricsheet JSON
+# format (the same layout cricsheet_ingest.py reads from the Cricsheet.org downloads), at any scale:
+    # --matches matches per format over --seasons seasons, between --teams teams of --players players
+    # innings follow the format : up to 4 innings of up to 90 overs for Tests, 50 overs for ODIs and
+    # 20 overs for T20s / IPL, an innings ends after 10 wickets (or when the chase is won)
+    # deliveries have realistic runs, extras (wides, no balls, byes, leg byes) and wickets (bowled,
+    # caught, lbw, run out, ...), matches have a toss, a venue / city, an outcome and a player of the match
+    # the output only depends on --seed, so a benchmark corpus can be regenerated anywhere
+
+# Tools used:
+    # random -> the seeded generator
+    # json / zipfile -> the Cricsheet files
+
+# Usage : python corpus_generator.py --output-dir <directory> [--matches N] [--formats Test,ODI,T20,IPL]
+#                                    [--seasons N] [--teams N] [--players N] [--seed N]
+
+import argparse
+import json
+import os
+import random
+import sys
+import zipfile
+
+# format -> (zip file, innings per match, overs per innings, first season) #
+FORMATS = {
+    "Test": ("tests_json.zip", 4, 90, 1990),
+    "ODI": ("odis_json.zip", 2, 50, 2000),
+    "T20": ("t20s_json.zip", 2, 20, 2006),
+    "IPL": ("ipl_json.zip", 2, 20, 2008),
+}
+MATCH_TYPES = {"Test": "Test", "ODI": "ODI", "T20": "T20", "IPL": "T20"}  # an IPL match is a T20 match
+
+COUNTRIES = ["India", "Australia", "England", "Pakistan", "South Africa", "New Zealand", "Sri Lanka",
+             "West Indies", "Bangladesh", "Afghanistan", "Zimbabwe", "Ireland"]
+FRANCHISES = ["Mumbai Indians", "Chennai Super Kings", "Royal Challengers Bangalore", "Kolkata Knight Riders",
+              "Delhi Capitals", "Rajasthan Royals", "Punjab Kings", "Sunrisers Hyderabad",
+              "Gujarat Titans", "Lucknow Super Giants"]
+GROUNDS = [("Wankhede Stadium", "Mumbai"), ("Eden Gardens", "Kolkata"), ("M Chinnaswamy Stadium", "Bengaluru"),
+           ("Melbourne Cricket Ground", "Melbourne"), ("Sydney Cricket Ground", "Sydney"), ("Lord's", "London"),
+           ("The Oval", "London"), ("Old Trafford", "Manchester"), ("Newlands", "Cape Town"),
+           ("Eden Park", "Auckland"), ("R Premadasa Stadium", "Colombo"), ("Kensington Oval", "Bridgetown"),
+           ("Gaddafi Stadium", "Lahore"), ("Shere Bangla National Stadium", "Dhaka"), ("Dubai International Stadium", None)]
+
+# runs off the bat of a legal delivery, weighted as in real scorecards #
+BAT_RUNS = [0, 1, 2, 3, 4, 6]
+BAT_WEIGHTS = {"Test": [58, 26, 6, 1, 8, 1], "ODI": [48, 33, 7, 1, 9, 2], "T20": [38, 36, 8, 1, 12, 5]}
+WICKET_KINDS = ["caught", "bowled", "lbw", "run out", "stumped", "caught and bowled"]
+WICKET_WEIGHTS = [58, 18, 13, 6, 3, 2]
+WICKET_RATE = {"Test": 0.018, "ODI": 0.025, "T20": 0.045}
+
+
+class CorpusGenerator:
+    """Generates Cricsheet matches from a seeded random generator."""
+
+    def __init__(self, seasons=10, teams=10, players=15, seed=42):
+        self.random = random.Random(seed)
+        self.seasons = seasons
+        self.team_count = teams
+        self.players = players
+        self.next_id = 1_000_000
+
+    def teams(self, match_format):
+        names = FRANCHISES if match_format == "IPL" else COUNTRIES
+        names = [names[i % len(names)] + ("" if i < len(names) else f" {i // len(names) + 1}") for i in range(self.team_count)]
+        return names
+
+    def squad(self, team):
+        initials = "".join(word[0] for word in team.split())
+        return [f"{initials} Player{number}" for number in range(1, self.players + 1)]
+
+    def season(self, match_format):
+        first = FORMATS[match_format][3]
+        year = first + self.random.randrange(self.seasons)
+        # Test and ODI seasons south of the equator span two years, as in Cricsheet #
+        if match_format in ("Test", "ODI") and self.random.random() < 0.3:
+            return f"{year}/{(year + 1) % 100:02d}"
+        return year if match_format != "IPL" else str(year)
+
+    def innings(self, match_format, batting, bowling, overs, target=None):
+        """One innings : overs of deliveries until the overs run out, 10 wickets fall or the target is passed."""
+        rules = "Test" if match_format == "Test" else ("ODI" if match_format == "ODI" else "T20")
+        batters = self.squad(batting)[:11]
+        bowlers = self.squad(bowling)[6:11]
+        striker, non_striker, next_batter = 0, 1, 2
+        wickets = total = 0
+        over_list = []
+        for over_number in range(overs):
+            bowler = bowlers[over_number % len(bowlers)]
+            deliveries = []
+            legal = 0
+            while legal < 6:
+                delivery = {"batter": batters[striker], "bowler": bowler, "non_striker": batters[non_striker]}
+                extra_roll = self.random.random()
+                if extra_roll < 0.03:
+                    runs, extras = 0, {"wides": 1}
+                elif extra_roll < 0.04:
+                    runs, extras = self.random.choices(BAT_RUNS, BAT_WEIGHTS[rules])[0], {"noballs": 1}
+                elif extra_roll < 0.055:
+                    runs, extras = 0, {self.random.choice(["byes", "legbyes"]): self.random.choice([1, 1, 2, 4])}
+                else:
+                    runs, extras = self.random.choices(BAT_RUNS, BAT_WEIGHTS[rules])[0], {}
+                extra_runs = sum(extras.values())
+                delivery["runs"] = {"batter": runs, "extras": extra_runs, "total": runs + extra_runs}
+                if extras:
+                    delivery["extras"] = extras
+                if "wides" not in extras and "noballs" not in extras:
+                    legal += 1
+                    if self.random.random() < WICKET_RATE[rules]:
+                        kind = self.random.choices(WICKET_KINDS, WICKET_WEIGHTS)[0]
+                        wicket = {"player_out": batters[striker], "kind": kind}
+                        if kind in ("caught", "run out", "stumped"):
+                            wicket["fielders"] = [{"name": self.random.choice(self.squad(bowling)[:11])}]
+                        delivery["wickets"] = [wicket]
+                        wickets += 1
+                        striker = next_batter
+                        next_batter += 1
+                total += runs + extra_runs
+                if runs % 2:
+                    striker, non_striker = non_striker, striker
+                deliveries.append(delivery)
+                if wickets == 10 or (target is not None and total > target):
+                    break
+            over_list.append({"over": over_number, "deliveries": deliveries})
+            striker, non_striker = non_striker, striker
+            if wickets == 10 or (target is not None and total > target):
+                break
+        return {"team": batting, "overs": over_list}, total
+
+    def match(self, match_format):
+        """Returns (match id, Cricsheet match JSON) of one generated match."""
+        _, innings_count, overs, _ = FORMATS[match_format]
+        team1, team2 = self.random.sample(self.teams(match_format), 2)
+        toss_winner = self.random.choice([team1, team2])
+        decision = self.random.choice(["bat", "field"])
+        batting_first = toss_winner if decision == "bat" else (team2 if toss_winner == team1 else team1)
+        order = [batting_first, team2 if batting_first == team1 else team1]
+
+        innings = []
+        scores = {team1: 0, team2: 0}
+        for number in range(innings_count):
+            batting = order[number % 2]
+            bowling = order[(number + 1) % 2]
+            target = None
+            if number == innings_count - 1:
+                target = scores[bowling] - scores[batting]
+                if target < 0:  # already beaten by an innings
+                    break
+            inning, runs = self.innings(match_format, batting, bowling, overs, target)
+            innings.append(inning)
+            scores[batting] += runs
+
+        venue, city = self.random.choice(GROUNDS)
+        info = {
+            "match_type": MATCH_TYPES[match_format],
+            "season": self.season(match_format),
+            "gender": "male",
+            "overs": overs,
+            "teams": [team1, team2],
+            "venue": venue,
+            "toss": {"winner": toss_winner, "decision": decision},
+            "players": {team: self.squad(team)[:11] for team in (team1, team2)},
+        }
+        if city:
+            info["city"] = city
+        if scores[team1] == scores[team2] or (match_format == "Test" and self.random.random() < 0.25):
+            info["outcome"] = {"result": "draw" if match_format == "Test" else "tie"}
+        else:
+            winner = team1 if scores[team1] > scores[team2] else team2
+            info["outcome"] = {"winner": winner, "by": {"runs": abs(scores[team1] - scores[team2])}}
+            info["player_of_match"] = [self.random.choice(self.squad(winner)[:11])]
+        self.next_id += 1
+        return str(self.next_id), {"meta": {"data_version": "1.1.0", "revision": 1}, "info": info, "innings": innings}
+
+
+def generate(output_dir, matches=100, formats=tuple(FORMATS), seasons=10, teams=10, players=15, seed=42):
+    """Writes one Cricsheet zip per format into output_dir. Returns {format: (zip path, matches, deliveries)}."""
+    os.makedirs(output_dir, exist_ok=True)
+    generator = CorpusGenerator(seasons, teams, players, seed)
+    written = {}
+    for match_format in formats:
+        path = os.path.join(output_dir, FORMATS[match_format][0])
+        deliveries = 0
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            for _ in range(matches):
+                match_id, match = generator.match(match_format)
+                deliveries += sum(len(over["deliveries"]) for inning in match["innings"] for over in inning["overs"])
+                zip_ref.writestr(f"{match_id}.json", json.dumps(match))
+        written[match_format] = (path, matches, deliveries)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Cricsheet-format JSON zips of synthetic matches.")
+    parser.add_argument("--output-dir", required=True, help="directory the zip files are written to")
+    parser.add_argument("--matches", type=int, default=100, help="matches per format")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma separated formats to generate")
+    parser.add_argument("--seasons", type=int, default=10, help="number of seasons the matches are spread over")
+    parser.add_argument("--teams", type=int, default=10, help="teams per format")
+    parser.add_argument("--players", type=int, default=15, help="players per team")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    formats = [match_format.strip() for match_format in args.formats.split(",") if match_format.strip()]
+    unknown = [match_format for match_format in formats if match_format not in FORMATS]
+    if unknown:
+        parser.error(f"unknown formats {', '.join(unknown)}, expected {', '.join(FORMATS)}")
+    for match_format, (path, matches, deliveries) in generate(args.output_dir, args.matches, formats, args.seasons,
+                                                              args.teams, args.players, args.seed).items():
+        print(f"{matches} {match_format} matches ({deliveries} deliveries) written to {path}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,282 +1,265 @@
+import io
+import os
+import tempfile
+import time
 import streamlit as st
 import pandas as pd
-import mysql.connector
+import connection_pool
+import insight_report
+import insights
+import query_backends
+import query_profiler
+import result_cache
 
 # --- Database Credentials (Using Streamlit Secrets for security reasons)
+# DB_BACKEND picks the engine answering the insights (see query_backends.py):
+#   "mysql"  -> the MySQL server (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+#   "duckdb" -> in-process DuckDB over the Parquet match store (STORE_DIR), no server needed
+#   "sqlite" -> a local SQLite file loaded with db_loader.py --sqlite (SQLITE_PATH), no server needed
 
-DB_HOST = st.secrets["DB_HOST"]
-DB_USER = st.secrets["DB_USER"]
-DB_PASSWORD = st.secrets["DB_PASSWORD"]
-DB_NAME = st.secrets["DB_NAME"]
+DB_BACKEND = st.secrets.get("DB_BACKEND", "mysql")
 
-# 20 insightful queries that gets executed when streamlit runs #
-sql_queries = {
-    "Top 10 batsmen by total runs in ODI matches": """
-        SELECT batter, SUM(runs_batter) AS total_runs
-        FROM odi_matches
-        GROUP BY batter
-        ORDER BY total_runs DESC
-        LIMIT 10;
-    """,
-    "Leading wicket-takers in T20 matches": """
-        SELECT bowler, COUNT(wicket) AS total_wickets
-        FROM t20_matches
-        WHERE wicket IS NOT NULL AND wicket <> 'None'
-        GROUP BY bowler
-        ORDER BY total_wickets DESC
-        LIMIT 10;
-    """,
-    "Team with the highest win percentage in Test cricket": """
-        WITH TestResults AS (
-            SELECT winner, COUNT(*) AS wins
-            FROM test_matches
-            WHERE winner IS NOT NULL AND winner <> 'draw'
-            GROUP BY winner
-        ),
-        TotalTestMatches AS (
-            SELECT team, COUNT(*) AS total_matches
-            FROM (
-                SELECT SUBSTRING_INDEX(teams, ', ', 1) AS team FROM test_matches
-                UNION ALL
-                SELECT SUBSTRING_INDEX(teams, ', ', -1) AS team FROM test_matches
-            ) AS all_teams
-            GROUP BY team
-        )
-        SELECT
-            tr.winner AS team,
-            (CAST(tr.wins AS DECIMAL) / tm.total_matches) * 100 AS win_percentage
-        FROM TestResults tr
-        JOIN TotalTestMatches tm ON tr.winner = tm.team
-        ORDER BY win_percentage DESC
-        LIMIT 1;
-    """,
-    "Total number of centuries across all match types (Simplified)": """
-        SELECT match_type, batter, COUNT(*) AS centuries
-        FROM (
-            SELECT match_type, batter, SUM(runs_batter) AS inning_runs
-            FROM (
-                SELECT 'test' AS match_type, batter, SUM(runs_batter) AS runs_batter FROM test_matches GROUP BY match_type, batter
-                UNION ALL
-                SELECT 'odi' AS match_type, batter, SUM(runs_batter) AS runs_batter FROM odi_matches GROUP BY match_type, batter
-                UNION ALL
-                SELECT 't20' AS match_type, batter, SUM(runs_batter) AS runs_batter FROM t20_matches GROUP BY match_type, batter
-                UNION ALL
-                SELECT 'ipl' AS match_type, batter, SUM(runs_batter) AS runs_batter FROM ipl_matches GROUP BY match_type, batter
-            ) AS all_runs_by_batter
-            GROUP BY match_type, batter
-            HAVING SUM(runs_batter) >= 100
-        ) AS centuries_table
-        GROUP BY match_type, batter
-        ORDER BY centuries DESC;
-    """,
-    "Most frequent player of the match across all formats": """
-        SELECT player_of_match, COUNT(*) AS count
-        FROM (
-            SELECT player_of_match FROM test_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT player_of_match FROM odi_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT player_of_match FROM t20_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT player_of_match FROM ipl_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-        ) AS all_pom
-        GROUP BY player_of_match
-        ORDER BY count DESC
-        LIMIT 1;
-    """,
-    "Bowlers with the best average in ODI (min 50 wickets)": """
-        SELECT
-            bowler,
-            SUM(runs_total) AS runs_conceded,
-            COUNT(CASE WHEN wicket IS NOT NULL AND wicket <> 'None' THEN 1 END) AS wickets_taken,
-            CAST(SUM(runs_total) AS DECIMAL) / COUNT(CASE WHEN wicket IS NOT NULL AND wicket <> 'None' THEN 1 END) AS bowling_average
-        FROM odi_matches
-        GROUP BY bowler
-        HAVING COUNT(CASE WHEN wicket IS NOT NULL AND wicket <> 'None' THEN 1 END) >= 50
-        ORDER BY bowling_average ASC
-        LIMIT 10;
-    """,
-    "Most common venue for IPL matches": """
-        SELECT venue, COUNT(*) AS match_count
-        FROM ipl_matches
-        GROUP BY venue
-        ORDER BY match_count DESC
-        LIMIT 1;
-    """,
-    "Teams that have won the most tosses in Test matches": """
-        SELECT toss_winner, COUNT(*) AS tosses_won
-        FROM test_matches
-        GROUP BY toss_winner
-        ORDER BY tosses_won DESC
-        LIMIT 5;
-    """,
-    "Most frequent toss decision in ODI matches": """
-        SELECT toss_decision, COUNT(*) AS decision_count
-        FROM odi_matches
-        GROUP BY toss_decision
-        ORDER BY decision_count DESC
-        LIMIT 1;
-    """,
-    "Number of matches played in each season across all formats": """
-        SELECT season, match_type, COUNT(*) AS matches_played
-        FROM (
-            SELECT season, 'test' AS match_type FROM test_matches
-            UNION ALL
-            SELECT season, 'odi' AS match_type FROM odi_matches
-            UNION ALL
-            SELECT season, 't20' AS match_type FROM t20_matches
-            UNION ALL
-            SELECT season, 'ipl' AS match_type FROM ipl_matches
-        ) AS all_matches
-        GROUP BY season, match_type
-        ORDER BY season, match_type;
-    """,
-    "City with the most number of cricket matches": """
-        SELECT city, COUNT(*) AS match_count
-        FROM (
-            SELECT city FROM test_matches WHERE city IS NOT NULL
-            UNION ALL
-            SELECT city FROM odi_matches WHERE city IS NOT NULL
-            UNION ALL
-            SELECT city FROM t20_matches WHERE city IS NOT NULL
-            UNION ALL
-            SELECT city FROM ipl_matches WHERE city IS NOT NULL
-        ) AS all_matches
-        GROUP BY city
-        ORDER BY match_count DESC
-        LIMIT 1;
-    """,
-    "Teams that have won after losing the toss in T20 matches": """
-        SELECT winner, COUNT(*) AS wins_after_losing_toss
-        FROM t20_matches
-        WHERE toss_winner <> winner
-        GROUP BY winner
-        ORDER BY wins_after_losing_toss DESC;
-    """,
-    "Average runs scored per over in IPL matches": """
-        SELECT
-            CAST(SUM(runs_total) AS DECIMAL) / SUM(over + 1) AS average_runs_per_over
-        FROM ipl_matches;
-    """,
-    "Players who have been player of the match in the most number of seasons": """
-        SELECT player_of_match, COUNT(DISTINCT season) AS seasons_as_pom
-        FROM (
-            SELECT season, player_of_match FROM test_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT season, player_of_match FROM odi_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT season, player_of_match FROM t20_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-            UNION ALL
-            SELECT season, player_of_match FROM ipl_matches WHERE player_of_match IS NOT NULL AND player_of_match <> ''
-        ) AS all_pom_seasons
-        GROUP BY player_of_match
-        ORDER BY seasons_as_pom DESC
-        LIMIT 10;
-    """,
-    "Number of drawn matches in Test cricket": """
-        SELECT COUNT(*) AS drawn_matches
-        FROM test_matches
-        WHERE winner = 'draw';
-    """,
-    "Top 5 batsmen with most runs in IPL": """
-        SELECT batter, SUM(runs_batter) AS total_runs
-        FROM ipl_matches
-        GROUP BY batter
-        ORDER BY total_runs DESC
-        LIMIT 5;
-    """,
-    "Top 5 bowlers with most wickets in IPL": """
-        SELECT bowler, COUNT(wicket) AS total_wickets
-        FROM ipl_matches
-        WHERE wicket IS NOT NULL AND wicket <> 'None'
-        GROUP BY bowler
-        ORDER BY total_wickets DESC
-        LIMIT 5;
-    """,
-    "Match with the highest total runs scored (across all formats)": """
-        SELECT
-            match_type,
-            GROUP_CONCAT(DISTINCT season) AS seasons,
-            GROUP_CONCAT(DISTINCT teams) AS teams,
-            SUM(runs_total) AS total_runs
-        FROM (
-            SELECT 'test' AS match_type, season, teams, runs_total FROM test_matches
-            UNION ALL
-            SELECT 'odi' AS match_type, season, teams, runs_total FROM odi_matches
-            UNION ALL
-            SELECT 't20' AS match_type, season, teams, runs_total FROM t20_matches
-            UNION ALL
-            SELECT 'ipl' AS match_type, season, teams, runs_total FROM ipl_matches
-        ) AS all_match_runs
-        GROUP BY match_type, season, teams
-        ORDER BY total_runs DESC
-        LIMIT 1;
-    """,
-    "Venue with the most number of Test matches": """
-        SELECT venue, COUNT(*) AS match_count
-        FROM test_matches
-        GROUP BY venue
-        ORDER BY match_count DESC
-        LIMIT 1;
-    """,
-    "Batsman with the highest individual score in ODI (This requires more specific data about individual match scores)": """
-        -- This query is a simplification and assumes 'runs_batter' in a row might represent a significant portion of an individual score in a match.
-        -- A more accurate approach would require data at the innings/player level per match.
-        SELECT batter, MAX(runs_batter) AS highest_score
-        FROM odi_matches
-        GROUP BY batter
-        ORDER BY highest_score DESC
-        LIMIT 1;
-    """,
-}
+# One backend per app process : the pool and every rerun share it (and its prepared statements) #
+@st.cache_resource
+def get_backend():
+    return query_backends.get_backend(DB_BACKEND, st.secrets)
 
-### MYSQL database connection
+backend = get_backend()
+DB_SCHEMA = st.secrets.get("DB_SCHEMA", "wide") # "star" -> query the normalized star schema of star_schema.py
+
+# The parameterized insights that gets executed when streamlit runs (see insights.py) #
+# DB_SCHEMA = "star" in secrets.toml runs the fixed insights of the normalized star schema #
+sql_queries = insights.queries_for(DB_SCHEMA)
+
+# Results are cached until the loader writes a new data version (see result_cache.py):
+#   RESULT_CACHE_SIZE -> results kept in memory (LRU), RESULT_CACHE_DIR -> optional on-disk tier
+@st.cache_resource
+def get_result_cache():
+    return result_cache.ResultCache(max_entries=int(st.secrets.get("RESULT_CACHE_SIZE", result_cache.DEFAULT_MAX_ENTRIES)),
+                                    disk_dir=st.secrets.get("RESULT_CACHE_DIR"))
+
+# One pool of connections per app process, reused across reruns and sessions (see connection_pool.py):
+#   DB_POOL_SIZE -> connections kept open, DB_POOL_TIMEOUT -> seconds a session waits for a free one
+#   QUERY_TIMEOUT -> seconds after which a query is aborted
+@st.cache_resource
+def get_pool():
+    return connection_pool.ConnectionPool(backend,
+                                          size=int(st.secrets.get("DB_POOL_SIZE", connection_pool.DEFAULT_POOL_SIZE)),
+                                          timeout=float(st.secrets.get("DB_POOL_TIMEOUT", connection_pool.DEFAULT_TIMEOUT)))
+
+# Every query is profiled (see query_profiler.py) and logged as a JSON line:
+#   QUERY_LOG -> file the query log is appended to (standard error by default)
+#   QUERY_METRICS_FILE -> optional Prometheus textfile rewritten after every query
+#   LATENCY_HISTORY_RUNS -> runs of every insight kept for the latency history (100 by default)
+@st.cache_resource
+def get_history():
+    query_profiler.configure_logging(st.secrets.get("QUERY_LOG"))
+    return query_profiler.LatencyHistory(int(st.secrets.get("LATENCY_HISTORY_RUNS", query_profiler.DEFAULT_MAX_RUNS)))
+
+### Database connection (MySQL server or embedded engine, depending on DB_BACKEND), taken from the pool
+# The {stage: seconds} of getting it (pool wait, checkout with the health check) are kept for the diagnostics.
 def connect_db():
+    start = time.perf_counter()
     try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-    except mysql.connector.Error as err:
-        st.error(f"Error connecting to MySQL: {err}")
-        return None
+        conn, waited = get_pool().acquire()
+    except (connection_pool.PoolTimeout,) + backend.errors as err:
+        st.error(f"Error connecting to {backend.name}: {err}")
+        return None, 0.0
+    st.session_state.connect_stages = {"pool wait": waited, "checkout": time.perf_counter() - start - waited}
+    return conn, waited
 
-### Executes the SQL query and returns the result as a pandas DataFrame.
-def run_query(conn, query):
+### Executes the SQL query with its bound parameter values, returns the result as a pandas DataFrame and its
+### profile (query_profiler.QueryProfile, with the plan when the diagnostics are shown), recorded under name.
+def run_query(conn, query, params=None, name=None, connect=None):
     if conn:
         try:
-            df = pd.read_sql(query, conn)
-            return df
-        except mysql.connector.Error as err:
+            result, profile = query_profiler.profile_query(backend, conn, query, params, get_result_cache(), name,
+                                                           connect, explain=st.session_state.get("diagnostics", False))
+        except backend.errors as err:
             st.error(f"Error executing query: {err}")
-            return None
-    return None
+            return None, None
+        query_profiler.log_profile(profile)
+        history = get_history()
+        history.record(profile)
+        if st.secrets.get("QUERY_METRICS_FILE"):
+            history.write_metrics(st.secrets["QUERY_METRICS_FILE"])
+        return result, profile
+    return None, None
+
+### The choices of a season / team / venue / player filter, read from the rollups (and cached like the insights)
+def filter_options(conn, kind):
+    df, _ = run_query(conn, insights.OPTIONS_SQL[kind], name=f"Filter options: {kind}")
+    return [] if df is None else df.iloc[:, 0].astype(str).tolist()
+
+### One widget per insight parameter, returns the {name: value} picked by the user
+def parameter_widgets(conn, query_name, insight):
+    values = {}
+    for param in insight.params:
+        key = f"{query_name}:{param.name}"
+        if param.kind == "int":
+            values[param.name] = st.number_input(param.label, min_value=param.minimum, max_value=param.maximum,
+                                                 value=param.default, step=1, key=key)
+            continue
+        if param.kind == "format":
+            options = list(insights.FORMATS)
+        else:
+            options = filter_options(conn, param.kind)
+        if param.default is None:
+            options = [insights.ALL] + options
+        values[param.name] = st.selectbox(param.label, options,
+                                          index=options.index(param.default) if param.default in options else 0,
+                                          key=key)
+    return values
+
+### Runs every insight (default parameters) on pooled connections, showing each result as it completes.
+#   REPORT_WORKERS -> insights run at the same time (4 by default, bounded by the pool)
+# This session already holds conn, one connection of the pool : with no other one to spare (DB_POOL_SIZE = 1)
+# the insights run one after the other on conn instead of waiting for a connection that never frees up.
+def run_report(conn):
+    pool = get_pool()
+    workers = min(int(st.secrets.get("REPORT_WORKERS", insight_report.DEFAULT_WORKERS)), pool.size - 1)
+    if workers < 1:
+        items = insight_report.run_on(backend, conn, sql_queries, get_result_cache())
+    else:
+        items = insight_report.run_all(pool, sql_queries, workers, get_result_cache())
+    progress = st.progress(0.0, text="Running the insights...")
+    results = {}
+    for item in items:
+        results[item.name] = item
+        progress.progress(len(results) / len(sql_queries), text=f"{len(results)}/{len(sql_queries)} insights done")
+        st.subheader(item.name)
+        if item.result is None:
+            st.error(f"Error executing query: {item.error}")
+        elif item.result.empty:
+            st.info("No results found for this query.")
+        else:
+            st.dataframe(item.result)
+        st.caption(f"{item.seconds * 1000:.1f} ms")
+
+    # the whole set, in the order of the insight picker, as a single file #
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cricket_insights.html")
+        insight_report.export([results[name] for name in sql_queries], path)
+        with open(path, "rb") as fh:
+            report = fh.read()
+    st.download_button("Download the report", report, file_name="cricket_insights.html", mime="text/html")
+
+### Results are read one page at a time : keyset pagination when the insight orders on a unique key, OFFSET otherwise
+### (see insights.page). Either way the database computes the whole result, only the page is transferred.
+PAGE_SIZES = [25, 50, 100, 500]
+
+### The full result as CSV bytes, read in chunks on the session's own connection. Streamlit serves a download
+### from memory, so it is only built when asked for and kept in the session until another query is picked.
+def full_csv(conn, query, params):
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+    insight_report.write_csv(backend, conn, query, params, text)
+    text.flush()
+    text.detach()
+    return buffer.getvalue()
+
+### Where the time of the result went, its plan and the latency history of the insight
+def show_diagnostics(profile):
+    st.markdown("**Query diagnostics**")
+    st.dataframe(profile.stage_table(), hide_index=True)
+    scanned = f"{profile.rows_scanned:,}" if profile.rows_scanned is not None else "not reported"
+    source = "result cache" if profile.cache_hit else backend.name
+    st.caption(f"{profile.seconds * 1000:.1f} ms from {source}, {profile.rows_returned:,} rows returned, "
+               f"rows scanned: {scanned}")
+    if profile.plan:
+        with st.expander("Query plan"):
+            st.code(profile.plan, language="text")
+    history = get_history().history(profile.name)
+    executed = history[~history["cache_hit"]] if not history.empty else history
+    if len(executed) > 1:
+        st.caption(f"Latency of the last {len(executed)} executions (ms)")
+        st.line_chart(executed["total_ms"].reset_index(drop=True))
+
+def show_results(conn, query, params, name=None, keyset=False):
+    state = st.session_state
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, key="page_size")
+    if state.get("paging") != (query, tuple(params), page_size):
+        # a new query or page size starts again from the first page #
+        state.paging = (query, tuple(params), page_size)
+        state.cursors = [(None, 0)]  # (keyset of the previous row, offset) of every page seen
+    after, offset = state.cursors[-1]
+
+    # one row more than the page tells whether there is a next page #
+    page_query, page_params = insights.page(query, params, page_size + 1, after, offset, backend.placeholder)
+    result_df, profile = run_query(conn, page_query, page_params, name, state.get("connect_stages"))
+    if result_df is None:
+        return
+    if result_df.empty and offset == 0:
+        st.info("No results found for this query.")
+        return
+    rows = result_df.iloc[:page_size]
+    st.subheader("Query Result:")
+    if state.get("diagnostics"):
+        result_col, diagnostics_col = st.columns([3, 2])
+        with diagnostics_col:
+            show_diagnostics(profile)
+    else:
+        result_col = st.container()
+    result_col.dataframe(rows)
+    result_col.caption(f"Page {len(state.cursors)}: rows {offset + 1} to {offset + len(rows)}")
+
+    previous_col, next_col = st.columns(2)
+    if previous_col.button("Previous page", disabled=len(state.cursors) == 1):
+        state.cursors.pop()
+        st.rerun()
+    if next_col.button("Next page", disabled=len(result_df) <= page_size):
+        after = insights.after_values(query, rows) if keyset else None
+        state.cursors.append((after, offset + len(rows)))
+        st.rerun()
+    if state.get("csv_query") != (query, tuple(params)):
+        state.csv_query, state.csv = (query, tuple(params)), None
+    if state.csv is None and st.button("Prepare the full result (CSV)"):
+        try:
+            state.csv = full_csv(conn, query, params)
+        except backend.errors as err:
+            st.error(f"Error exporting the result: {err}")
+    if state.csv is not None:
+        st.download_button("Download the full result (CSV)", state.csv, file_name="insight.csv", mime="text/csv")
 
 def main():
     st.title("Cricket Match Data Level Insights")
+    st.sidebar.toggle("Query diagnostics", key="diagnostics",
+                      help="Stage timings, rows scanned, the query plan and the latency history of every result")
 
-    conn = connect_db()
+    conn, waited = connect_db()
     if not conn:
         return
 
-    query_name = st.selectbox("Select an Insight to Extract:", list(sql_queries.keys()))
-    selected_query = sql_queries[query_name]
+    try:
+        query_name = st.selectbox("Select an Insight to Extract:", list(sql_queries.keys()))
+        insight = sql_queries[query_name]
+        values = parameter_widgets(conn, query_name, insight)
+        selected_query, params = insight.compile(values, backend.placeholder)
 
-    st.subheader("SQL Query:")
-    st.code(selected_query, language="sql")
+        st.subheader("SQL Query:")
+        st.code(selected_query, language="sql")
+        if params:
+            st.caption(f"Parameters: {', '.join(repr(value) for value in params)}")
 
-    if st.button("Execute Query"):
-        result_df = run_query(conn, selected_query)
-        if result_df is not None and not result_df.empty:
-            st.subheader("Query Result:")
-            st.dataframe(result_df)
-        elif result_df is not None and result_df.empty:
-            st.info("No results found for this query.")
+        # the results stay on the page while it is paged through, until another query is picked #
+        if st.button("Execute Query"):
+            st.session_state.executed = (selected_query, tuple(params))
+        if st.session_state.get("executed") == (selected_query, tuple(params)):
+            show_results(conn, selected_query, params, query_name, insight.unique_order)
+
+        st.divider()
+        if st.button("Run all insights"):
+            run_report(conn)
 
-    if conn.is_connected():
-        conn.close()
+        pool = get_pool().stats()
+        st.caption(f"Connection wait: {waited * 1000:.1f} ms (pool: {pool['open']}/{pool['size']} open, "
+                   f"avg wait {pool['avg_wait_ms']:.1f} ms, max wait {pool['max_wait_ms']:.1f} ms)")
+        if st.session_state.get("diagnostics"):
+            with st.expander("Latency history of every insight"):
+                st.dataframe(get_history().summary(), hide_index=True)
+    finally:
+        # back to the pool, also when Streamlit stops the script for a rerun #
+        get_pool().release(conn)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
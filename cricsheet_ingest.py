@@ -0,0 +1,350 @@
+### Parallel, streaming ingestion of the Cricsheet JSON zips ###
+# Reads the tests_/odis_/t20s_/ipl_ zip files downloaded from Cricsheet.org,
+# parses every JSON match across a process pool and hands back columnar
+# batches (dict of column -> list) that are written straight into the Parquet
+# match store (match_store.py) so the corpus is never held in memory at once.
+# Every delivery carries the match_id of its JSON file and a manifest of the
+# ingested files (with the zip's CRC32 of each file) lets a refresh parse only
+# the new or changed matches. The innings scorecards (scorecards.py) are built in the same pass
+# and the leaderboard rollups (rollups.py) are updated with just the new or changed matches.
+# A run is marked in the manifest before it writes to the store, a run interrupted part way is
+# cleaned up by the next one (the rows of the matches it did not record are removed, the rollups rebuilt).
+
+# Tools used:
+    # python's zipfile for zipfile extraction
+    # concurrent.futures to fan the match files out across processes
+    # match_store (pyarrow) to write the batches as partitioned Parquet files
+
+# Usage : python cricsheet_ingest.py --input-dir <zip directory> [--store-dir <match store directory>] [--full]
+
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+import zipfile as zf
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import match_store
+import rollups
+import scorecards
+
+# mapping the prefix of the filenames to each requested match types #
+MAPPING = {
+    "tests_": "Test",
+    "odis_": "ODI",
+    "t20s_": "T20",
+    "ipl_": "IPL"
+}
+
+# directory of the match store, inside the zip directory unless told otherwise #
+STORE_DIR_NAME = "match_store"
+
+# manifest of the match files already ingested, kept in the match store #
+MANIFEST_FILE = "ingest_manifest.json"
+
+# Columns copied from the match info onto every delivery #
+MATCH_COLUMNS = ["match_id", "match_type", "season", "city", "venue", "toss_winner", "toss_decision",
+                 "winner", "player_of_match", "teams"]
+# Columns taken from each delivery #
+DELIVERY_COLUMNS = ["team", "innings", "over", "ball", "batter", "bowler", "non_striker",
+                    "runs_batter", "runs_extras", "runs_total", "wicket"]
+COLUMNS = MATCH_COLUMNS + DELIVERY_COLUMNS
+
+DEFAULT_BATCH_SIZE = 200 # number of matches parsed per worker task
+
+
+def match_type_for(filename):
+    """Returns the match type of a Cricsheet zip file from its prefix, or None."""
+    for prefix, match_type in MAPPING.items():
+        if filename.lower().startswith(prefix.lower()):
+            return match_type
+    return None
+
+
+def match_id_for(name):
+    """Returns the Cricsheet match id of a JSON file name, e.g. '1082591.json' -> '1082591'."""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _read_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_manifest(store_dir):
+    """Returns the {match_id: file entry} manifest of the match store, or an empty one."""
+    return _read_manifest(store_dir).get("matches", {})
+
+
+def save_manifest(store_dir, manifest, run_id, running=None):
+    """running is the id of a run writing to the store : saved before it writes anything, so the
+    next run knows the store may hold rows of matches the manifest does not list."""
+    # written to a temporary file first so an interrupted run never leaves a truncated manifest #
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    content = {"last_run": run_id, "matches": manifest}
+    if running:
+        content["running"] = running
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(content, f, indent=0, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def recover(store_dir, manifest, run_id):
+    """Cleans up after the interrupted run run_id : the rows of the matches missing from the manifest
+    are removed, its files compacted and the rollups rebuilt from the store (they may hold part of the run).
+    Returns the number of matches removed."""
+    stored = set()
+    for name in match_store.SCHEMAS:
+        data = match_store.dataset(store_dir, name)
+        if data is not None:
+            stored.update(data.to_table(columns=["match_id"])["match_id"].unique().to_pylist())
+    orphans = stored - set(manifest)
+    for name in match_store.SCHEMAS:
+        match_store.drop_matches(store_dir, orphans, name)
+        match_store.compact(store_dir, run_id, name)
+    kept = stored - orphans
+    deltas = [rollups.negate(removed) for removed in rollups.store_contributions(store_dir, kept)] if kept else []
+    rollups.update(store_dir, deltas, full=True)
+    return len(orphans)
+
+
+def last_run_matches(store_dir):
+    """Returns {match_type: [match ids]} of the matches added or changed by the last ingest run."""
+    manifest = _read_manifest(store_dir)
+    delta = {match_type: [] for match_type in MAPPING.values()}
+    for match_id, entry in manifest.get("matches", {}).items():
+        if entry.get("run") == manifest.get("last_run"):
+            delta[entry["match_type"]].append(match_id)
+    return delta
+
+
+def empty_batch():
+    return {col: [] for col in COLUMNS}
+
+
+def empty_batches():
+    """One columnar batch per match store dataset : the deliveries and the innings scorecards."""
+    return {match_store.DELIVERIES: empty_batch(), **scorecards.empty_batches()}
+
+
+def merge_batches(batches, match_batches):
+    """Appends the columnar batches of one match to the batches of a task."""
+    for name, batch in match_batches.items():
+        for col, values in batch.items():
+            batches[name][col].extend(values)
+
+
+def parse_match(match_data, batch, match_id=None):
+    """Appends the deliveries of one parsed Cricsheet match to the column lists of batch.
+    Returns the number of deliveries added. A match failing part way leaves batch with columns of
+    different lengths, parse into a batch of its own (see _parse_members)."""
+    match_info = match_data.get("info", {})
+    toss = match_info.get("toss", {})
+
+    match_details = {
+        "match_id": match_id,
+        "match_type": match_info.get("match_type"),
+        "season": match_info.get("season"),
+        "city": match_info.get("city"),
+        "venue": match_info.get("venue"),
+        "toss_winner": toss.get("winner"),
+        "toss_decision": toss.get("decision"),
+        "winner": match_info.get("outcome", {}).get("winner", "draw"),
+        "player_of_match": ", ".join(match_info.get("player_of_match", [])),
+        "teams": ", ".join(match_info.get("teams", [])),
+    }
+
+    count = 0
+    for innings_number, inning in enumerate(match_data.get("innings", []), start=1):
+        team = inning.get("team", "Unknown")
+        for over in inning.get("overs", []):
+            over_number = over.get("over")
+            for ball, delivery in enumerate(over.get("deliveries", []), start=1):
+                runs = delivery.get("runs", {})
+                batch["team"].append(team)
+                batch["innings"].append(innings_number)
+                batch["over"].append(over_number)
+                batch["ball"].append(ball)
+                batch["batter"].append(delivery.get("batter"))
+                batch["bowler"].append(delivery.get("bowler"))
+                batch["non_striker"].append(delivery.get("non_striker"))
+                batch["runs_batter"].append(runs.get("batter", 0))
+                batch["runs_extras"].append(runs.get("extras", 0))
+                batch["runs_total"].append(runs.get("total", 0))
+                batch["wicket"].append(delivery["wickets"][0].get("player_out", "None") if delivery.get("wickets") else "None")
+                count += 1
+
+    # match level values are repeated once per delivery, column by column #
+    for col, value in match_details.items():
+        batch[col].extend([value] * count)
+    return count
+
+
+def _parse_members(task):
+    """Worker : parses a slice of the JSON files of one zip into a single columnar batch per dataset.
+    Returns the match ids parsed successfully along with the batches."""
+    filepath, match_type, names = task
+    batches = empty_batches()
+    parsed = []
+    errors = []
+    filename = os.path.basename(filepath)
+    try:
+        with zf.ZipFile(filepath, "r") as zip_ref:
+            for name in names:
+                try:
+                    content = zip_ref.read(name).decode("utf-8", errors="ignore")
+                    match_id = match_id_for(name)
+                    match_data = json.loads(content)
+                    # parsed on its own, a malformed match never leaves half of its rows in the batches #
+                    match_batches = empty_batches()
+                    parse_match(match_data, match_batches[match_store.DELIVERIES], match_id)
+                    scorecards.add_match(match_data, match_id, match_batches)
+                    merge_batches(batches, match_batches)
+                    parsed.append(match_id)
+                except json.JSONDecodeError as je:
+                    errors.append(f" *** JSONDecodeError in {filename}/{name} ***: {je}")
+                except Exception as er:
+                    errors.append(f" error reading json {filename}/{name} : {er}")
+    except zf.BadZipFile as err:
+        errors.append(f"Error reading zipfile {filepath}: {err}")
+    return match_type, batches, parsed, errors
+
+
+def iter_tasks(ip_dir, batch_size=DEFAULT_BATCH_SIZE, manifest=None, pending=None):
+    """Yields (zip path, match type, [json names]) slices for every Cricsheet zip in ip_dir.
+    Files whose manifest entry is unchanged are skipped, the entries of the files to parse
+    are collected in pending."""
+    manifest = manifest if manifest is not None else {}
+    pending = pending if pending is not None else {}
+    for filename in sorted(os.listdir(ip_dir)):
+        if not filename.endswith(".zip"):
+            continue
+        match_type = match_type_for(filename)
+        if not match_type:
+            continue
+        filepath = os.path.join(ip_dir, filename)
+        print(f"Processing files in {filename} as {match_type} matches...")
+        try:
+            with zf.ZipFile(filepath, "r") as zip_ref:
+                infos = [info for info in zip_ref.infolist() if info.filename.endswith(".json")]
+        except zf.BadZipFile as err:
+            print(f"Error reading zipfile {filepath}: {err}")
+            continue
+        # the CRC32 of each file comes from the zip's central directory, no file has to be read #
+        names = []
+        for info in infos:
+            entry = {"zip": filename, "match_type": match_type, "crc": info.CRC, "size": info.file_size}
+            match_id = match_id_for(info.filename)
+            previous = manifest.get(match_id, {})
+            if {key: previous.get(key) for key in entry} != entry:
+                pending[match_id] = entry
+                names.append(info.filename)
+        print(f"{len(names)} of {len(infos)} matches in {filename} are new or changed.")
+        for start in range(0, len(names), batch_size):
+            yield filepath, match_type, names[start:start + batch_size]
+
+
+def _report(result):
+    match_type, batches, parsed, errors = result
+    for error in errors:
+        print(error)
+    return match_type, batches, parsed
+
+
+def iter_batches(tasks, workers=None):
+    """Parses the tasks and yields (match_type, {dataset: columnar batch}, match ids parsed) as they finish.
+    At most two tasks per worker are in flight, so memory stays bounded by the batch size."""
+    if workers == 1:
+        for task in tasks:
+            yield _report(_parse_members(task))
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _report(future.result())
+            pending.add(pool.submit(_parse_members, task))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _report(future.result())
+
+
+def ingest_to_store(ip_dir, store_dir=None, workers=None, batch_size=DEFAULT_BATCH_SIZE, full=False):
+    """Parses the new or changed matches of every Cricsheet zip in ip_dir into the match store.
+    The manifest records the run that wrote each match, so the database loader can pick up
+    just the matches of the last run. full=True ignores the manifest and rebuilds the store.
+    Returns the number of deliveries written for each match type."""
+    store_dir = store_dir or os.path.join(ip_dir, STORE_DIR_NAME)
+    os.makedirs(store_dir, exist_ok=True)
+    if full:
+        for name in match_store.SCHEMAS:
+            shutil.rmtree(match_store.dataset_dir(store_dir, name), ignore_errors=True)
+    previous = {} if full else _read_manifest(store_dir)
+    manifest = previous.get("matches", {})
+    if previous.get("running"):
+        removed = recover(store_dir, manifest, previous["running"])
+        print(f"Interrupted run {previous['running']} cleaned up, {removed} unlisted matches removed from the match store.")
+    written = {match_type: 0 for match_type in MAPPING.values()}
+    run_id = time.strftime("%Y%m%d%H%M%S") + uuid.uuid4().hex[:6]
+
+    start = time.perf_counter()
+    pending = {}
+    tasks = list(iter_tasks(ip_dir, batch_size, manifest, pending))
+
+    # changed matches are removed from the store (and the rollups) before their new deliveries are written #
+    changed = {match_id for match_id in pending if match_id in manifest}
+    if pending:
+        save_manifest(store_dir, manifest, previous.get("last_run"), running=run_id)
+    deltas = rollups.store_contributions(store_dir, changed) if changed else []
+    if changed:
+        for name in match_store.SCHEMAS:
+            match_store.drop_matches(store_dir, changed, name)
+        print(f"{len(changed)} changed matches removed from the match store.")
+
+    matches = 0
+    for seq, (match_type, batches, parsed) in enumerate(iter_batches(tasks, workers)):
+        matches += len(parsed)
+        for match_id in parsed:
+            manifest[match_id] = dict(pending[match_id], run=run_id)
+        for name, batch in batches.items():
+            match_store.write_batch(store_dir, match_type, batch, run_id, seq, name)
+        written[match_type] += len(batches[match_store.DELIVERIES]["over"])
+        deltas.append(rollups.contributions(match_type, batches[match_store.DELIVERIES],
+                                            batches[scorecards.BATTING], batches[scorecards.BOWLING]))
+
+    # every partition written to ends up as a single file #
+    for name in match_store.SCHEMAS:
+        match_store.compact(store_dir, run_id, name)
+    rollups.update(store_dir, deltas, full)
+    save_manifest(store_dir, manifest, run_id)
+    elapsed = time.perf_counter() - start
+    for match_type, rows in written.items():
+        print(f"{rows} {match_type} deliveries written to the match store.")
+    print(f"Parsed {matches} new or changed matches in {elapsed:.1f}s.")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse the Cricsheet JSON zips into the Parquet match store.")
+    parser.add_argument("--input-dir", required=True, help="directory holding the downloaded Cricsheet zip files")
+    parser.add_argument("--store-dir", help=f"directory of the match store (defaults to <input-dir>/{STORE_DIR_NAME})")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes (defaults to the cpu count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="matches parsed per worker task")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-ingest every match")
+    args = parser.parse_args(argv)
+    ingest_to_store(args.input_dir, args.store_dir, args.workers, args.batch_size, args.full)
+
+
+if __name__ == "__main__":
+    main()
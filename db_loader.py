@@ -0,0 +1,365 @@
+### Bulk loading of the ingested matches into the match tables ###
+# Replaces the row by row iterrows() insert of the notebook with
+    # batched multi-row INSERTs with periodic commits (MySQL, or SQLite as a local stand-in)
+    # LOAD DATA LOCAL INFILE (MySQL only)
+    # an optional "load into a staging table, then swap" mode so readers never see a half loaded table
+
+# Tools used:
+    # match_store -> to read the ingested deliveries from the Parquet match store in chunks
+    # MYSQL Connector / sqlite3 -> to create the tables and load the data
+
+# Usage : python db_loader.py --store-dir <match store directory> [--mode insert|infile] [--swap] [--full]
+#                             [--schema wide|star] [--sqlite <db file>] [--host ... --user ... --database ...]
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+import match_store
+
+# table loaded for each match type #
+TABLES = {
+    "Test": "test_matches",
+    "ODI": "odi_matches",
+    "T20": "t20_matches",
+    "IPL": "ipl_matches"
+}
+
+DEFAULT_BATCH_SIZE = 1000       # rows per multi-row INSERT statement
+DEFAULT_COMMIT_EVERY = 100_000  # rows between commits
+
+# one row table holding the token of the last load, the insights app caches its results per token #
+DATA_VERSION_TABLE = "data_version"
+
+
+def _is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _placeholder(conn):
+    return "?" if _is_sqlite(conn) else "%s"
+
+
+# Table Creation -> for each match type(TEST, ODI, T20, IPL) respectively.
+# The backtick quoted DDL is understood by both MySQL and SQLite.
+def create_table(cursor, table_name):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{table_name}` (
+        `match_id` VARCHAR(20),
+        `match_type` VARCHAR(50),
+        `season` VARCHAR(50),
+        `city` VARCHAR(50),
+        `venue` VARCHAR(255),
+        `toss_winner` VARCHAR(100),
+        `toss_decision` VARCHAR(50),
+        `winner` VARCHAR(100),
+        `player_of_match` TEXT,
+        `teams` TEXT,
+        `team` VARCHAR(100),
+        `innings` TINYINT,
+        `over` INT,
+        `ball` TINYINT,
+        `batter` VARCHAR(100),
+        `bowler` VARCHAR(100),
+        `non_striker` VARCHAR(100),
+        `runs_batter` INT,
+        `runs_extras` INT,
+        `runs_total` INT,
+        `wicket` VARCHAR(100)
+    )
+    """)
+
+
+def create_indexes(conn, indexes):
+    """Creates the missing indexes of {index name: (table name, "`col`, `col`")}."""
+    cursor = conn.cursor()
+    if _is_sqlite(conn):
+        for index_name, (table_name, columns) in indexes.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS `{index_name}` ON `{table_name}` ({columns})")
+    else:
+        # MySQL has no CREATE INDEX IF NOT EXISTS, the existing ones come from information_schema #
+        cursor.execute("SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()")
+        existing = {(table_name, index_name) for table_name, index_name in cursor.fetchall()}
+        for index_name, (table_name, columns) in indexes.items():
+            if (table_name, index_name) not in existing:
+                cursor.execute(f"CREATE INDEX `{index_name}` ON `{table_name}` ({columns})")
+    cursor.close()
+
+
+def table_indexes(table_name):
+    """The indexes of one wide match table : only the match_id lookup of a delta load (delete_matches).
+    No insight reads the wide tables (they read the scorecards and rollups), an index for a query on
+    them belongs here with that query."""
+    return {f"ix_{table_name}_match": (table_name, "`match_id`")}
+
+
+def delete_matches(conn, table_name, match_ids, chunk_size=1000):
+    """Removes the rows of the given matches so they can be re-inserted without duplicates."""
+    match_ids = list(match_ids)
+    cursor = conn.cursor()
+    for start in range(0, len(match_ids), chunk_size):
+        chunk = match_ids[start:start + chunk_size]
+        placeholders = ",".join([_placeholder(conn)] * len(chunk))
+        cursor.execute(f"DELETE FROM `{table_name}` WHERE `match_id` IN ({placeholders})", tuple(chunk))
+    cursor.close()
+
+
+def _rows(df):
+    # object dtype turns numpy scalars into python ones and lets NaN become None for the connector #
+    df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+
+def bulk_insert(conn, table_name, df, batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY):
+    """Inserts a DataFrame with multi-row INSERT statements of batch_size rows,
+    committing every commit_every rows (commit_every=None leaves the commit to the caller).
+    Returns the number of rows inserted."""
+    cols = ",".join([f"`{col}`" for col in df.columns])
+    row_placeholders = "(" + ",".join([_placeholder(conn)] * len(df.columns)) + ")"
+    cursor = conn.cursor()
+    inserted = 0
+    since_commit = 0
+    batch = []
+
+    def _flush():
+        if _is_sqlite(conn):
+            # sqlite runs in process, executemany is its fastest path and avoids the variable limit #
+            cursor.executemany(f"INSERT INTO `{table_name}` ({cols}) VALUES {row_placeholders}", batch)
+        else:
+            values = ",".join([row_placeholders] * len(batch))
+            cursor.execute(f"INSERT INTO `{table_name}` ({cols}) VALUES {values}",
+                           tuple(value for row in batch for value in row))
+
+    for row in _rows(df):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _flush()
+            inserted += len(batch)
+            since_commit += len(batch)
+            batch = []
+            if commit_every and since_commit >= commit_every:
+                conn.commit()
+                since_commit = 0
+    if batch:
+        _flush()
+        inserted += len(batch)
+    if commit_every:
+        conn.commit()
+    cursor.close()
+    return inserted
+
+
+def bump_data_version(conn):
+    """Records a new data version after a load, so the cached insight results are dropped.
+    Returns the new version."""
+    version = time.strftime("%Y%m%d%H%M%S") + uuid.uuid4().hex[:6]
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS `{DATA_VERSION_TABLE}` (`id` TINYINT PRIMARY KEY, `version` VARCHAR(40) NOT NULL)")
+    cursor.execute(f"DELETE FROM `{DATA_VERSION_TABLE}`")
+    cursor.execute(f"INSERT INTO `{DATA_VERSION_TABLE}` (`id`, `version`) VALUES (1, {_placeholder(conn)})", (version,))
+    cursor.close()
+    conn.commit()
+    return version
+
+
+def load_data_infile(conn, table_name, csv_filepath):
+    """Loads a csv file with a header row with LOAD DATA LOCAL INFILE (MySQL only).
+    The connection must be opened with allow_local_infile=True. Returns the number of rows loaded."""
+    columns = pd.read_csv(csv_filepath, nrows=0).columns
+    # empty csv fields become NULL instead of '' or 0 #
+    variables = ",".join([f"@v{i}" for i in range(len(columns))])
+    assignments = ",".join([f"`{col}` = NULLIF(@v{i}, '')" for i, col in enumerate(columns)])
+    path = os.path.abspath(csv_filepath).replace("\\", "/")
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE '{path}'
+        INTO TABLE `{table_name}`
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        ({variables})
+        SET {assignments}
+    """)
+    loaded = cursor.rowcount
+    cursor.close()
+    conn.commit()
+    return loaded
+
+
+def _create_staging(conn, table_name):
+    staging = f"{table_name}_staging"
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS `{staging}`")
+    if _is_sqlite(conn):
+        create_table(cursor, staging)
+    else:
+        cursor.execute(f"CREATE TABLE `{staging}` LIKE `{table_name}`")
+    cursor.close()
+    return staging
+
+
+def _swap(conn, table_name, staging):
+    """Replaces table_name by the staging table in one step."""
+    old = f"{table_name}_old"
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS `{old}`")
+    if _is_sqlite(conn):
+        # sqlite DDL is transactional, readers see either the old or the new table #
+        conn.commit()
+        cursor.execute("BEGIN")
+        cursor.execute(f"ALTER TABLE `{table_name}` RENAME TO `{old}`")
+        cursor.execute(f"ALTER TABLE `{staging}` RENAME TO `{table_name}`")
+        conn.commit()
+    else:
+        # a multi-table RENAME TABLE is atomic in MySQL #
+        cursor.execute(f"RENAME TABLE `{table_name}` TO `{old}`, `{staging}` TO `{table_name}`")
+    cursor.execute(f"DROP TABLE IF EXISTS `{old}`")
+    conn.commit()
+    cursor.close()
+
+
+def _infile_from_chunks(conn, table_name, chunks):
+    # LOAD DATA needs a file, the chunks are spooled to a temporary csv first #
+    fd, csv_filepath = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        header = True
+        for chunk in chunks:
+            # "\n" as LOAD DATA expects, to_csv would end the lines with "\r\n" on Windows #
+            chunk.to_csv(csv_filepath, mode="w" if header else "a", index=False, header=header, lineterminator="\n")
+            header = False
+        return load_data_infile(conn, table_name, csv_filepath) if not header else 0
+    finally:
+        os.remove(csv_filepath)
+
+
+def load_table(conn, table_name, store_dir, match_type, match_ids=None, mode="insert", swap=False,
+               batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY):
+    """Loads the deliveries of one match type from the match store into table_name and reports the load rate.
+    match_ids limits the load to those matches (their old rows are deleted first), None loads them all.
+    mode="insert" uses batched multi-row INSERTs, mode="infile" uses LOAD DATA LOCAL INFILE.
+    swap=True loads into a staging table and swaps it in, replacing the whole table.
+    Returns the number of rows loaded."""
+    if mode == "infile" and _is_sqlite(conn):
+        print("Warning: LOAD DATA LOCAL INFILE is MySQL only, falling back to batched inserts.")
+        mode = "insert"
+
+    cursor = conn.cursor()
+    create_table(cursor, table_name)
+    cursor.close()
+    if match_ids is not None:
+        # the deletes of a delta load look the matches up, a full load builds the index afterwards #
+        create_indexes(conn, table_indexes(table_name))
+    target = _create_staging(conn, table_name) if swap else table_name
+
+    start = time.perf_counter()
+    rows = 0
+    if not swap:
+        if match_ids is None:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM `{table_name}`")
+            cursor.close()
+        else:
+            delete_matches(conn, target, match_ids)
+
+    # imported here, the ingest itself imports the scorecards and rollups that build on this module #
+    import cricsheet_ingest
+    chunks = match_store.iter_chunks(store_dir, columns=cricsheet_ingest.COLUMNS,
+                                     formats=[match_type], match_ids=match_ids)
+    if mode == "infile":
+        rows = _infile_from_chunks(conn, target, chunks)
+    else:
+        for chunk in chunks:
+            rows += bulk_insert(conn, target, chunk, batch_size, commit_every)
+    conn.commit()
+
+    if swap:
+        _swap(conn, table_name, target)
+    # a MySQL staging table is created LIKE the table and may already have them #
+    create_indexes(conn, table_indexes(table_name))
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed else float(rows)
+    print(f"{rows} records loaded into '{table_name}' in {elapsed:.1f}s ({rate:,.0f} rows/sec).")
+    return rows
+
+
+def load_all(conn, store_dir, full=False, **options):
+    """Loads every match type from the match store. By default only the matches added or changed
+    by the last ingest run are loaded, full=True (or swap=True) reloads everything.
+    Returns the number of rows loaded for each table."""
+    import cricsheet_ingest
+    full = full or options.get("swap", False)
+    delta = None if full else cricsheet_ingest.last_run_matches(store_dir)
+    loaded = {}
+    for match_type, table_name in TABLES.items():
+        match_ids = None if full else delta[match_type]
+        if match_ids == []:
+            print(f"No new or changed {match_type} matches to load into '{table_name}'.")
+            continue
+        loaded[table_name] = load_table(conn, table_name, store_dir, match_type, match_ids, **options)
+    import rollups
+    import scorecards
+    batch_options = dict(batch_size=options.get("batch_size", DEFAULT_BATCH_SIZE),
+                         commit_every=options.get("commit_every", DEFAULT_COMMIT_EVERY))
+    scorecards.load_all_scorecards(conn, store_dir, full=full, **batch_options)
+    rollups.load_all_rollups(conn, store_dir, full=full, **batch_options)
+    bump_data_version(conn)
+    return loaded
+
+
+def connect(args):
+    """Opens the SQLite stand-in when --sqlite is given, the MySQL database otherwise."""
+    if args.sqlite:
+        return sqlite3.connect(args.sqlite)
+    import mysql.connector
+    return mysql.connector.connect(
+        host=args.host,
+        user=args.user,
+        password=args.password,
+        database=args.database,
+        allow_local_infile=args.mode == "infile"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load the ingested matches into the match tables.")
+    parser.add_argument("--store-dir", required=True, help="match store directory written by cricsheet_ingest.py")
+    parser.add_argument("--mode", choices=["insert", "infile"], default="insert",
+                        help="batched multi-row INSERTs or LOAD DATA LOCAL INFILE (MySQL only)")
+    parser.add_argument("--swap", action="store_true", help="load into a staging table and swap it in (implies --full)")
+    parser.add_argument("--full", action="store_true", help="reload every match instead of the matches of the last ingest")
+    parser.add_argument("--schema", choices=["wide", "star"], default="wide",
+                        help="the four wide *_matches tables or the normalized star schema of star_schema.py")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per INSERT statement")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="rows between commits")
+    parser.add_argument("--sqlite", help="load into this SQLite database file instead of MySQL")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""), help="defaults to $DB_PASSWORD")
+    parser.add_argument("--database", default="cricket")
+    args = parser.parse_args(argv)
+
+    conn = connect(args)
+    try:
+        if args.schema == "star":
+            import star_schema
+            star_schema.load_all_star(conn, args.store_dir, full=args.full,
+                                      batch_size=args.batch_size, commit_every=args.commit_every)
+            print("Database operations completed successfully.")
+            return
+        load_all(conn, args.store_dir, full=args.full, mode=args.mode, swap=args.swap,
+                 batch_size=args.batch_size, commit_every=args.commit_every)
+        print("Database operations completed successfully.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+### Data access layer of the EDA script ###
+# The charts of eda_visuals.py never see the deliveries, they render from small summaries
+# (counts per season / venue / ..., runs per over, a histogram of runs per delivery per season)
+# computed here:
+    # per format, the summaries its charts declare are computed in one pass over the match store,
+    # chunk by chunk, reading only the columns they need (names as categoricals, runs/overs as
+    # small integers, the season as a nullable Int16 computed per distinct season)
+    # derived series (the wicket flag, ...) are vectorized, no row-wise apply
+    # the summaries of a format are cached in <store_dir>/eda_summaries/<format>.pkl with the
+    # fingerprint of its store files, a refresh only recomputes the formats it wrote to
+    # the cross-format summaries are sums of the per format ones
+
+# Tools used:
+    # match_store -> the projected, partition filtered chunked reads of the Parquet store
+    # pandas / numpy -> the vectorized counts, the box plot statistics
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import match_store
+
+FORMATS = ["Test", "ODI", "T20", "IPL"]
+ALL = "all"  # the key of the chart declarations read from every format
+SUMMARY_DIR = "eda_summaries"
+
+# summary -> the columns of the deliveries it is computed from #
+SUMMARY_COLUMNS = {
+    "season_counts": ["season"],
+    "venue_counts": ["venue"],
+    "city_counts": ["city"],
+    "toss_winner_counts": ["toss_winner"],
+    "toss_decision_counts": ["toss_decision"],
+    "winner_counts": ["winner"],
+    "pom_counts": ["player_of_match"],
+    "wicket_counts": ["wicket"],
+    "over_runs": ["over", "runs_total"],      # over -> [runs, deliveries]
+    "season_runs": ["season", "runs_total"],  # (season, runs of the delivery) -> deliveries
+}
+
+
+def summaries_by_format(chart_summaries):
+    """{format: sorted summaries} from the {chart: {format or ALL: summaries}} declarations of the charts."""
+    needed = {match_format: set() for match_format in FORMATS}
+    for declaration in chart_summaries.values():
+        for match_format, summaries in declaration.items():
+            for target in FORMATS if match_format == ALL else [match_format]:
+                needed[target].update(summaries)
+    return {match_format: sorted(summaries) for match_format, summaries in needed.items() if summaries}
+
+
+def season_numbers(seasons):
+    """The numeric season (2019, NA for "2007/08" like seasons) of a season column,
+    converted once per distinct season."""
+    seasons = seasons.astype("category")
+    numbers = pd.to_numeric(pd.Series(seasons.cat.categories, dtype=object), errors="coerce").to_numpy(dtype=float)
+    codes = seasons.cat.codes.to_numpy()
+    values = np.where(codes >= 0, numbers[codes] if len(numbers) else np.nan, np.nan)
+    return pd.Series(values, index=seasons.index, name=seasons.name).astype("Int16")
+
+
+def wicket_flags(wickets):
+    """1 for the deliveries a wicket fell on, 0 otherwise (vectorized)."""
+    return (wickets.notna() & (wickets.astype("object") != "None")).astype("int8")
+
+
+def _counts(values):
+    """value_counts of one chunk, without the empty categories of a categorical."""
+    counts = values.value_counts(dropna=True)
+    counts = counts[counts > 0]
+    if isinstance(counts.index, pd.CategoricalIndex):
+        counts.index = counts.index.astype(str)
+    return counts
+
+
+def _add(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+def summarize(store_dir, match_format, summaries, chunk_rows=match_store.DEFAULT_CHUNK_ROWS):
+    """Computes the given summaries of one format in a single chunked pass over its deliveries."""
+    columns = sorted({column for name in summaries for column in SUMMARY_COLUMNS[name]})
+    totals = dict.fromkeys(summaries)
+    for chunk in match_store.iter_chunks(store_dir, columns=columns, formats=[match_format], chunk_rows=chunk_rows):
+        if "season" in chunk.columns:
+            chunk["season"] = season_numbers(chunk["season"])
+        for name in summaries:
+            if name == "wicket_counts":
+                part = wicket_flags(chunk["wicket"]).value_counts()
+            elif name == "over_runs":
+                part = chunk.groupby("over", observed=True)["runs_total"].agg(["sum", "count"])
+            elif name == "season_runs":
+                part = chunk.dropna(subset=["season"]).groupby(["season", "runs_total"], observed=True).size()
+            else:
+                part = _counts(chunk[SUMMARY_COLUMNS[name][0]])
+            totals[name] = _add(totals[name], part)
+    empty = {"over_runs": pd.DataFrame(columns=["sum", "count"])}
+    # the counts become floats while being added up across chunks #
+    return {name: (total.astype("int64") if total is not None else empty.get(name, pd.Series(dtype="int64")))
+            for name, total in totals.items()}
+
+
+class SummaryCache:
+    """The summaries of every format, read from <store_dir>/eda_summaries when the store files of the
+    format have not changed since they were computed, computed (and saved) otherwise."""
+
+    def __init__(self, store_dir, chart_summaries):
+        self.store_dir = store_dir
+        self.summaries = summaries_by_format(chart_summaries)
+        self.directory = os.path.join(store_dir, SUMMARY_DIR)
+
+    def _path(self, match_format):
+        return os.path.join(self.directory, f"{match_format}.pkl")
+
+    def fingerprint(self, match_format):
+        return f"{match_store.fingerprint(self.store_dir, [match_format])}:{','.join(self.summaries[match_format])}"
+
+    def cached(self, match_format):
+        """The saved summaries of a format, None when they are missing or stale."""
+        path = self._path(match_format)
+        if not os.path.exists(path):
+            return None
+        try:
+            saved = pd.read_pickle(path)
+        except (OSError, EOFError, ValueError):
+            return None
+        return saved["summaries"] if saved.get("fingerprint") == self.fingerprint(match_format) else None
+
+    def refresh(self, match_format):
+        """Recomputes and saves the summaries of a format, unless the saved ones are current."""
+        summaries = self.cached(match_format)
+        if summaries is None:
+            fingerprint = self.fingerprint(match_format)
+            summaries = summarize(self.store_dir, match_format, self.summaries[match_format])
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(match_format)
+            pd.to_pickle({"fingerprint": fingerprint, "summaries": summaries}, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        return summaries
+
+    def stale_formats(self):
+        return [match_format for match_format in self.summaries if self.cached(match_format) is None]
+
+    def load(self):
+        """{format: {summary: Series}} of every format, current."""
+        return {match_format: self.refresh(match_format) for match_format in self.summaries}
+
+
+def combined(summaries, name):
+    """The sum of one count summary over the formats that have it."""
+    parts = [by_name[name] for by_name in summaries.values() if name in by_name and len(by_name[name])]
+    if not parts:
+        return pd.Series(dtype="int64")
+    total = parts[0]
+    for part in parts[1:]:
+        total = total.add(part, fill_value=0)
+    return total.astype("int64")
+
+
+def box_stats(season_runs):
+    """matplotlib bxp statistics per season from the (season, value) -> count histogram : the same
+    quartiles (linear interpolation), 1.5 IQR whiskers and fliers a box plot of the raw values has."""
+    stats = []
+    for season, histogram in season_runs.groupby(level=0):
+        histogram = histogram.droplevel(0).sort_index()
+        values = histogram.index.to_numpy(dtype=float)
+        counts = histogram.to_numpy(dtype=np.int64)
+        ends = np.cumsum(counts)  # the (1-based) rank of the last delivery of every value
+        n = int(ends[-1])
+
+        def _quantile(q):
+            position = q * (n - 1)  # 0-based rank, numpy's linear method
+            lower = values[np.searchsorted(ends, int(np.floor(position)) + 1)]
+            upper = values[np.searchsorted(ends, int(np.ceil(position)) + 1)]
+            return lower + (upper - lower) * (position - np.floor(position))
+
+        q1, median, q3 = _quantile(0.25), _quantile(0.5), _quantile(0.75)
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = values[(values >= low) & (values <= high)]
+        stats.append({
+            "label": str(int(season)), "med": median, "q1": q1, "q3": q3,
+            "whislo": inside.min() if len(inside) else q1, "whishi": inside.max() if len(inside) else q3,
+            "fliers": values[(values < low) | (values > high)],  # one marker per distinct value
+        })
+    return stats
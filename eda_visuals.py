@@ -1,152 +1,242 @@
-import pandas as pd
+import matplotlib
+matplotlib.use("Agg") # headless : the charts are only saved to files, also from the worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
+import argparse
+import hashlib
+import inspect
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import eda_data
+import match_store
+from eda_data import ALL
 
-### Load the DataFrames from CSV files ###
-data_dir = r"C:\Users\sathy\OneDrive\Desktop\Project\Cric-MatchsheetDataAnalysis" 
-try:
-    test_df = pd.read_csv(os.path.join(data_dir, "test.csv"))
-    odi_df = pd.read_csv(os.path.join(data_dir, "ODI.csv"))
-    t20_df = pd.read_csv(os.path.join(data_dir, "T20.csv"))
-    ipl_df = pd.read_csv(os.path.join(data_dir, "IPL.csv"))
-except FileNotFoundError:
-    print("Error: One or more CSV files not found. Please ensure they are in the specified directory.")
-    exit()
-
-# Data Cleaning and pre-processing ###
-# Converting season to numeric for better data representation
-for df in [test_df, odi_df, t20_df, ipl_df]:
-    if 'season' in df.columns:
-        df['season'] = pd.to_numeric(df['season'], errors='coerce')
+### Load the DataFrames from the Parquet match store written by cricsheet_ingest.py ###
+data_dir = r"C:\Users\sathy\OneDrive\Desktop\Project\Cric-MatchsheetDataAnalysis"
+store_dir = os.path.join(data_dir, "match_store")
+# fingerprint of the inputs every output file was rendered from #
+FINGERPRINTS_FILE = "eda_fingerprints.json"
+
+### The charts : every chart is an independent job rendering one output file from the summaries it declares ###
+# Each render function gets the {format: {summary: Series}} of eda_data.SummaryCache (small counts, never
+# the deliveries) and draws on its own figure, so the jobs can run in parallel worker processes.
 
 # --- 1. Number of Matches Played per Season (All Matches) --- #
-plt.figure(figsize=(12, 6))
-all_seasons = pd.concat([test_df['season'], odi_df['season'], t20_df['season'], ipl_df['season']]).dropna().astype(int)
-sns.countplot(x=all_seasons, palette='viridis')
-plt.title('Number of Matches Played per Season (All Matches)')
-plt.xlabel('Season')
-plt.ylabel('Number of Matches')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "matches_per_season.png"))
-plt.close()
-print("Visualization 1 created: matches_per_season.png")
+def matches_per_season(data, path):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    all_seasons = eda_data.combined(data, 'season_counts').sort_index()
+    sns.barplot(x=all_seasons.index.astype(int), y=all_seasons.values, palette='viridis', ax=ax)
+    ax.set_title('Number of Matches Played per Season (All Matches)')
+    ax.set_xlabel('Season')
+    ax.set_ylabel('Number of Matches')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 2. Top 10 Most Frequent Venues (All Matches) --- #
-plt.figure(figsize=(10, 8))
-all_venues = pd.concat([test_df['venue'], odi_df['venue'], t20_df['venue'], ipl_df['venue']]).value_counts().nlargest(10)
-sns.barplot(x=all_venues.values, y=all_venues.index, palette='magma')
-plt.title('Top 10 Most Frequent Venues (All Matches)')
-plt.xlabel('Number of Matches')
-plt.ylabel('Venue')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "top_venues.png"))
-plt.close()
-print("Visualization 2 created: top_venues.png")
+def top_venues(data, path):
+    fig, ax = plt.subplots(figsize=(10, 8))
+    all_venues = eda_data.combined(data, 'venue_counts').nlargest(10)
+    sns.barplot(x=all_venues.values, y=all_venues.index, palette='magma', ax=ax)
+    ax.set_title('Top 10 Most Frequent Venues (All Matches)')
+    ax.set_xlabel('Number of Matches')
+    ax.set_ylabel('Venue')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 3. Toss Decision Distribution (ODI Matches) --- #
-plt.figure(figsize=(8, 6))
-odi_df['toss_decision'].value_counts().plot.pie(autopct='%1.1f%%', startangle=90, colors=sns.color_palette('pastel'))
-plt.title('Toss Decision Distribution in ODI Matches')
-plt.ylabel('')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "odi_toss_decision.png"))
-plt.close()
-print("Visualization 3 created: odi_toss_decision.png")
+def odi_toss_decision(data, path):
+    fig, ax = plt.subplots(figsize=(8, 6))
+    data["ODI"]['toss_decision_counts'].sort_values(ascending=False).plot.pie(autopct='%1.1f%%', startangle=90,
+                                                                colors=sns.color_palette('pastel'), ax=ax)
+    ax.set_title('Toss Decision Distribution in ODI Matches')
+    ax.set_ylabel('')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 4. Distribution of Winners (Test Matches) --- #
-plt.figure(figsize=(12, 7))
-test_df['winner'].value_counts().nlargest(15).plot(kind='bar', color=sns.color_palette('cividis'))
-plt.title('Distribution of Winners in Test Matches (Top 15)')
-plt.xlabel('Team')
-plt.ylabel('Number of Wins')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "test_winners.png"))
-plt.close()
-print("Visualization 4 created: test_winners.png")
+def test_winners(data, path):
+    fig, ax = plt.subplots(figsize=(12, 7))
+    data["Test"]['winner_counts'].nlargest(15).plot(kind='bar', color=sns.color_palette('cividis'), ax=ax)
+    ax.set_title('Distribution of Winners in Test Matches (Top 15)')
+    ax.set_xlabel('Team')
+    ax.set_ylabel('Number of Wins')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 5. Runs Scored per Over (IPL Matches - Line Plot) --- #
-if 'over' in ipl_df.columns and 'runs_total' in ipl_df.columns:
-    runs_per_over_ipl = ipl_df.groupby('over')['runs_total'].mean()
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x=runs_per_over_ipl.index, y=runs_per_over_ipl.values, marker='o', color='coral')
-    plt.title('Average Runs Scored per Over in IPL Matches')
-    plt.xlabel('Over')
-    plt.ylabel('Average Runs')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(data_dir, "ipl_runs_per_over.png"))
-    plt.close()
-    print("Visualization 5 created: ipl_runs_per_over.png")
-else:
-    print("Warning: 'over' or 'runs_total' column not found in IPL DataFrame for visualization 5.")
+def ipl_runs_per_over(data, path):
+    over_runs = data["IPL"]['over_runs']
+    runs_per_over_ipl = over_runs['sum'] / over_runs['count']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.lineplot(x=runs_per_over_ipl.index, y=runs_per_over_ipl.values, marker='o', color='coral', ax=ax)
+    ax.set_title('Average Runs Scored per Over in IPL Matches')
+    ax.set_xlabel('Over')
+    ax.set_ylabel('Average Runs')
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 6. Wickets Taken Distribution (T20 Matches) --- #
-if 'wicket' in t20_df.columns:
-    wickets_taken_t20 = t20_df['wicket'].apply(lambda x: 1 if pd.notna(x) and x != 'None' else 0)
-    plt.figure(figsize=(8, 5))
-    sns.histplot(wickets_taken_t20, bins=2, discrete=True, palette='Set2')
-    plt.xticks([0, 1], ['No Wicket', 'Wicket Taken'])
-    plt.title('Distribution of Wickets Taken per Delivery in T20 Matches')
-    plt.xlabel('Wicket Status')
-    plt.ylabel('Number of Deliveries')
-    plt.tight_layout()
-    plt.savefig(os.path.join(data_dir, "t20_wicket_distribution.png"))
-    plt.close()
-    print("Visualization 6 created: t20_wicket_distribution.png")
-else:
-    print("Warning: 'wicket' column not found in T20 DataFrame for visualization 6.")
+def t20_wicket_distribution(data, path):
+    wicket_counts = data["T20"]['wicket_counts'].reindex([0, 1], fill_value=0)
+    fig, ax = plt.subplots(figsize=(8, 5))
+    sns.histplot(x=wicket_counts.index, weights=wicket_counts.values, bins=2, discrete=True, ax=ax)
+    ax.set_xticks([0, 1], ['No Wicket', 'Wicket Taken'])
+    ax.set_title('Distribution of Wickets Taken per Delivery in T20 Matches')
+    ax.set_xlabel('Wicket Status')
+    ax.set_ylabel('Number of Deliveries')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 7. Top 10 Toss Winners (All Matches) --- #
-plt.figure(figsize=(10, 6))
-all_toss_winners = pd.concat([test_df['toss_winner'], odi_df['toss_winner'], t20_df['toss_winner'], ipl_df['toss_winner']]).value_counts().nlargest(10)
-sns.barplot(x=all_toss_winners.index, y=all_toss_winners.values, palette='viridis')
-plt.title('Top 10 Toss Winners (All Matches)')
-plt.xlabel('Team')
-plt.ylabel('Number of Tosses Won')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "top_toss_winners.png"))
-plt.close()
-print("Visualization 7 created: top_toss_winners.png")
+def top_toss_winners(data, path):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    all_toss_winners = eda_data.combined(data, 'toss_winner_counts').nlargest(10)
+    sns.barplot(x=all_toss_winners.index, y=all_toss_winners.values, palette='viridis', ax=ax)
+    ax.set_title('Top 10 Toss Winners (All Matches)')
+    ax.set_xlabel('Team')
+    ax.set_ylabel('Number of Tosses Won')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 8. City vs Number of Matches Played (Scatter Plot - Plotly for Interactivity) --- #
-all_cities_df = pd.concat([test_df['city'], odi_df['city'], t20_df['city'], ipl_df['city']]).dropna().value_counts().reset_index()
-all_cities_df.columns = ['city', 'match_count']
-fig_city_matches = px.scatter(all_cities_df, x='city', y='match_count', size='match_count', color='match_count',
-                             hover_name='city', size_max=60, title='City vs Number of Matches Played')
-fig_city_matches.write_html(os.path.join(data_dir, "city_vs_matches.html"))
-print("Visualization 8 created: city_vs_matches.html")
+def city_vs_matches(data, path):
+    all_cities_df = eda_data.combined(data, 'city_counts').sort_values(ascending=False).reset_index()
+    all_cities_df.columns = ['city', 'match_count']
+    fig_city_matches = px.scatter(all_cities_df, x='city', y='match_count', size='match_count', color='match_count',
+                                  hover_name='city', size_max=60, title='City vs Number of Matches Played')
+    # plotly.js is loaded from its CDN instead of inlined, the figure JSON is what eda_visuals_present.py draws #
+    fig_city_matches.write_html(path, include_plotlyjs='cdn')
+    fig_city_matches.write_json(os.path.splitext(path)[0] + ".json")
 
 # --- 9. Season vs Runs Scored (Box Plot - IPL) --- #
-if 'season' in ipl_df.columns and 'runs_total' in ipl_df.columns:
-    plt.figure(figsize=(12, 7))
-    sns.boxplot(x='season', y='runs_total', data=ipl_df, palette='Set3')
-    plt.title('Runs Scored per Delivery by Season (IPL)')
-    plt.xlabel('Season')
-    plt.ylabel('Runs Total')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    plt.savefig(os.path.join(data_dir, "ipl_season_runs.png"))
-    plt.close()
-    print("Visualization 9 created: ipl_season_runs.png")
-else:
-    print("Warning: 'season' or 'runs_total' column not found in IPL DataFrame for visualization 9.")
+def ipl_season_runs(data, path):
+    # the box plot statistics come from the per season histogram of the runs per delivery #
+    stats = eda_data.box_stats(data["IPL"]['season_runs'])
+    fig, ax = plt.subplots(figsize=(12, 7))
+    boxes = ax.bxp(stats, patch_artist=True)
+    for box, color in zip(boxes['boxes'], sns.color_palette('Set3', len(stats))):
+        box.set_facecolor(color)
+    ax.set_title('Runs Scored per Delivery by Season (IPL)')
+    ax.set_xlabel('Season')
+    ax.set_ylabel('Runs Total')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
 
 # --- 10. Top 10 Player of the Match Winners (All Matches) --- #
-plt.figure(figsize=(10, 8))
-all_pom = pd.concat([test_df['player_of_match'].dropna(), odi_df['player_of_match'].dropna(),
-                      t20_df['player_of_match'].dropna(), ipl_df['player_of_match'].dropna()]).value_counts().nlargest(10)
-sns.barplot(x=all_pom.values, y=all_pom.index, palette='plasma')
-plt.title('Top 10 Player of the Match Winners (All Matches)')
-plt.xlabel('Number of Player of the Match Awards')
-plt.ylabel('Player')
-plt.tight_layout()
-plt.savefig(os.path.join(data_dir, "top_pom_winners.png"))
-plt.close()
-print("Visualization 10 created: top_pom_winners.png")
-
-print("All 10 visualizations created and saved as image/HTML files in your data directory.")
\ No newline at end of file
+def top_pom_winners(data, path):
+    fig, ax = plt.subplots(figsize=(10, 8))
+    all_pom = eda_data.combined(data, 'pom_counts').nlargest(10)
+    sns.barplot(x=all_pom.values, y=all_pom.index, palette='plasma', ax=ax)
+    ax.set_title('Top 10 Player of the Match Winners (All Matches)')
+    ax.set_xlabel('Number of Player of the Match Awards')
+    ax.set_ylabel('Player')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+### Registry : output file -> (render function, the summaries it reads per format, ALL -> every format) ###
+CHARTS = {
+    "matches_per_season.png": (matches_per_season, {ALL: ["season_counts"]}),
+    "top_venues.png": (top_venues, {ALL: ["venue_counts"]}),
+    "odi_toss_decision.png": (odi_toss_decision, {"ODI": ["toss_decision_counts"]}),
+    "test_winners.png": (test_winners, {"Test": ["winner_counts"]}),
+    "ipl_runs_per_over.png": (ipl_runs_per_over, {"IPL": ["over_runs"]}),
+    "t20_wicket_distribution.png": (t20_wicket_distribution, {"T20": ["wicket_counts"]}),
+    "top_toss_winners.png": (top_toss_winners, {ALL: ["toss_winner_counts"]}),
+    "city_vs_matches.html": (city_vs_matches, {ALL: ["city_counts"]}),
+    "ipl_season_runs.png": (ipl_season_runs, {"IPL": ["season_runs"]}),
+    "top_pom_winners.png": (top_pom_winners, {ALL: ["pom_counts"]}),
+}
+CHART_SUMMARIES = {file_name: summaries for file_name, (_, summaries) in CHARTS.items()}
+
+### Fingerprint of a chart : the store files of the formats it reads, its summaries and its code ###
+def chart_fingerprint(file_name):
+    render, summaries = CHARTS[file_name]
+    formats = eda_data.FORMATS if ALL in summaries else sorted(summaries)
+    digest = hashlib.sha256()
+    digest.update(match_store.fingerprint(store_dir, formats).encode("utf-8"))
+    digest.update(json.dumps(summaries, sort_keys=True).encode("utf-8"))
+    digest.update(inspect.getsource(render).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_fingerprints():
+    path = os.path.join(data_dir, FINGERPRINTS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+def save_fingerprints(fingerprints):
+    path = os.path.join(data_dir, FINGERPRINTS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(fingerprints, fh, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+### The jobs run in the worker processes ###
+def summarize_format(match_format):
+    eda_data.SummaryCache(store_dir, CHART_SUMMARIES).refresh(match_format)
+    return match_format
+
+def render_chart(file_name, summaries):
+    render, declaration = CHARTS[file_name]
+    formats = eda_data.FORMATS if ALL in declaration else list(declaration)
+    render({match_format: summaries[match_format] for match_format in formats if match_format in summaries},
+           os.path.join(data_dir, file_name))
+    return file_name
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the EDA charts whose input data changed.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="charts rendered at the same time")
+    parser.add_argument("--force", action="store_true", help="render every chart, changed or not")
+    args = parser.parse_args(argv)
+
+    if match_store.dataset(store_dir) is None:
+        print("Error: Match store not found. Please run cricsheet_ingest.py to create it in the specified directory.")
+        return 1
+
+    fingerprints = load_fingerprints()
+    current = {file_name: chart_fingerprint(file_name) for file_name in CHARTS}
+    stale = [file_name for file_name in CHARTS
+             if args.force or fingerprints.get(file_name) != current[file_name]
+             or not os.path.exists(os.path.join(data_dir, file_name))]
+    for file_name in CHARTS:
+        if file_name not in stale:
+            print(f"Visualization unchanged: {file_name}")
+    if not stale:
+        print("All visualizations are up to date.")
+        return 0
+
+    cache = eda_data.SummaryCache(store_dir, CHART_SUMMARIES)
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(stale)))) as executor:
+        # the summaries of the formats whose store files changed, one pass per format in parallel #
+        for match_format in executor.map(summarize_format, cache.stale_formats()):
+            print(f"Summaries of the {match_format} deliveries computed.")
+        summaries = cache.load()
+        futures = {executor.submit(render_chart, file_name, summaries): file_name for file_name in stale}
+        for future in as_completed(futures):
+            file_name = future.result()
+            # recorded as soon as it is written, an interrupted run keeps the charts already done #
+            fingerprints[file_name] = current[file_name]
+            save_fingerprints(fingerprints)
+            print(f"Visualization {list(CHARTS).index(file_name) + 1} created: {file_name}")
+
+    print(f"{len(stale)} of {len(CHARTS)} visualizations created and saved as image/HTML files in your data directory.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,6 @@
 import streamlit as st
+import io
+import json
 import os
 from PIL import Image # To open our visuals stored as PNG images
 import streamlit.components.v1 as components # To embed HTML
@@ -41,6 +43,41 @@ visualizations = [
      "Celebrating the most impactful players! This chart highlights the top 10 cricketers who have received the highest number of 'Player of the Match' awards across Test, ODI, T20, and IPL matches.")
 ]
 
+### --- Asset cache --- ###
+# Every visual is decoded once per (file, modification time, size) and shared by all the sessions:
+#   images -> downscaled to the chosen width and re-encoded as WebP, a fraction of the PNG bytes
+#   interactive charts -> the Plotly figure JSON written next to the HTML by eda_visuals.py, drawn with
+#                         st.plotly_chart, so plotly.js comes once with the Streamlit page instead of
+#                         inlined in every HTML file
+# A file rewritten by eda_visuals.py has a new modification time and is decoded again.
+IMAGE_WIDTHS = {"Standard (1200 px)": 1200, "Compact (800 px)": 800, "Original size": None}
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_image(file_path, mtime_ns, width):
+    buffer = io.BytesIO()
+    with Image.open(file_path) as image:
+        if width and image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        image.convert("RGB").save(buffer, "WEBP", quality=85, method=4)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_figure(file_path, mtime_ns):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_html(file_path, mtime_ns):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def modified(file_path):
+    """The modification time of a file, None when it does not exist (one stat per rerun)."""
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
 ### --- Building the Streamlit App Layout --- ###
 st.set_page_config(layout="wide", page_title=app_title)
 
@@ -53,6 +90,8 @@ st.sidebar.header("Navigation")
 page_names = [viz[0] for viz in visualizations]
 selected_page = st.sidebar.radio("Go to Slide:", page_names)
 
+image_width = IMAGE_WIDTHS[st.sidebar.selectbox("Image size:", list(IMAGE_WIDTHS))]
+
 st.sidebar.write("!!! Note: Click Here !!! View the results as Visuals on the right side !!!")
 st.sidebar.info(
     "Click on the radio buttons above to navigate through the visualizations. "
@@ -66,23 +105,27 @@ for viz_title, file_name, file_type, description in visualizations:
         st.write(description) 
 
         file_path = os.path.join(data_dir, file_name)
+        mtime_ns = modified(file_path)
 
-        if not os.path.exists(file_path):
+        if mtime_ns is None:
             st.error(f"Error: Visualization file '{file_name}' not found at '{file_path}'. "
                      "Please ensure you've run 'eda_visualizations.py' to generate all files.")
             break
 
         if file_type == "image":
             try:
-                image = Image.open(file_path)
-                st.image(image, use_column_width=True)
+                st.image(load_image(file_path, mtime_ns, image_width))
             except Exception as e:
                 st.error(f"Could not load image '{file_name}': {e}")
         elif file_type == "html":
+            # the figure is only read when its slide is shown #
+            figure_path = os.path.splitext(file_path)[0] + ".json"
+            figure_mtime_ns = modified(figure_path)
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    html_content = f.read()
-                components.html(html_content, height=600, scrolling=True)
+                if figure_mtime_ns is not None:
+                    st.plotly_chart(load_figure(figure_path, figure_mtime_ns))
+                else:
+                    components.html(load_html(file_path, mtime_ns), height=600, scrolling=True)
             except Exception as e:
                 st.error(f"Could not load HTML file '{file_name}': {e}")
         break # Exits the loop once the right page is found
@@ -0,0 +1,165 @@
+### Index advisor for the insights ###
+# Runs EXPLAIN on every insight of insights.py, once with its default parameters and once with every
+# filter set (the SQL differs), and reports, per query,
+    # full table scans (with the size of the table scanned)
+    # filesorts (ORDER BY / GROUP BY sorted outside an index)
+    # temporary tables (GROUP BY / DISTINCT / UNION materialized outside an index)
+# A full scan of a table of --min-rows rows or more fails the run (exit status 1), so a new insight
+# that misses the indexes of db_loader.py / scorecards.py / rollups.py / star_schema.py is caught.
+
+# Tools used:
+    # query_backends -> the MySQL server or the SQLite file, and their dialect translation
+    # EXPLAIN (MySQL) / EXPLAIN QUERY PLAN (SQLite)
+
+# Usage : python index_advisor.py [--sqlite <db file>] [--schema wide|star] [--min-rows N]
+#                                 [--host ... --user ... --database ...]
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+import insights
+import query_backends
+
+DEFAULT_MIN_ROWS = 10_000  # smaller tables (the rollups, the dimensions) may be scanned
+
+
+def _table_for(alias, query):
+    """Resolves the alias SQLite reports in its plan to the table it stands for."""
+    match = re.search(rf"(?:FROM|JOIN)\s+`?(\w+)`?\s+(?:AS\s+)?{re.escape(alias)}\b", query, re.IGNORECASE)
+    return match.group(1) if match else alias
+
+
+class _RowCounts:
+    """Row counts of the tables of a SQLite database, counted once."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.counts = {}
+
+    def __call__(self, table_name):
+        if table_name not in self.counts:
+            try:
+                self.counts[table_name] = self.conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+            except sqlite3.Error:
+                self.counts[table_name] = None  # a subquery or CTE, not a table
+        return self.counts[table_name]
+
+
+def explain_sqlite(conn, query, row_count, params=()):
+    """Returns the (kind, table, rows) findings of the SQLite plan of query."""
+    findings = []
+    for _, _, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall():
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            name = detail.split()[1]
+            if name.startswith("("):  # a subquery or CTE
+                continue
+            table_name = _table_for(name, query)
+            rows = row_count(table_name)
+            if rows is None:  # the alias of a subquery
+                continue
+            findings.append(("full scan", table_name, rows))
+        elif detail.startswith("USE TEMP B-TREE FOR ORDER BY") or detail.startswith("USE TEMP B-TREE FOR RIGHT PART OF ORDER BY"):
+            findings.append(("filesort", None, None))
+        elif detail.startswith("USE TEMP B-TREE FOR"):
+            findings.append(("temporary table", None, None))
+    return findings
+
+
+def explain_mysql(conn, query, params=()):
+    """Returns the (kind, table, rows) findings of the MySQL plan of query."""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"EXPLAIN {query}", tuple(params))
+    plan = cursor.fetchall()
+    cursor.close()
+    findings = []
+    for step in plan:
+        table_name = step.get("table") or ""
+        extra = step.get("Extra") or ""
+        if step.get("type") == "ALL" and not table_name.startswith("<"):  # <derived2>, <union1,2> : temporary results
+            findings.append(("full scan", table_name, step.get("rows")))
+        if "Using filesort" in extra:
+            findings.append(("filesort", table_name, None))
+        if "Using temporary" in extra:
+            findings.append(("temporary table", table_name, None))
+    return findings
+
+
+def filter_values(backend, conn):
+    """A value of every filter kind (the first season, team, ...), to explain the filtered variants with."""
+    values = {}
+    for kind, query in insights.OPTIONS_SQL.items():
+        try:
+            rows = backend.run(conn, query)
+        except backend.errors:
+            rows = None  # the star schema has no rollups
+        values[kind] = str(rows.iloc[0, 0]) if rows is not None and not rows.empty else "?"
+    return values
+
+
+def variants(queries, values, placeholder):
+    """{label: (sql, params)} : every insight with its defaults and, if it has filters, with all of them set."""
+    compiled = {}
+    for name, insight in queries.items():
+        compiled[name] = insight.compile(placeholder=placeholder)
+        filters = {param.name: values[param.kind] for param in insight.params if param.kind in values}
+        if filters:
+            compiled[f"{name} (filtered)"] = insight.compile(filters, placeholder)
+    return compiled
+
+
+def advise(backend, conn, queries, min_rows=DEFAULT_MIN_ROWS):
+    """Explains every query (a {name: (sql, params)}) and prints its findings.
+    Returns the names of the queries doing a full scan of a table of min_rows rows or more."""
+    row_count = _RowCounts(conn) if backend.name == "sqlite" else None
+    failing = []
+    for name, (query, params) in queries.items():
+        query = backend.translate(query).strip().rstrip(";")
+        if backend.name == "sqlite":
+            findings = explain_sqlite(conn, query, row_count, params)
+        else:
+            findings = explain_mysql(conn, query, params)
+        print(f"{'OK  ' if not findings else 'WARN'} {name}")
+        for kind, table_name, rows in findings:
+            where = f" of {table_name}" if table_name else ""
+            size = f" ({rows:,} rows)" if rows is not None else ""
+            print(f"       {kind}{where}{size}")
+        if any(kind == "full scan" and (rows is None or rows >= min_rows) for kind, _, rows in findings):
+            print(f"       -> full scan of a table of {min_rows:,} rows or more")
+            failing.append(name)
+    return failing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN every insight and report full scans, filesorts and temporary tables.")
+    parser.add_argument("--schema", choices=["wide", "star"], default="wide", help="which set of insights to explain")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="fail on full scans of tables of at least this many rows")
+    parser.add_argument("--sqlite", help="explain against this SQLite database file instead of MySQL")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""), help="defaults to $DB_PASSWORD")
+    parser.add_argument("--database", default="cricket")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        backend = query_backends.SQLiteBackend(args.sqlite)
+    else:
+        backend = query_backends.MySQLBackend(args.host, args.user, args.password, args.database)
+    conn = backend.connect()
+    try:
+        queries = variants(insights.queries_for(args.schema), filter_values(backend, conn), backend.placeholder)
+        failing = advise(backend, conn, queries, args.min_rows)
+    finally:
+        backend.close(conn)
+    if failing:
+        print(f"{len(failing)} insight(s) fully scan a table of {args.min_rows:,} rows or more.")
+        return 1
+    print("No full scans of large tables.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
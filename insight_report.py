@@ -0,0 +1,205 @@
+### Batch report of every insight ###
+# Runs all the insights of insights.py at once instead of one by one from the picker:
+    # the insights run concurrently on `workers` threads, each taking a connection from a
+    # connection_pool.ConnectionPool, so the wall time is close to the one of the slowest insight
+    # the results are yielded as they complete (cricmatchanalysis.py shows each one as it arrives)
+    # the whole set is exported to a single file : .html (one table per insight), .xlsx (one sheet
+    # per insight, needs openpyxl) or .json
+# Every insight runs with its default parameters, through the result cache when one is given.
+
+# Tools used:
+    # concurrent.futures -> the bounded pool of worker threads
+    # connection_pool / query_backends / result_cache -> the connections, the engines and the cached results
+    # pandas -> the result DataFrames and their export
+
+# Usage : python insight_report.py --output <file.html|file.xlsx|file.json> [--workers N] [--schema wide|star]
+#                                  [--sqlite <db file> | --duckdb <match store directory> | --host ... --user ... --database ...]
+
+import argparse
+import html
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import connection_pool
+import insights
+import query_backends
+
+DEFAULT_WORKERS = 4
+EXPORT_FORMATS = (".html", ".xlsx", ".json")
+
+
+class InsightResult:
+    """The outcome of one insight of the batch : its result (None on an error), its SQL and timings."""
+
+    def __init__(self, name, sql, params, result=None, error=None, seconds=0.0, waited=0.0):
+        self.name = name
+        self.sql = sql
+        self.params = params
+        self.result = result
+        self.error = error
+        self.seconds = seconds
+        self.waited = waited
+
+
+def run_insight(backend, conn, sql, params, cache=None):
+    """The result of one compiled insight, read from / written to the result cache when one is given."""
+    if cache is None:
+        return backend.run(conn, sql, params)
+    version = backend.data_version(conn)
+    result = cache.get(backend.name, version, sql, params)
+    if result is None:
+        result = backend.run(conn, sql, params)
+        cache.put(backend.name, version, sql, result, params)
+    return result
+
+
+def write_csv(backend, conn, sql, params, fh, chunk_size=query_backends.DEFAULT_CHUNK_SIZE):
+    """Streams the whole result of sql to the text file fh as CSV, one chunk at a time. Returns the rows written."""
+    rows = 0
+    for chunk in backend.stream(conn, sql, params, chunk_size):
+        chunk.to_csv(fh, index=False, header=rows == 0)
+        rows += len(chunk)
+    return rows
+
+
+def _run_one(pool, name, insight, cache):
+    backend = pool.backend
+    sql, params = insight.compile(placeholder=backend.placeholder)
+    start = time.perf_counter()
+    try:
+        with pool.connection() as (conn, waited):
+            result = run_insight(backend, conn, sql, params, cache)
+    except (connection_pool.PoolTimeout,) + backend.errors as err:
+        return InsightResult(name, sql, params, error=str(err), seconds=time.perf_counter() - start)
+    return InsightResult(name, sql, params, result, seconds=time.perf_counter() - start, waited=waited)
+
+
+def run_on(backend, conn, queries, cache=None):
+    """Runs every insight of queries one after the other on conn, a connection the caller already holds
+    (when the pool has none to spare). Yields an InsightResult per insight, in the order of queries."""
+    for name, insight in queries.items():
+        sql, params = insight.compile(placeholder=backend.placeholder)
+        start = time.perf_counter()
+        try:
+            result = run_insight(backend, conn, sql, params, cache)
+        except backend.errors as err:
+            yield InsightResult(name, sql, params, error=str(err), seconds=time.perf_counter() - start)
+        else:
+            yield InsightResult(name, sql, params, result, seconds=time.perf_counter() - start)
+
+
+def run_all(pool, queries, workers=DEFAULT_WORKERS, cache=None):
+    """Runs every insight of queries ({name: Insight}) on at most `workers` threads (and never more
+    than the pool has connections). Yields an InsightResult per insight, in completion order."""
+    workers = max(1, min(workers, pool.size, len(queries) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insight") as executor:
+        futures = [executor.submit(_run_one, pool, name, insight, cache) for name, insight in queries.items()]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _sheet_names(names):
+    """Excel sheet names : at most 31 characters, unique."""
+    sheets = []
+    for number, name in enumerate(names, start=1):
+        sheet = "".join(char for char in name if char not in "[]:*?/\\")[:31]
+        if sheet in sheets:
+            sheet = f"{sheet[:27]} ({number})"
+        sheets.append(sheet)
+    return sheets
+
+
+def export(results, path):
+    """Writes the results (InsightResults, in report order) to a single .html, .xlsx or .json file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown report format '{extension}', expected one of {', '.join(EXPORT_FORMATS)}.")
+
+    if extension == ".xlsx":
+        with pd.ExcelWriter(path) as writer:
+            for sheet, item in zip(_sheet_names([item.name for item in results]), results):
+                frame = item.result if item.result is not None else pd.DataFrame({"error": [item.error]})
+                frame.to_excel(writer, sheet_name=sheet, index=False)
+    elif extension == ".json":
+        report = [{
+            "insight": item.name,
+            "sql": item.sql,
+            "params": item.params,
+            "seconds": round(item.seconds, 4),
+            "error": item.error,
+            "rows": json.loads(item.result.to_json(orient="records")) if item.result is not None else None,
+        } for item in results]
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        parts = ["<html><head><meta charset='utf-8'><title>Cricket Match Data Level Insights</title></head><body>",
+                 "<h1>Cricket Match Data Level Insights</h1>"]
+        for item in results:
+            parts.append(f"<h2>{html.escape(item.name)}</h2>")
+            if item.result is None:
+                parts.append(f"<p>Error: {html.escape(item.error or '')}</p>")
+            elif item.result.empty:
+                parts.append("<p>No results found for this query.</p>")
+            else:
+                parts.append(item.result.to_html(index=False))
+            parts.append(f"<p><small>{item.seconds * 1000:.1f} ms</small></p>")
+        parts.append("</body></html>")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every insight concurrently and export the results to one file.")
+    parser.add_argument("--output", required=True, help="report file, .html, .xlsx or .json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="insights run at the same time")
+    parser.add_argument("--schema", choices=["wide", "star"], default="wide", help="which set of insights to run")
+    parser.add_argument("--timeout", type=float, help="abort insights running longer than this many seconds")
+    parser.add_argument("--sqlite", help="run against this SQLite database file instead of MySQL")
+    parser.add_argument("--duckdb", help="run on DuckDB over this match store directory instead of MySQL")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""), help="defaults to $DB_PASSWORD")
+    parser.add_argument("--database", default="cricket")
+    args = parser.parse_args(argv)
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        parser.error(f"--output must end with one of {', '.join(EXPORT_FORMATS)}")
+    if extension == ".xlsx" and importlib.util.find_spec("openpyxl") is None:
+        parser.error("an .xlsx report needs openpyxl (pip install openpyxl)")
+
+    if args.sqlite:
+        backend = query_backends.SQLiteBackend(args.sqlite, args.timeout)
+    elif args.duckdb:
+        backend = query_backends.DuckDBBackend(args.duckdb, args.timeout)
+    else:
+        backend = query_backends.MySQLBackend(args.host, args.user, args.password, args.database, args.timeout)
+    queries = insights.queries_for(args.schema)
+    pool = connection_pool.ConnectionPool(backend, size=max(1, args.workers))
+
+    start = time.perf_counter()
+    results = {}
+    try:
+        for item in run_all(pool, queries, args.workers):
+            results[item.name] = item
+            status = f"{len(item.result)} rows" if item.result is not None else f"ERROR {item.error}"
+            print(f"{item.seconds * 1000:8.1f} ms  {item.name} ({status})")
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - start
+
+    export([results[name] for name in queries], args.output)
+    slowest = max((item.seconds for item in results.values()), default=0.0)
+    total = sum(item.seconds for item in results.values())
+    print(f"{len(results)} insights in {elapsed:.2f}s (slowest {slowest:.2f}s, {total:.2f}s if run one by one), "
+          f"written to {args.output}.")
+    return 1 if any(item.error for item in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+### The insights of the Streamlit app ###
+# The insights cricmatchanalysis.py lets the user pick from, kept in their own module so the
+# tools (index_advisor.py, ...) can use them without starting Streamlit.
+# Every insight has typed parameters (format, season, team, venue, player, limits) rendered as widgets
+# and compiles to bound-parameter SQL:
+    # the filters are part of the WHERE clause (pushed down to the indexed tables, never applied in pandas)
+    # [[ ... ]] blocks are only kept when every :param inside them is set
+    # the SQL text only depends on which filters are set, so the prepared statement of a connection
+    # is reused whatever the values are
+    # with only the format (and player) set, an insight reads the rollups (rollups.py), with a season,
+    # team or venue filter it aggregates the innings scorecards or the per match rollup instead
+# star_schema.STAR_SQL_QUERIES has the insights written against the normalized star schema (no parameters).
+# The 20 fixed insights of the app became the 17 below : the IPL top 5 batsmen / bowlers and the venue
+# with the most Test matches are "Top batsmen by total runs", "Leading wicket-takers" and "Most common
+# venues" with other filter values, the README lists every former name with the insight replacing it.
+
+import re
+
+import pandas as pd
+
+import star_schema
+
+FORMATS = list(star_schema.FORMATS)
+ALL = "All"  # the widget choice of an optional filter that is not set
+
+_MARKER = re.compile(r":(\w+)")
+_OPTIONAL = re.compile(r"\[\[(.*?)\]\]", re.DOTALL)
+# the ORDER BY (and LIMIT) ending a statement #
+_FINAL_ORDER = re.compile(r"ORDER\s+BY\s+((?:(?!ORDER\s+BY|\)).)+?)(?:\s+LIMIT\s+[^;)]+)?\s*;?\s*$",
+                          re.IGNORECASE | re.DOTALL)
+_ORDER_KEY = re.compile(r"^(\w+)(?:\s+(ASC|DESC))?$", re.IGNORECASE)
+
+# the values offered by the season / team / venue / player widgets #
+OPTIONS_SQL = {
+    "season": "SELECT DISTINCT season FROM rollup_seasons ORDER BY season",
+    "team": "SELECT DISTINCT team FROM rollup_teams ORDER BY team",
+    "venue": "SELECT DISTINCT venue FROM rollup_venues WHERE venue <> '' ORDER BY venue",
+    "player": "SELECT DISTINCT player FROM rollup_players ORDER BY player",
+}
+
+
+class Param:
+    """A typed insight parameter : kind is "format", "season", "team", "venue", "player" or "int".
+    A parameter without a default is an optional filter."""
+
+    def __init__(self, name, kind, label, default=None, minimum=1, maximum=100):
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def coerce(self, value):
+        """The bound value of a widget value, None for an unset optional filter."""
+        if value is None or value == "" or value == ALL:
+            return self.default
+        if self.kind == "int":
+            return max(self.minimum, min(self.maximum, int(value)))
+        if self.kind == "format" and value not in FORMATS:
+            raise ValueError(f"Unknown format '{value}', expected one of {', '.join(FORMATS)}.")
+        return str(value)
+
+
+class Insight:
+    """An insight : its SQL, its parameters and, optionally, the detail SQL used when a filter the
+    (rollup) SQL has no :marker for is set. unique_order tells that the ORDER BY of both SQLs ends on
+    a key no two rows of the result share, so its result can be paged by keyset (see page)."""
+
+    def __init__(self, name, sql, params=(), detail_sql=None, unique_order=False):
+        self.name = name
+        self.sql = sql
+        self.params = list(params)
+        self.detail_sql = detail_sql
+        self.unique_order = unique_order
+
+    def defaults(self):
+        return {param.name: param.default for param in self.params}
+
+    def bind(self, values=None):
+        """The {name: value} of every parameter, unset filters being None."""
+        values = values or {}
+        return {param.name: param.coerce(values.get(param.name)) for param in self.params}
+
+    def template(self, bound):
+        """The SQL able to apply every filter that is set."""
+        if self.detail_sql:
+            supported = set(_MARKER.findall(self.sql))
+            if any(value is not None and name not in supported for name, value in bound.items()):
+                return self.detail_sql
+        return self.sql
+
+    def compile(self, values=None, placeholder="%s"):
+        """Returns (sql, args) : the statement with placeholder markers and the values they are bound to."""
+        bound = self.bind(values)
+
+        def _optional(block):
+            names = _MARKER.findall(block.group(1))
+            return block.group(1) if all(bound.get(name) is not None for name in names) else ""
+
+        sql = _OPTIONAL.sub(_optional, self.template(bound))
+        args = []
+
+        def _bind(marker):
+            args.append(bound[marker.group(1)])
+            return placeholder
+
+        sql = _MARKER.sub(_bind, sql)
+        # the blocks left out leave blank lines behind #
+        sql = "\n".join(line for line in sql.splitlines() if line.strip())
+        return sql, args
+
+
+def _format(default=None):
+    return Param("format", "format", "Format", default)
+
+
+def _limit(default):
+    return Param("limit", "int", "Rows", default)
+
+
+SEASON = Param("season", "season", "Season")
+TEAM = Param("team", "team", "Team")
+VENUE = Param("venue", "venue", "Venue")
+PLAYER = Param("player", "player", "Player")
+
+# the filters of the innings scorecards, the venue comes from the per match rollup #
+_SCORECARD_FILTERS = """
+            [[AND season = :season]]
+            [[AND team = :team]]
+            [[AND match_id IN (SELECT match_id FROM rollup_matches WHERE venue = :venue)]]
+            [[AND {player} = :player]]"""
+
+_MATCH_FILTERS = """
+            [[AND season = :season]]
+            [[AND (team1 = :team OR team2 = :team)]]
+            [[AND venue = :venue]]"""
+
+INSIGHTS = [
+    Insight("Top batsmen by total runs", """
+        SELECT player AS batter, runs AS total_runs
+        FROM rollup_players
+        WHERE format = :format
+        ORDER BY total_runs DESC, batter
+        LIMIT :limit;
+    """, [_format("ODI"), SEASON, TEAM, VENUE, _limit(10)], detail_sql="""
+        SELECT batter, SUM(runs) AS total_runs
+        FROM batting_scorecards
+        WHERE format = :format""" + _SCORECARD_FILTERS.format(player="batter") + """
+        GROUP BY batter
+        ORDER BY total_runs DESC, batter
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Leading wicket-takers", """
+        SELECT player AS bowler, wickets AS total_wickets
+        FROM rollup_players
+        WHERE format = :format AND wickets > 0
+        ORDER BY total_wickets DESC, bowler
+        LIMIT :limit;
+    """, [_format("T20"), SEASON, TEAM, VENUE, _limit(10)], detail_sql="""
+        SELECT bowler, SUM(wickets) AS total_wickets
+        FROM bowling_scorecards
+        WHERE format = :format""" + _SCORECARD_FILTERS.format(player="bowler") + """
+        GROUP BY bowler
+        HAVING SUM(wickets) > 0
+        ORDER BY total_wickets DESC, bowler
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Teams with the highest win percentage", """
+        SELECT team, (CAST(wins AS DECIMAL) / matches) * 100 AS win_percentage
+        FROM rollup_teams
+        WHERE format = :format AND wins > 0
+        ORDER BY win_percentage DESC, team
+        LIMIT :limit;
+    """, [_format("Test"), SEASON, VENUE, _limit(1)], detail_sql="""
+        SELECT team, (CAST(SUM(won) AS DECIMAL) / COUNT(*)) * 100 AS win_percentage
+        FROM (
+            SELECT team1 AS team, CASE WHEN winner = team1 THEN 1 ELSE 0 END AS won
+            FROM rollup_matches
+            WHERE format = :format [[AND season = :season]] [[AND venue = :venue]]
+            UNION ALL
+            SELECT team2 AS team, CASE WHEN winner = team2 THEN 1 ELSE 0 END AS won
+            FROM rollup_matches
+            WHERE format = :format [[AND season = :season]] [[AND venue = :venue]]
+        ) AS results
+        GROUP BY team
+        HAVING SUM(won) > 0
+        ORDER BY win_percentage DESC, team
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Centuries by batter", """
+        SELECT format AS match_type, player AS batter, hundreds AS centuries
+        FROM rollup_players
+        WHERE hundreds > 0 [[AND format = :format]] [[AND player = :player]]
+        ORDER BY centuries DESC, match_type, batter;
+    """, [_format(), SEASON, TEAM, VENUE, PLAYER], detail_sql="""
+        SELECT format AS match_type, batter, COUNT(*) AS centuries
+        FROM batting_scorecards
+        WHERE runs >= 100 [[AND format = :format]]""" + _SCORECARD_FILTERS.format(player="batter") + """
+        GROUP BY format, batter
+        ORDER BY centuries DESC, match_type, batter;
+    """, unique_order=True),
+    Insight("Most frequent player of the match", """
+        SELECT player AS player_of_match, SUM(awards) AS count
+        FROM rollup_awards
+        WHERE awards > 0 [[AND format = :format]] [[AND season = :season]]
+        GROUP BY player
+        ORDER BY count DESC, player_of_match
+        LIMIT :limit;
+    """, [_format(), SEASON, _limit(1)], unique_order=True),
+    Insight("Bowlers with the best average (min wickets)", """
+        SELECT
+            player AS bowler,
+            runs_conceded,
+            wickets AS wickets_taken,
+            CAST(runs_conceded AS DECIMAL) / wickets AS bowling_average
+        FROM rollup_players
+        WHERE format = :format AND wickets >= :min_wickets [[AND player = :player]]
+        ORDER BY bowling_average ASC, bowler
+        LIMIT :limit;
+    """, [_format("ODI"), SEASON, TEAM, VENUE, PLAYER,
+          Param("min_wickets", "int", "Minimum wickets", 50, maximum=1000), _limit(10)], detail_sql="""
+        SELECT
+            bowler,
+            SUM(runs) AS runs_conceded,
+            SUM(wickets) AS wickets_taken,
+            CAST(SUM(runs) AS DECIMAL) / SUM(wickets) AS bowling_average
+        FROM bowling_scorecards
+        WHERE format = :format""" + _SCORECARD_FILTERS.format(player="bowler") + """
+        GROUP BY bowler
+        HAVING SUM(wickets) >= :min_wickets
+        ORDER BY bowling_average ASC, bowler
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Most common venues", """
+        SELECT venue, SUM(matches) AS match_count
+        FROM rollup_venues
+        WHERE format = :format
+        GROUP BY venue
+        ORDER BY match_count DESC, venue
+        LIMIT :limit;
+    """, [_format("IPL"), SEASON, TEAM, _limit(1)], detail_sql="""
+        SELECT venue, COUNT(*) AS match_count
+        FROM rollup_matches
+        WHERE format = :format""" + _MATCH_FILTERS + """
+        GROUP BY venue
+        ORDER BY match_count DESC, venue
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Teams that have won the most tosses", """
+        SELECT team AS toss_winner, tosses_won
+        FROM rollup_teams
+        WHERE format = :format AND tosses_won > 0
+        ORDER BY tosses_won DESC, toss_winner
+        LIMIT :limit;
+    """, [_format("Test"), SEASON, VENUE, _limit(5)], detail_sql="""
+        SELECT toss_winner, COUNT(*) AS tosses_won
+        FROM rollup_matches
+        WHERE format = :format AND toss_winner <> ''""" + _MATCH_FILTERS + """
+        GROUP BY toss_winner
+        ORDER BY tosses_won DESC, toss_winner
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Most frequent toss decision", """
+        SELECT toss_decision, SUM(matches) AS decision_count
+        FROM rollup_seasons
+        WHERE format = :format [[AND season = :season]]
+        GROUP BY toss_decision
+        ORDER BY decision_count DESC, toss_decision
+        LIMIT :limit;
+    """, [_format("ODI"), SEASON, TEAM, VENUE, _limit(1)], detail_sql="""
+        SELECT toss_decision, COUNT(*) AS decision_count
+        FROM rollup_matches
+        WHERE format = :format""" + _MATCH_FILTERS + """
+        GROUP BY toss_decision
+        ORDER BY decision_count DESC, toss_decision
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Number of matches played in each season", """
+        SELECT season, format AS match_type, SUM(matches) AS matches_played
+        FROM rollup_seasons
+        WHERE matches > 0 [[AND format = :format]] [[AND season = :season]]
+        GROUP BY season, format
+        ORDER BY season, match_type;
+    """, [_format(), SEASON, TEAM, VENUE], detail_sql="""
+        SELECT season, format AS match_type, COUNT(*) AS matches_played
+        FROM rollup_matches
+        WHERE matches > 0 [[AND format = :format]]""" + _MATCH_FILTERS + """
+        GROUP BY season, format
+        ORDER BY season, match_type;
+    """, unique_order=True),
+    Insight("Cities with the most matches", """
+        SELECT city, SUM(matches) AS match_count
+        FROM rollup_venues
+        WHERE city <> '' [[AND format = :format]]
+        GROUP BY city
+        ORDER BY match_count DESC, city
+        LIMIT :limit;
+    """, [_format(), SEASON, TEAM, _limit(1)], detail_sql="""
+        SELECT city, COUNT(*) AS match_count
+        FROM rollup_matches
+        WHERE city <> '' [[AND format = :format]]""" + _MATCH_FILTERS + """
+        GROUP BY city
+        ORDER BY match_count DESC, city
+        LIMIT :limit;
+    """, unique_order=True),
+    Insight("Teams that have won after losing the toss", """
+        SELECT team AS winner, wins_after_losing_toss
+        FROM rollup_teams
+        WHERE format = :format AND wins_after_losing_toss > 0
+        ORDER BY wins_after_losing_toss DESC, winner;
+    """, [_format("T20"), SEASON, VENUE], detail_sql="""
+        SELECT winner, COUNT(*) AS wins_after_losing_toss
+        FROM rollup_matches
+        WHERE format = :format AND winner IN (team1, team2) AND toss_winner <> winner""" + _MATCH_FILTERS + """
+        GROUP BY winner
+        ORDER BY wins_after_losing_toss DESC, winner;
+    """, unique_order=True),
+    Insight("Average runs scored per over", """
+        SELECT CAST(SUM(runs) AS DECIMAL) / SUM(overs) AS average_runs_per_over
+        FROM rollup_seasons
+        WHERE format = :format [[AND season = :season]];
+    """, [_format("IPL"), SEASON, TEAM, VENUE], detail_sql="""
+        SELECT CAST(SUM(runs) AS DECIMAL) / SUM(overs) AS average_runs_per_over
+        FROM rollup_matches
+        WHERE format = :format""" + _MATCH_FILTERS + """;
+    """),
+    Insight("Players who have been player of the match in the most seasons", """
+        SELECT player AS player_of_match, COUNT(DISTINCT season) AS seasons_as_pom
+        FROM rollup_awards
+        WHERE awards > 0 [[AND format = :format]]
+        GROUP BY player
+        ORDER BY seasons_as_pom DESC, player_of_match
+        LIMIT :limit;
+    """, [_format(), _limit(10)], unique_order=True),
+    Insight("Number of drawn matches", """
+        SELECT SUM(draws) AS drawn_matches
+        FROM rollup_seasons
+        WHERE format = :format [[AND season = :season]];
+    """, [_format("Test"), SEASON, TEAM, VENUE], detail_sql="""
+        SELECT COUNT(*) AS drawn_matches
+        FROM rollup_matches
+        WHERE format = :format AND winner = 'draw'""" + _MATCH_FILTERS + """;
+    """),
+    Insight("Matches with the highest total runs", """
+        SELECT format AS match_type, season, team1, team2, runs AS total_runs, match_id
+        FROM rollup_matches
+        WHERE matches > 0 [[AND format = :format]]""" + _MATCH_FILTERS + """
+        ORDER BY total_runs DESC, match_type, match_id
+        LIMIT :limit;
+    """, [_format(), SEASON, TEAM, VENUE, _limit(1)], unique_order=True),
+    Insight("Highest individual scores", """
+        SELECT batter, runs AS highest_score
+        FROM batting_scorecards
+        WHERE format = :format""" + _SCORECARD_FILTERS.format(player="batter") + """
+        ORDER BY highest_score DESC, batter
+        LIMIT :limit;
+    """, [_format("ODI"), SEASON, TEAM, VENUE, PLAYER, _limit(1)]),
+]
+
+
+def order_keys(sql):
+    """The [(column, descending)] of the ORDER BY ending sql, None when it is missing or sorts on
+    anything else than plain column names (qualified names, expressions)."""
+    match = _FINAL_ORDER.search(sql)
+    if not match:
+        return None
+    keys = []
+    for item in match.group(1).split(","):
+        key = _ORDER_KEY.match(item.strip())
+        if not key:
+            return None
+        keys.append((key.group(1), (key.group(2) or "").upper() == "DESC"))
+    return keys
+
+
+def page(sql, params, page_size, after=None, offset=0, placeholder="%s"):
+    """Returns (sql, args) reading one page of page_size rows of the compiled insight (sql, params).
+    With after (the values of the order_keys of the last row read) the page keeps the rows ordered
+    after that row (keyset pagination), otherwise it skips offset rows. Either way the insight is a
+    derived table of the page query : the database computes its whole result for every page, only
+    the rows of the page are transferred. A keyset page neither repeats nor skips a row only when the
+    ORDER BY is unique (Insight.unique_order), the other insights are paged by offset.
+    The page query repeats the ORDER BY of the insight : the order of a derived table is not kept by
+    the outer query (MariaDB drops it, MySQL may when it materializes the table)."""
+    inner = sql.strip().rstrip(";")
+    args = list(params)
+    keys = order_keys(inner)
+    order = ", ".join(f"{column}{' DESC' if descending else ''}" for column, descending in keys or [])
+    if keys and after is not None:
+        # (k1 < v1) OR (k1 = v1 AND k2 > v2) OR ... for ORDER BY k1 DESC, k2 ... #
+        clauses = []
+        for position, (column, descending) in enumerate(keys):
+            terms = [f"{key} = {placeholder}" for key, _ in keys[:position]]
+            terms.append(f"{column} {'<' if descending else '>'} {placeholder}")
+            clauses.append(f"({' AND '.join(terms)})")
+            args += list(after[:position + 1])
+        return (f"SELECT * FROM (\n{inner}\n) AS page_rows\nWHERE {' OR '.join(clauses)}\n"
+                f"ORDER BY {order}\nLIMIT {placeholder}"), args + [page_size]
+    order = f"\nORDER BY {order}" if order else ""
+    return f"SELECT * FROM (\n{inner}\n) AS page_rows{order}\nLIMIT {placeholder} OFFSET {placeholder}", args + [page_size, offset]
+
+
+def after_values(sql, rows):
+    """The keyset (see page) of the last of rows, None when the insight cannot be paged by keyset :
+    no plain ORDER BY, an ORDER BY on columns the insight does not return, or a NULL key."""
+    keys = order_keys(sql)
+    if not keys or rows.empty or any(column not in rows.columns for column, _ in keys):
+        return None
+    last = rows.iloc[-1]
+    values = [last[column] for column, _ in keys]
+    if any(pd.isna(value) for value in values):
+        return None
+    # numpy scalars -> python values the drivers can bind #
+    return tuple(value.item() if hasattr(value, "item") else value for value in values)
+
+
+def queries_for(schema="wide"):
+    """The {name: Insight} to offer for the given schema ("wide" or "star")."""
+    if schema == "star":
+        return {name: Insight(name, sql) for name, sql in star_schema.STAR_SQL_QUERIES.items()}
+    return {insight.name: insight for insight in INSIGHTS}
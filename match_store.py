@@ -0,0 +1,212 @@
+### Columnar Parquet storage of the ingested deliveries ###
+# Replaces the intermediate test.csv / ODI.csv / T20.csv / IPL.csv files.
+    # <store_dir>/deliveries/format=<Test|ODI|T20|IPL>/season=<season>/part-*.parquet (hive partitioned)
+    # <store_dir>/batting/... and <store_dir>/bowling/... -> the innings scorecards, partitioned the same way
+    # names (batter, bowler, venue, team, ...) are dictionary encoded, runs/overs are small integers
+    # readers project only the columns they need and push format/season/match filters down to the files
+
+# Tools used:
+    # pyarrow -> parquet files and datasets (column projection and predicate filtering)
+    # pandas -> the DataFrames handed to the loader and the EDA script
+
+import glob
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DELIVERIES = "deliveries"
+BATTING = "batting"
+BOWLING = "bowling"
+
+# format is the Cricsheet zip the match came from (an IPL match has match_type T20) #
+PARTITIONING = ds.partitioning(pa.schema([("format", pa.string()), ("season", pa.string())]), flavor="hive")
+
+_NAME = pa.dictionary(pa.int32(), pa.string())
+
+DELIVERY_SCHEMA = pa.schema([
+    ("match_id", pa.string()),
+    ("match_type", _NAME),
+    ("city", _NAME),
+    ("venue", _NAME),
+    ("toss_winner", _NAME),
+    ("toss_decision", _NAME),
+    ("winner", _NAME),
+    ("player_of_match", _NAME),
+    ("teams", _NAME),
+    ("team", _NAME),
+    ("innings", pa.int8()),
+    ("over", pa.int16()),
+    ("ball", pa.int16()),
+    ("batter", _NAME),
+    ("bowler", _NAME),
+    ("non_striker", _NAME),
+    ("runs_batter", pa.int16()),
+    ("runs_extras", pa.int16()),
+    ("runs_total", pa.int16()),
+    ("wicket", _NAME),
+])
+
+BATTING_SCHEMA = pa.schema([
+    ("match_id", pa.string()),
+    ("innings", pa.int8()),
+    ("team", _NAME),
+    ("position", pa.int8()),
+    ("batter", _NAME),
+    ("runs", pa.int16()),
+    ("balls", pa.int16()),
+    ("fours", pa.int16()),
+    ("sixes", pa.int16()),
+    ("dismissed", pa.int8()),
+])
+
+BOWLING_SCHEMA = pa.schema([
+    ("match_id", pa.string()),
+    ("innings", pa.int8()),
+    ("team", _NAME),
+    ("bowler", _NAME),
+    ("balls", pa.int16()),
+    ("maidens", pa.int16()),
+    ("runs", pa.int16()),
+    ("wickets", pa.int8()),
+])
+
+SCHEMAS = {DELIVERIES: DELIVERY_SCHEMA, BATTING: BATTING_SCHEMA, BOWLING: BOWLING_SCHEMA}
+
+DEFAULT_CHUNK_ROWS = 200_000 # rows per DataFrame handed out by iter_chunks
+
+
+def dataset_dir(store_dir, name=DELIVERIES):
+    return os.path.join(store_dir, name)
+
+
+def to_table(batch, match_format, name=DELIVERIES):
+    """Converts a columnar batch (dict of column -> list) of one format into a typed arrow table."""
+    schema = SCHEMAS[name]
+    arrays = []
+    for field in schema:
+        values = batch[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    # seasons are either 2019 or "2007/08" in the JSON, the partition key is always text #
+    seasons = [None if season is None else str(season) for season in batch["season"]]
+    table = table.append_column("format", pa.array([match_format] * table.num_rows, type=pa.string()))
+    return table.append_column("season", pa.array(seasons, type=pa.string()))
+
+
+def write_batch(store_dir, match_format, batch, run_id, seq, name=DELIVERIES):
+    """Writes one columnar batch into its format/season partitions as part-<run_id>-<seq>-*.parquet files."""
+    table = to_table(batch, match_format, name)
+    if not table.num_rows:
+        return
+    ds.write_dataset(table, dataset_dir(store_dir, name), format="parquet", partitioning=PARTITIONING,
+                     basename_template=f"part-{run_id}-{seq}-{{i}}.parquet",
+                     existing_data_behavior="overwrite_or_ignore")
+
+
+def compact(store_dir, run_id, name=DELIVERIES):
+    """Merges the files of every partition written to by run_id into a single file."""
+    pattern = os.path.join(dataset_dir(store_dir, name), "**", f"part-{run_id}-*.parquet")
+    partitions = {os.path.dirname(path) for path in glob.glob(pattern, recursive=True)}
+    for partition in partitions:
+        files = sorted(glob.glob(os.path.join(partition, "*.parquet")))
+        if len(files) < 2:
+            continue
+        table = pa.concat_tables([pq.read_table(path) for path in files], promote_options="permissive")
+        merged = os.path.join(partition, f"part-{run_id}-merged.parquet")
+        pq.write_table(table, merged + ".tmp")
+        for path in files:
+            os.remove(path)
+        os.replace(merged + ".tmp", merged)
+    return len(partitions)
+
+
+def drop_matches(store_dir, match_ids, name=DELIVERIES):
+    """Rewrites the files holding rows of the given matches without them."""
+    match_ids = pa.array(sorted(match_ids), type=pa.string())
+    directory = dataset_dir(store_dir, name)
+    if not len(match_ids) or not os.path.isdir(directory):
+        return
+    for path in glob.glob(os.path.join(directory, "**", "*.parquet"), recursive=True):
+        stale = pc.is_in(pq.read_table(path, columns=["match_id"])["match_id"], value_set=match_ids)
+        if not pc.any(stale).as_py():
+            continue
+        table = pq.read_table(path)
+        table = table.filter(pc.invert(pc.is_in(table["match_id"], value_set=match_ids)))
+        if table.num_rows:
+            pq.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        else:
+            os.remove(path)
+
+
+def fingerprint(store_dir, formats=None, name=DELIVERIES):
+    """A digest of the files holding the given formats (every format by default). Every ingest run
+    writing to or rewriting one of those files changes it, the other formats keep theirs."""
+    digest = hashlib.sha256()
+    directory = dataset_dir(store_dir, name)
+    partitions = [f"format={match_format}" for match_format in formats] if formats else ["*"]
+    for partition in sorted(partitions):
+        for path in sorted(glob.glob(os.path.join(directory, partition, "**", "*.parquet"), recursive=True)):
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, directory)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dataset(store_dir, name=DELIVERIES):
+    """Returns the arrow dataset of the store, or None when nothing has been written yet."""
+    directory = dataset_dir(store_dir, name)
+    if not os.path.isdir(directory):
+        return None
+    return ds.dataset(directory, format="parquet", partitioning=PARTITIONING)
+
+
+def _filter(formats=None, seasons=None, match_ids=None):
+    expression = None
+    for column, values in (("format", formats), ("season", seasons), ("match_id", match_ids)):
+        if values is None:
+            continue
+        condition = ds.field(column).isin([str(value) for value in values])
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def iter_chunks(store_dir, columns=None, formats=None, seasons=None, match_ids=None,
+                name=DELIVERIES, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yields the (filtered, projected) rows of the store as DataFrames of about chunk_rows rows."""
+    data = dataset(store_dir, name)
+    if data is None:
+        return
+    scanner = data.scanner(columns=columns, filter=_filter(formats, seasons, match_ids), batch_size=chunk_rows)
+    pending = []
+    pending_rows = 0
+    for record_batch in scanner.to_batches():
+        if not record_batch.num_rows:
+            continue
+        pending.append(record_batch)
+        pending_rows += record_batch.num_rows
+        if pending_rows >= chunk_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def read_table(store_dir, columns=None, formats=None, seasons=None, match_ids=None, name=DELIVERIES):
+    """Reads the (filtered, projected) rows of the store into one arrow table."""
+    data = dataset(store_dir, name)
+    if data is None:
+        raise FileNotFoundError(f"No '{name}' data found in the match store '{store_dir}'.")
+    return data.to_table(columns=columns, filter=_filter(formats, seasons, match_ids))
+
+
+def read(store_dir, columns=None, formats=None, seasons=None, match_ids=None, name=DELIVERIES):
+    """Reads the (filtered, projected) rows of the store into one DataFrame.
+    Names come back as pandas categoricals and runs/overs as small integers."""
+    return read_table(store_dir, columns, formats, seasons, match_ids, name).to_pandas()
@@ -0,0 +1,430 @@
+### Query backends for the insights app ###
+# run_query in cricmatchanalysis.py goes through one of these, so the same SQL can be answered by
+    # mysql  -> the MySQL server loaded by db_loader.py (default)
+    # duckdb -> an in-process DuckDB engine scanning the Parquet match store directly (no server)
+    # sqlite -> a local SQLite file loaded with db_loader.py --sqlite (no server)
+# The insights are written in the MySQL dialect, each backend translates the few MySQL-only
+# bits (SUBSTRING_INDEX, CAST AS DECIMAL, the `over` column) into its own.
+# Parameter values are bound, never formatted into the SQL : insights.Insight.compile writes the
+# backend's placeholder, and the statement of a given SQL text is prepared once per connection
+# (MySQL prepared cursors, the sqlite3 statement cache, the duckdb plan of the query text). A pooled
+# MySQL connection keeps its prepared cursors across reruns, the least recently used beyond
+# PREPARED_CACHE are closed, and all of them when the connection is closed.
+# stream() fetches a result in chunks of DataFrames from a server side / lazy cursor, so a large
+# result (a full CSV export) never has to fit in memory.
+# profile() is run() split in its stages (execution, row transfer, DataFrame build) with the rows the
+# engine scanned when it reports them, explain() returns the plan of a query as text (query_profiler.py).
+
+# Tools used:
+    # MYSQL Connector, duckdb, sqlite3 -> the engines (duckdb is only imported when selected)
+    # pandas -> query results as DataFrames
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+import cricsheet_ingest
+import db_loader
+import match_store
+import rollups
+import scorecards
+
+DEFAULT_CHUNK_SIZE = 10_000  # rows fetched at a time by stream()
+
+# `over` is a keyword outside MySQL, an unquoted column reference gets quoted #
+_OVER_COLUMN = re.compile(r'(?<![\w"`])over(?![\w"`])')
+_CAST_DECIMAL = re.compile(r"AS\s+DECIMAL\s*\)", re.IGNORECASE)
+
+
+def substring_index(value, delimiter, count):
+    """Python version of MySQL's SUBSTRING_INDEX(str, delim, count)."""
+    if value is None or delimiter is None or count is None:
+        return None
+    parts = value.split(delimiter)
+    return delimiter.join(parts[:count] if count >= 0 else parts[count:]) if count else ""
+
+
+def _loaded_version(conn, errors):
+    """The data version written by the last db_loader.py run, None before the first one."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT `version` FROM `{db_loader.DATA_VERSION_TABLE}`")
+        row = cursor.fetchone()
+    except errors:
+        return None
+    finally:
+        cursor.close()
+    return row[0] if row else None
+
+
+class MySQLBackend:
+    """The MySQL server loaded by db_loader.py."""
+    name = "mysql"
+
+    placeholder = "%s"
+    PREPARED_CACHE = 32  # prepared statements kept per connection
+
+    def __init__(self, host, user, password, database, query_timeout=None):
+        self.params = dict(host=host, user=user, password=password, database=database)
+        self.query_timeout = query_timeout
+        self.prepared = {}  # id(connection) -> OrderedDict(sql -> its prepared cursor), least recently used first
+        self.lock = threading.Lock()
+
+    @property
+    def errors(self):
+        import mysql.connector
+        return (mysql.connector.Error,)
+
+    def connect(self):
+        import mysql.connector
+        # autocommit : a pooled connection must not keep reading the snapshot of its first query #
+        conn = mysql.connector.connect(autocommit=True, **self.params)
+        if self.query_timeout:
+            cursor = conn.cursor()
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(self.query_timeout * 1000)}")
+            cursor.close()
+        return conn
+
+    def ping(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except self.errors:
+            return False
+
+    def translate(self, query):
+        return query
+
+    def _prepared(self, conn, sql):
+        """The prepared cursor of sql on conn, a server side statement re-executed with new values."""
+        evicted = None
+        with self.lock:
+            cursors = self.prepared.setdefault(id(conn), OrderedDict())
+            cursor = cursors.get(sql)
+            if cursor is None:
+                cursor = cursors[sql] = conn.cursor(prepared=True)
+                if len(cursors) > self.PREPARED_CACHE:
+                    evicted = cursors.popitem(last=False)[1]
+            else:
+                cursors.move_to_end(sql)
+        if evicted is not None:
+            evicted.close()
+        return cursor
+
+    def run(self, conn, query, params=None):
+        if not params:
+            return pd.read_sql(self.translate(query), conn)
+        sql = self.translate(query)
+        cursor = self._prepared(conn, sql)
+        cursor.execute(sql, tuple(params))
+        rows = cursor.fetchall()
+        return pd.DataFrame(rows, columns=[column[0] for column in cursor.description])
+
+    def _handler_reads(self, conn):
+        """The rows read by the storage engine for this session so far (the Handler_read_* counters)."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+            return sum(int(value) for _, value in cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def profile(self, conn, query, params=None):
+        """run() timed stage by stage. Returns (DataFrame, {stage: seconds}, rows scanned)."""
+        sql = self.translate(query)
+        reads = self._handler_reads(conn)
+        if params:
+            cursor = self._prepared(conn, sql)
+        else:
+            cursor = conn.cursor(buffered=False)
+        start = time.perf_counter()
+        cursor.execute(sql, tuple(params or ()))
+        executed = time.perf_counter()
+        rows = cursor.fetchall()
+        fetched = time.perf_counter()
+        result = pd.DataFrame(rows, columns=[column[0] for column in cursor.description])
+        built = time.perf_counter()
+        if not params:
+            cursor.close()
+        stages = {"execute": executed - start, "fetch": fetched - executed, "dataframe": built - fetched}
+        return result, stages, self._handler_reads(conn) - reads
+
+    def explain(self, conn, query, params=None):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(f"EXPLAIN {self.translate(query)}", tuple(params or ()))
+            plan = cursor.fetchall()
+        finally:
+            cursor.close()
+        return pd.DataFrame(plan).to_string(index=False)
+
+    def stream(self, conn, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        # an unbuffered cursor reads the rows from the server as they are fetched #
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(self.translate(query), tuple(params or ()))
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield pd.DataFrame(rows, columns=columns)
+        finally:
+            # a stream stopped early leaves rows behind, the connection is unusable until they are read #
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+
+    def data_version(self, conn):
+        return _loaded_version(conn, self.errors)
+
+    def close(self, conn):
+        # a later connection may reuse the id() of this one, it must not get its cursors #
+        with self.lock:
+            cursors = self.prepared.pop(id(conn), {})
+        if conn.is_connected():
+            for cursor in cursors.values():
+                cursor.close()
+            conn.close()
+
+
+class SQLiteBackend:
+    """A local SQLite file loaded with db_loader.py --sqlite."""
+    name = "sqlite"
+    errors = (sqlite3.Error, pd.errors.DatabaseError)
+    placeholder = "?"
+    STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+    def __init__(self, db_path, query_timeout=None):
+        self.db_path = db_path
+        self.query_timeout = query_timeout
+
+    def connect(self):
+        if not os.path.exists(self.db_path):
+            raise sqlite3.OperationalError(f"SQLite database '{self.db_path}' not found, load it with db_loader.py --sqlite.")
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=self.STATEMENT_CACHE)
+        conn.create_function("SUBSTRING_INDEX", 3, substring_index, deterministic=True)
+        return conn
+
+    def translate(self, query):
+        return _CAST_DECIMAL.sub("AS REAL)", _OVER_COLUMN.sub('"over"', query))
+
+    def ping(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @contextmanager
+    def _deadline(self, conn):
+        if not self.query_timeout:
+            yield
+            return
+        # the progress handler aborts the statement ("interrupted") once the deadline has passed #
+        deadline = time.monotonic() + self.query_timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+        try:
+            yield
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def run(self, conn, query, params=None):
+        with self._deadline(conn):
+            return pd.read_sql(self.translate(query), conn, params=params)
+
+    def profile(self, conn, query, params=None):
+        """run() timed stage by stage. Returns (DataFrame, {stage: seconds}, rows scanned). SQLite does
+        not count the rows it scans (None), execute covers the statement up to its first row."""
+        with self._deadline(conn):
+            start = time.perf_counter()
+            cursor = conn.execute(self.translate(query), params or ())
+            executed = time.perf_counter()
+            try:
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+            finally:
+                cursor.close()
+            fetched = time.perf_counter()
+        result = pd.DataFrame(rows, columns=columns)
+        built = time.perf_counter()
+        return result, {"execute": executed - start, "fetch": fetched - executed, "dataframe": built - fetched}, None
+
+    def explain(self, conn, query, params=None):
+        # the steps of EXPLAIN QUERY PLAN come as (id, parent, _, detail), indented under their parent #
+        depth = {0: -1}
+        lines = []
+        for step, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {self.translate(query)}", params or ()).fetchall():
+            depth[step] = depth.get(parent, -1) + 1
+            lines.append(f"{'  ' * depth[step]}{detail}")
+        return "\n".join(lines)
+
+    def stream(self, conn, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if self.query_timeout:
+            deadline = time.monotonic() + self.query_timeout
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+        # a sqlite3 cursor steps the statement as rows are fetched #
+        cursor = conn.execute(self.translate(query), params or ())
+        try:
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield pd.DataFrame(rows, columns=columns)
+        finally:
+            cursor.close()
+            if self.query_timeout:
+                conn.set_progress_handler(None, 0)
+
+    def data_version(self, conn):
+        return _loaded_version(conn, self.errors)
+
+    def close(self, conn):
+        conn.close()
+
+
+class DuckDBBackend:
+    """An in-process DuckDB engine over the Parquet match store. The four wide tables, the innings
+    scorecards and the rollups are views on the store, so the insights run without any database being loaded."""
+    name = "duckdb"
+    placeholder = "?"
+
+    def __init__(self, store_dir, query_timeout=None):
+        self.store_dir = store_dir
+        self.query_timeout = query_timeout
+
+    @property
+    def errors(self):
+        import duckdb
+        return (duckdb.Error,)
+
+    def connect(self):
+        import duckdb
+        data = match_store.dataset(self.store_dir)
+        if data is None:
+            raise duckdb.IOException(f"Match store '{self.store_dir}' not found, create it with cricsheet_ingest.py.")
+        conn = duckdb.connect(database=":memory:")
+        conn.execute("""
+            CREATE MACRO substring_index(s, d, n) AS
+                CASE WHEN n >= 0 THEN array_to_string(string_split(s, d)[1:n], d)
+                     ELSE array_to_string(string_split(s, d)[n:], d) END
+        """)
+        files = os.path.join(match_store.dataset_dir(self.store_dir), "**", "*.parquet").replace("\\", "/")
+        columns = ", ".join(f'"{col}"' for col in cricsheet_ingest.COLUMNS)
+        for match_type, table_name in db_loader.TABLES.items():
+            conn.execute(f"""
+                CREATE VIEW {table_name} AS
+                SELECT {columns}
+                FROM read_parquet('{files}', hive_partitioning = true,
+                                  hive_types = {{'format': VARCHAR, 'season': VARCHAR}})
+                WHERE format = '{match_type}'
+            """)
+        # the innings scorecards are stored next to the deliveries #
+        for name, table_name, scorecard_columns in ((scorecards.BATTING, scorecards.BATTING_TABLE, scorecards.BATTING_COLUMNS),
+                                                    (scorecards.BOWLING, scorecards.BOWLING_TABLE, scorecards.BOWLING_COLUMNS)):
+            if match_store.dataset(self.store_dir, name) is None:
+                continue
+            files = os.path.join(match_store.dataset_dir(self.store_dir, name), "**", "*.parquet").replace("\\", "/")
+            columns = ", ".join(f'"{col}"' for col in ["match_id", "format"] + scorecard_columns[1:])
+            conn.execute(f"""
+                CREATE VIEW {table_name} AS
+                SELECT {columns}
+                FROM read_parquet('{files}', hive_partitioning = true,
+                                  hive_types = {{'format': VARCHAR, 'season': VARCHAR}})
+            """)
+        for table_name in rollups.ROLLUPS:
+            path = rollups.rollup_path(self.store_dir, table_name)
+            if os.path.exists(path):
+                conn.execute(f"CREATE VIEW {table_name} AS SELECT * FROM read_parquet('{path.replace(os.sep, '/')}')")
+        return conn
+
+    def translate(self, query):
+        return _CAST_DECIMAL.sub("AS DOUBLE)", query)
+
+    def ping(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except self.errors:
+            return False
+
+    def run(self, conn, query, params=None):
+        if not self.query_timeout:
+            return conn.execute(self.translate(query), params or None).df()
+        # duckdb has no statement timeout, the query is interrupted from a timer thread #
+        timer = threading.Timer(self.query_timeout, conn.interrupt)
+        timer.start()
+        try:
+            return conn.execute(self.translate(query), params or None).df()
+        finally:
+            timer.cancel()
+
+    def profile(self, conn, query, params=None):
+        """run() timed stage by stage. Returns (DataFrame, {stage: seconds}, rows scanned). The result is
+        materialized in process by the execution, the DataFrame build is the only transfer."""
+        timer = threading.Timer(self.query_timeout, conn.interrupt) if self.query_timeout else None
+        conn.execute("SET enable_profiling = 'no_output'")
+        if timer:
+            timer.start()
+        try:
+            start = time.perf_counter()
+            cursor = conn.execute(self.translate(query), params or None)
+            executed = time.perf_counter()
+            result = cursor.df()
+            built = time.perf_counter()
+            profiling = json.loads(conn.get_profiling_information(format="json"))
+        finally:
+            if timer:
+                timer.cancel()
+            conn.execute("RESET enable_profiling")
+        return result, {"execute": executed - start, "dataframe": built - executed}, profiling.get("cumulative_rows_scanned")
+
+    def explain(self, conn, query, params=None):
+        plan = conn.execute(f"EXPLAIN {self.translate(query)}", params or None).fetchall()
+        return "\n".join(text for _, text in plan)
+
+    def stream(self, conn, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        timer = threading.Timer(self.query_timeout, conn.interrupt) if self.query_timeout else None
+        if timer:
+            timer.start()
+        try:
+            # the Arrow record batch reader pulls the result from the engine batch by batch #
+            reader = conn.execute(self.translate(query), params or None).fetch_record_batch(chunk_size)
+            for batch in reader:
+                yield batch.to_pandas()
+        finally:
+            if timer:
+                timer.cancel()
+
+    def data_version(self, conn):
+        # the views read the store directly, the manifest is rewritten last by every ingest run #
+        path = os.path.join(self.store_dir, cricsheet_ingest.MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def close(self, conn):
+        conn.close()
+
+
+def get_backend(name, secrets):
+    """Builds the backend called name from the app settings (a dict like st.secrets).
+    QUERY_TIMEOUT (seconds) aborts the queries running longer than that."""
+    query_timeout = secrets.get("QUERY_TIMEOUT")
+    query_timeout = float(query_timeout) if query_timeout else None
+    if name == "mysql":
+        return MySQLBackend(secrets["DB_HOST"], secrets["DB_USER"], secrets["DB_PASSWORD"], secrets["DB_NAME"], query_timeout)
+    if name == "duckdb":
+        return DuckDBBackend(secrets["STORE_DIR"], query_timeout)
+    if name == "sqlite":
+        return SQLiteBackend(secrets["SQLITE_PATH"], query_timeout)
+    raise ValueError(f"Unknown DB_BACKEND '{name}', expected mysql, duckdb or sqlite.")
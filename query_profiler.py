@@ -0,0 +1,183 @@
+### Per query profiling of the insights app ###
+# When an insight is slow the page alone cannot tell where the time goes. Every query run by
+# cricmatchanalysis.py is profiled stage by stage:
+    # pool wait / checkout -> waiting for a pooled connection, then handing it out (health check, reconnect)
+    # cache lookup -> the result cache (a hit skips the stages below)
+    # execute / fetch / dataframe -> the engine running the query, the rows transferred to the app and
+    # the DataFrame built from them (query_backends profile())
+# with the rows returned, the rows the engine scanned (MySQL Handler_read counters, DuckDB profiling,
+# SQLite does not report them) and, when asked for, the plan of the query (query_backends explain()).
+# Every profile is
+    # logged as one JSON line (logger "cricmatchanalysis.queries"), ready for a log shipper
+    # added to a rolling per insight history (the last `max_runs` runs of every insight), whose latency
+    # percentiles and trend show the insights slowing down as the tables grow
+    # optionally written out as Prometheus metrics (textfile collector format) after every query
+
+# Tools used:
+    # query_backends -> the staged execution and the plans
+    # logging / json -> the structured query log
+    # numpy / pandas -> the percentiles and the history tables
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_RUNS = 100  # runs kept per insight by LatencyHistory
+STAGES = ["pool wait", "checkout", "cache lookup", "execute", "fetch", "dataframe"]
+
+logger = logging.getLogger("cricmatchanalysis.queries")
+
+
+class QueryProfile:
+    """Where the time of one query went : seconds per stage, rows and (optionally) the plan."""
+
+    def __init__(self, name, backend_name, sql, params=None):
+        self.name = name
+        self.backend_name = backend_name
+        self.sql = sql
+        self.params = list(params or [])
+        self.started = time.time()
+        self.stages = {}
+        self.cache_hit = False
+        self.data_version = None
+        self.rows_returned = None
+        self.rows_scanned = None
+        self.plan = None
+        self.explain_seconds = None
+
+    @property
+    def seconds(self):
+        return sum(self.stages.values())
+
+    @property
+    def sql_digest(self):
+        return hashlib.sha1(self.sql.encode("utf-8")).hexdigest()[:12]
+
+    def stage_table(self):
+        """The stages as a DataFrame of milliseconds and share of the total, in pipeline order."""
+        total = self.seconds or 1.0
+        stages = [stage for stage in STAGES if stage in self.stages]
+        return pd.DataFrame({"stage": stages,
+                             "ms": [round(self.stages[stage] * 1000, 3) for stage in stages],
+                             "share": [f"{self.stages[stage] / total:.0%}" for stage in stages]})
+
+    def record(self):
+        """The profile as a flat, JSON serializable dict (the SQL only as a digest)."""
+        return {
+            "event": "query",
+            "insight": self.name,
+            "backend": self.backend_name,
+            "sql": self.sql_digest,
+            "params": len(self.params),
+            "data_version": self.data_version,
+            "cache_hit": self.cache_hit,
+            "rows_returned": self.rows_returned,
+            "rows_scanned": self.rows_scanned,
+            "total_ms": round(self.seconds * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+            "timestamp": round(self.started, 3),
+        }
+
+
+def profile_query(backend, conn, query, params=None, cache=None, name=None, connect=None, explain=False):
+    """Runs a query like insight_report.run_insight (through the result cache when one is given) and
+    profiles it. connect holds the {stage: seconds} of getting the connection. Returns (DataFrame, QueryProfile)."""
+    profile = QueryProfile(name, backend.name, query, params)
+    profile.stages.update(connect or {})
+    result = None
+    if cache is not None:
+        start = time.perf_counter()
+        profile.data_version = backend.data_version(conn)
+        result = cache.get(backend.name, profile.data_version, query, params)
+        profile.stages["cache lookup"] = time.perf_counter() - start
+        profile.cache_hit = result is not None
+    if result is None:
+        result, stages, profile.rows_scanned = backend.profile(conn, query, params)
+        profile.stages.update(stages)
+        if cache is not None:
+            cache.put(backend.name, profile.data_version, query, result, params)
+    profile.rows_returned = len(result)
+    if explain:
+        # not part of the query's time #
+        start = time.perf_counter()
+        profile.plan = backend.explain(conn, query, params)
+        profile.explain_seconds = time.perf_counter() - start
+    return result, profile
+
+
+def log_profile(profile):
+    """Logs the profile as a single JSON line."""
+    logger.info(json.dumps(profile.record(), default=str))
+
+
+def configure_logging(path=None):
+    """Sends the query log to path ("-" or None : standard error), once per process."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler() if path in (None, "", "-") else logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class LatencyHistory:
+    """The last max_runs profiles of every insight, shared by the sessions of the app."""
+
+    def __init__(self, max_runs=DEFAULT_MAX_RUNS):
+        self.max_runs = max_runs
+        self.runs = collections.defaultdict(lambda: collections.deque(maxlen=self.max_runs))
+        self.lock = threading.Lock()
+
+    def record(self, profile):
+        with self.lock:
+            self.runs[profile.name].append(profile.record())
+
+    def history(self, name):
+        """The recorded runs of one insight, oldest first."""
+        with self.lock:
+            return pd.DataFrame(list(self.runs.get(name, [])))
+
+    def summary(self):
+        """One row per insight : runs, cache hits and the latencies of its executed (not cached) runs,
+        trend is the median of the newer half over the median of the older half (> 1 : slowing down)."""
+        with self.lock:
+            runs = {name: list(records) for name, records in self.runs.items()}
+        rows = []
+        for name, records in runs.items():
+            executed = [record for record in records if not record["cache_hit"]]
+            latencies = np.array([record["total_ms"] for record in executed])
+            row = {"insight": name, "runs": len(records), "cache hits": len(records) - len(executed)}
+            if len(latencies):
+                p50, p95 = np.percentile(latencies, [50, 95])
+                half = len(latencies) // 2
+                row.update({"last ms": latencies[-1], "p50 ms": round(p50, 3), "p95 ms": round(p95, 3),
+                            "max ms": latencies.max(), "rows scanned": executed[-1]["rows_scanned"],
+                            "trend": round(np.median(latencies[half:]) / np.median(latencies[:half]), 2)
+                            if half and np.median(latencies[:half]) else None})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def write_metrics(self, path, prefix="cricmatch_insight"):
+        """Writes the summary in the Prometheus text format (for the node_exporter textfile collector)."""
+        summary = self.summary()
+        lines = [f"# TYPE {prefix}_runs gauge", f"# TYPE {prefix}_cache_hits gauge", f"# TYPE {prefix}_latency_ms gauge"]
+        for row in summary.to_dict("records"):
+            label = row["insight"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{prefix}_runs{{insight="{label}"}} {row["runs"]}')
+            lines.append(f'{prefix}_cache_hits{{insight="{label}"}} {row["cache hits"]}')
+            for quantile, column in (("0.5", "p50 ms"), ("0.95", "p95 ms")):
+                if pd.notna(row.get(column)):
+                    lines.append(f'{prefix}_latency_ms{{insight="{label}",quantile="{quantile}"}} {row[column]}')
+        # one temporary file per thread, the sessions of the app write the metrics concurrently #
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(temporary, path)
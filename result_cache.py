@@ -0,0 +1,129 @@
+### Result cache of the insights app ###
+# The data only changes when db_loader.py (or, for the duckdb backend, cricsheet_ingest.py) runs,
+# so the result of an insight is kept until then:
+    # key -> (backend, data version, query text, bound parameter values), the data version being written by the loader
+    # memory tier -> the most recently used results, bounded to max_entries (LRU eviction)
+    # disk tier (optional) -> pickled results under <cache dir>/<data version>/, so they survive app
+    #                         restarts, bounded to max_disk_entries files (least recently used removed)
+# A new data version makes every older entry unreachable, they are dropped on the next put. A session
+# still putting a result of an older version (read before the load) neither evicts the newer entries
+# nor gets its result cached.
+
+# Tools used:
+    # collections.OrderedDict -> the LRU order of the memory tier
+    # pandas -> pickling the result DataFrames
+
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_DISK_ENTRIES = 1024
+
+
+def _digest(*parts):
+    # repr keeps the types apart : 2019 and "2019", None and "None" are different keys #
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """An LRU cache of query results keyed by backend, data version, query text and parameters,
+    shared by every session of the app (it is thread safe)."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_dir=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.version = None  # the newest data version seen
+        self.retired = set()  # the versions older than it
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _path(self, version, key):
+        return os.path.join(self.disk_dir, _digest(version), f"{key}.pkl")
+
+    def get(self, backend_name, version, query, params=None):
+        """Returns the cached result DataFrame, or None on a miss (or when the version is unknown)."""
+        if version is None:
+            return None
+        key = _digest(backend_name, query, *(params or ()))
+        with self.lock:
+            if (version, key) in self.entries:
+                self.entries.move_to_end((version, key))
+                self.hits += 1
+                return self.entries[(version, key)]
+        if self.disk_dir:
+            path = self._path(version, key)
+            if os.path.exists(path):
+                try:
+                    result = pd.read_pickle(path)
+                except (OSError, EOFError, ValueError):
+                    result = None  # a half written or stale file, recomputed below
+                if result is not None:
+                    try:
+                        os.utime(path)  # the mtime keeps the LRU order of the disk tier
+                    except OSError:
+                        pass
+                    self._remember(version, key, result)
+                    with self.lock:
+                        self.hits += 1
+                    return result
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, backend_name, version, query, result, params=None):
+        """Caches the result of query (bound to params) at the given data version (nothing is cached for an unknown version)."""
+        if version is None or result is None:
+            return
+        key = _digest(backend_name, query, *(params or ()))
+        if self._remember(version, key, result) and self.disk_dir:
+            path = self._path(version, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # one temporary file per thread, two sessions may compute the same result at once #
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            result.to_pickle(temporary)
+            os.replace(temporary, path)
+            self._evict_disk(version)
+
+    def _remember(self, version, key, result):
+        """Keeps result in the memory tier. Returns False (keeping nothing) for a version older than the newest one seen."""
+        with self.lock:
+            if version in self.retired:
+                return False
+            if version != self.version:
+                # a new ingest / load : the results of the older versions are stale #
+                if self.version is not None:
+                    self.retired.add(self.version)
+                self.entries = OrderedDict((k, v) for k, v in self.entries.items() if k[0] == version)
+                self.version = version
+            self.entries[(version, key)] = result
+            self.entries.move_to_end((version, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return True
+
+    def _evict_disk(self, version):
+        current = _digest(version)
+        for name in os.listdir(self.disk_dir):
+            if name != current:
+                shutil.rmtree(os.path.join(self.disk_dir, name), ignore_errors=True)
+        directory = os.path.join(self.disk_dir, current)
+        files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".pkl")]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_disk_entries]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # evicted by another session
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "version": self.version}
@@ -0,0 +1,255 @@
+### Materialized rollups behind the leaderboard insights ###
+# Small per-format aggregate tables kept up to date by the ingest (cricsheet_ingest.py):
+    # rollup_players -> batting and bowling career totals per player
+    # rollup_teams   -> matches, wins and tosses per team
+    # rollup_venues  -> matches per venue (and city)
+    # rollup_seasons -> matches, draws, overs and runs per season and toss decision
+    # rollup_awards  -> player of the match awards per player and season
+    # rollup_matches -> one row per match (season, venue, teams, toss, result) with its runs and overs,
+    #                   what the insights filtered by season / team / venue aggregate
+# Every measure is a sum, so a refresh adds the contribution of the new matches and subtracts the
+# old contribution of the changed ones instead of re-scanning the deliveries. The rollups are stored
+# in <store_dir>/rollups/<name>.parquet and loaded into tables of the same name by db_loader.py.
+
+# Tools used:
+    # pandas -> to aggregate the parsed batches and merge them into the stored rollups
+    # cricsheet_ingest -> the matches of the last ingest run
+    # match_store -> to read back the changed matches before they are replaced
+    # db_loader -> table creation helpers and batched multi-row inserts
+
+import os
+import time
+
+import pandas as pd
+
+import cricsheet_ingest
+import db_loader
+import match_store
+import scorecards
+
+ROLLUP_DIR = "rollups"
+
+# rollup table -> (key columns, measure columns) #
+ROLLUPS = {
+    "rollup_players": (["format", "player"],
+                       ["innings", "runs", "balls", "fours", "sixes", "hundreds", "dismissals",
+                        "balls_bowled", "runs_conceded", "wickets"]),
+    "rollup_teams": (["format", "team"], ["matches", "wins", "tosses_won", "wins_after_losing_toss"]),
+    "rollup_venues": (["format", "venue", "city"], ["matches"]),
+    "rollup_seasons": (["format", "season", "toss_decision"], ["matches", "draws", "overs", "runs"]),
+    "rollup_awards": (["format", "season", "player"], ["awards"]),
+    "rollup_matches": (["format", "match_id", "season", "venue", "city", "team1", "team2",
+                        "toss_winner", "toss_decision", "winner"], ["matches", "overs", "runs"]),
+}
+
+# the match attributes are keys of rollup_matches only so that a changed match cancels out, #
+# the table is keyed by the match #
+_PRIMARY_KEYS = {"rollup_matches": ["format", "match_id"]}
+
+_KEY_TYPES = {
+    "format": "VARCHAR(10)",
+    "player": "VARCHAR(100)",
+    "team": "VARCHAR(100)",
+    "venue": "VARCHAR(255)",
+    "city": "VARCHAR(100)",
+    "season": "VARCHAR(50)",
+    "toss_decision": "VARCHAR(10)",
+    "match_id": "VARCHAR(20)",
+    "team1": "VARCHAR(100)",
+    "team2": "VARCHAR(100)",
+    "toss_winner": "VARCHAR(100)",
+    "winner": "VARCHAR(100)",
+}
+
+# the orderings of the leaderboards, so their ORDER BY ... LIMIT reads the index in order #
+INDEXES = {
+    "ix_rollup_players_runs": ("rollup_players", "`format`, `runs` DESC, `player`"),
+    "ix_rollup_players_wickets": ("rollup_players", "`format`, `wickets` DESC, `player`"),
+    "ix_rollup_players_hundreds": ("rollup_players", "`hundreds` DESC, `format`, `player`"),
+    "ix_rollup_matches_runs": ("rollup_matches", "`runs` DESC, `format`, `match_id`"),
+    # the season / team / venue filters of the parameterized insights (insights.py) #
+    "ix_rollup_matches_season": ("rollup_matches", "`format`, `season`"),
+    "ix_rollup_matches_venue": ("rollup_matches", "`venue`, `match_id`"),
+    "ix_rollup_matches_team1": ("rollup_matches", "`team1`, `format`"),
+    "ix_rollup_matches_team2": ("rollup_matches", "`team2`, `format`"),
+}
+
+DELIVERY_COLUMNS = ["match_id", "season", "city", "venue", "toss_winner", "toss_decision", "winner",
+                    "player_of_match", "teams", "innings", "over", "runs_total"]
+
+
+def rollup_path(store_dir, name):
+    return os.path.join(store_dir, ROLLUP_DIR, f"{name}.parquet")
+
+
+def _rollup(name, match_format, records):
+    """Sums the records (a DataFrame or list of dicts of key and measure columns, without format) per key."""
+    keys, measures = ROLLUPS[name]
+    frame = pd.DataFrame(records, columns=keys[1:] + measures)
+    # missing names (a match without a city, ...) are grouped under "" #
+    frame[keys[1:]] = frame[keys[1:]].astype(object).fillna("").astype(str)
+    frame[measures] = frame[measures].fillna(0).astype("int64")
+    frame.insert(0, "format", match_format)
+    return frame.groupby(keys, sort=False, as_index=False)[measures].sum()
+
+
+def contributions(match_format, deliveries, batting, bowling):
+    """Computes the rollup rows of a set of matches of one format from their deliveries and
+    innings scorecards (DataFrames or columnar batches). Returns {rollup table: DataFrame}."""
+    deliveries = pd.DataFrame(deliveries)
+    # store reads hand back categoricals with NaN for missing names, batches plain None #
+    match_columns = [col for col in DELIVERY_COLUMNS if col not in ("innings", "over", "runs_total")]
+    deliveries[match_columns] = deliveries[match_columns].astype(object)
+    deliveries[match_columns] = deliveries[match_columns].where(deliveries[match_columns].notna(), None)
+    batting = pd.DataFrame(batting)
+    bowling = pd.DataFrame(bowling)
+
+    players = pd.concat([
+        pd.DataFrame({"player": batting["batter"].astype(object), "innings": 1, "runs": batting["runs"],
+                      "balls": batting["balls"], "fours": batting["fours"], "sixes": batting["sixes"],
+                      "hundreds": (batting["runs"] >= 100).astype("int64"), "dismissals": batting["dismissed"]}),
+        pd.DataFrame({"player": bowling["bowler"].astype(object), "balls_bowled": bowling["balls"],
+                      "runs_conceded": bowling["runs"], "wickets": bowling["wickets"]}),
+    ])
+
+    runs = deliveries.groupby("match_id", observed=True)["runs_total"].sum()
+    overs = deliveries.drop_duplicates(["match_id", "innings", "over"]).groupby("match_id", observed=True).size()
+    records = {name: [] for name in ROLLUPS if name != "rollup_players"}
+    for match in deliveries.drop_duplicates("match_id").itertuples(index=False):
+        season = None if match.season is None else str(match.season)
+        match_runs = int(runs.get(match.match_id, 0))
+        for team in str(match.teams or "").split(", "):
+            if team:
+                records["rollup_teams"].append({
+                    "team": team, "matches": 1, "wins": match.winner == team,
+                    "tosses_won": match.toss_winner == team,
+                    "wins_after_losing_toss": match.winner == team and match.toss_winner != team})
+        records["rollup_venues"].append({"venue": match.venue, "city": match.city, "matches": 1})
+        records["rollup_seasons"].append({
+            "season": season, "toss_decision": match.toss_decision, "matches": 1,
+            "draws": match.winner == "draw", "overs": int(overs.get(match.match_id, 0)), "runs": match_runs})
+        for player in str(match.player_of_match or "").split(", "):
+            if player:
+                records["rollup_awards"].append({"season": season, "player": player, "awards": 1})
+        teams = str(match.teams or "").split(", ") + ["", ""]
+        records["rollup_matches"].append({
+            "match_id": match.match_id, "season": season, "venue": match.venue, "city": match.city,
+            "team1": teams[0], "team2": teams[1], "toss_winner": match.toss_winner,
+            "toss_decision": match.toss_decision, "winner": match.winner,
+            "matches": 1, "overs": int(overs.get(match.match_id, 0)), "runs": match_runs})
+
+    frames = {"rollup_players": _rollup("rollup_players", match_format, players)}
+    for name, rows in records.items():
+        frames[name] = _rollup(name, match_format, rows)
+    return frames
+
+
+def store_contributions(store_dir, match_ids):
+    """Computes the rollup rows the given matches currently have in the match store,
+    to be subtracted before the matches are replaced. Returns a list of {rollup table: DataFrame}."""
+    match_ids = list(match_ids)
+    columns = {match_store.DELIVERIES: DELIVERY_COLUMNS + ["format"],
+               scorecards.BATTING: scorecards.BATTING_COLUMNS + ["format"],
+               scorecards.BOWLING: scorecards.BOWLING_COLUMNS + ["format"]}
+    frames = {}
+    for name, cols in columns.items():
+        if match_store.dataset(store_dir, name) is None:
+            return []
+        frames[name] = match_store.read(store_dir, columns=cols, match_ids=match_ids, name=name)
+    removed = []
+    for match_format in frames[match_store.DELIVERIES]["format"].unique():
+        parts = [frame[frame["format"] == match_format] for frame in frames.values()]
+        removed.append(negate(contributions(match_format, *parts)))
+    return removed
+
+
+def negate(frames):
+    """Turns a contribution into the matching subtraction."""
+    negated = {}
+    for name, frame in frames.items():
+        measures = ROLLUPS[name][1]
+        frame = frame.copy()
+        frame[measures] = -frame[measures]
+        negated[name] = frame
+    return negated
+
+
+def merge(name, frames):
+    """Sums rollup rows of one table per key, dropping the keys left with nothing."""
+    keys, measures = ROLLUPS[name]
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=keys + measures)
+    merged = pd.concat(frames, ignore_index=True).groupby(keys, as_index=False)[measures].sum()
+    return merged[(merged[measures] != 0).any(axis=1)].reset_index(drop=True)
+
+
+def read(store_dir, name):
+    """Reads one stored rollup, None when the ingest has not written it yet."""
+    path = rollup_path(store_dir, name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def update(store_dir, deltas, full=False):
+    """Adds the deltas (a list of {rollup table: DataFrame}, subtractions included) to the stored
+    rollups, or rebuilds them from the deltas alone with full=True. Returns the rows of each rollup."""
+    os.makedirs(os.path.join(store_dir, ROLLUP_DIR), exist_ok=True)
+    sizes = {}
+    for name in ROLLUPS:
+        frames = [] if full else [read(store_dir, name)]
+        merged = merge(name, frames + [delta[name] for delta in deltas])
+        path = rollup_path(store_dir, name)
+        merged.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        sizes[name] = len(merged)
+    return sizes
+
+
+# Table Creation -> one table per rollup across the match types, keyed like the rollup.
+def create_tables(conn):
+    cursor = conn.cursor()
+    for name, (keys, measures) in ROLLUPS.items():
+        columns = [f"`{key}` {_KEY_TYPES[key]} NOT NULL" for key in keys]
+        columns += [f"`{measure}` INT NOT NULL" for measure in measures]
+        primary_key = ", ".join(f"`{key}`" for key in _PRIMARY_KEYS.get(name, keys))
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS `{name}` ({', '.join(columns)}, PRIMARY KEY ({primary_key}))")
+    cursor.close()
+    db_loader.create_indexes(conn, INDEXES)
+    conn.commit()
+
+
+def load_rollups(conn, store_dir, match_type, batch_size=db_loader.DEFAULT_BATCH_SIZE,
+                 commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Replaces the rollup rows of one match type with the stored rollups.
+    Returns the number of rollup rows loaded."""
+    start = time.perf_counter()
+    rows = 0
+    ph = db_loader._placeholder(conn)
+    for name in ROLLUPS:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM `{name}` WHERE `format` = {ph}", (match_type,))
+        cursor.close()
+        rollup = read(store_dir, name)
+        if rollup is None:
+            continue
+        rows += db_loader.bulk_insert(conn, name, rollup[rollup["format"] == match_type], batch_size, commit_every)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    print(f"{rows} {match_type} rollup rows loaded in {elapsed:.1f}s.")
+    return rows
+
+
+def load_all_rollups(conn, store_dir, full=False, batch_size=db_loader.DEFAULT_BATCH_SIZE,
+                     commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Loads the rollups of the match types touched by the last ingest run (every match type with
+    full=True). Returns the number of rollup rows loaded for each match type."""
+    create_tables(conn)
+    delta = None if full else cricsheet_ingest.last_run_matches(store_dir)
+    loaded = {}
+    for match_type in db_loader.TABLES:
+        if not full and not delta[match_type]:
+            continue
+        loaded[match_type] = load_rollups(conn, store_dir, match_type, batch_size, commit_every)
+    return loaded
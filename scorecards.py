@@ -0,0 +1,202 @@
+### Innings level batting and bowling scorecards ###
+# Built from the raw Cricsheet JSON at ingest time (cricsheet_ingest.py), stored in the match store
+# next to the deliveries and loaded into two small indexed tables:
+    # batting_scorecards -> one row per batter per innings (runs, balls, 4s, 6s, dismissed)
+    # bowling_scorecards -> one row per bowler per innings (balls, maidens, runs, wickets)
+# so centuries, highest scores, best figures, averages and strike rates are lookups on a table
+# orders of magnitude smaller than the deliveries.
+
+# Cricket rules applied:
+    # a wide is not a ball faced by the batter, wides and no-balls are not legal balls for the bowler
+    # byes, leg byes and penalty runs are not charged to the bowler
+    # run outs, retirements, obstructing the field, handling the ball, hitting the ball twice and
+    # timed out are not bowler's wickets
+    # a batter who retired hurt or retired not out is not out (unless dismissed on returning)
+
+# Tools used:
+    # cricsheet_ingest -> the matches of the last ingest run
+    # match_store -> to read the scorecards from the Parquet match store
+    # db_loader -> table creation helpers and batched multi-row inserts
+
+import time
+
+import cricsheet_ingest
+import db_loader
+import match_store
+
+BATTING = "batting"
+BOWLING = "bowling"
+
+BATTING_TABLE = "batting_scorecards"
+BOWLING_TABLE = "bowling_scorecards"
+
+BATTING_COLUMNS = ["match_id", "season", "innings", "team", "position", "batter",
+                   "runs", "balls", "fours", "sixes", "dismissed"]
+BOWLING_COLUMNS = ["match_id", "season", "innings", "team", "bowler",
+                   "balls", "maidens", "runs", "wickets"]
+
+NOT_BOWLER_WICKETS = {"run out", "retired hurt", "retired out", "retired not out", "obstructing the field",
+                      "handled the ball", "hit the ball twice", "timed out"}
+NOT_OUT_WICKETS = {"retired hurt", "retired not out"}
+
+
+def empty_batches():
+    return {BATTING: {col: [] for col in BATTING_COLUMNS},
+            BOWLING: {col: [] for col in BOWLING_COLUMNS}}
+
+
+def add_match(match_data, match_id, batches):
+    """Appends the batting and bowling scorecards of every innings of one parsed match to batches."""
+    match_info = match_data.get("info", {})
+    season = match_info.get("season")
+    teams = match_info.get("teams", [])
+
+    for innings_number, inning in enumerate(match_data.get("innings", []), start=1):
+        team = inning.get("team", "Unknown")
+        fielding = [other for other in teams if other != team]
+        batting = {}   # batter -> [position, runs, balls, fours, sixes, dismissed]
+        bowling = {}   # bowler -> [balls, maidens, runs, wickets]
+
+        def _batter(name):
+            if name not in batting:
+                batting[name] = [len(batting) + 1, 0, 0, 0, 0, 0]
+            return batting[name]
+
+        for over in inning.get("overs", []):
+            over_figures = {}  # bowler -> [legal balls, runs charged] in this over
+            for delivery in over.get("deliveries", []):
+                runs = delivery.get("runs", {})
+                extras = delivery.get("extras", {})
+                striker = _batter(delivery.get("batter"))
+                _batter(delivery.get("non_striker"))
+
+                runs_batter = runs.get("batter", 0)
+                striker[1] += runs_batter
+                if "wides" not in extras:
+                    striker[2] += 1
+                if not runs.get("non_boundary"):
+                    striker[3] += runs_batter == 4
+                    striker[4] += runs_batter == 6
+
+                bowler_name = delivery.get("bowler")
+                figures = bowling.setdefault(bowler_name, [0, 0, 0, 0])
+                this_over = over_figures.setdefault(bowler_name, [0, 0])
+                legal = "wides" not in extras and "noballs" not in extras
+                charged = runs.get("total", 0) - extras.get("byes", 0) - extras.get("legbyes", 0) - extras.get("penalty", 0)
+                figures[0] += legal
+                figures[2] += charged
+                this_over[0] += legal
+                this_over[1] += charged
+
+                for wicket in delivery.get("wickets", []):
+                    if wicket.get("player_out") and wicket.get("kind") not in NOT_OUT_WICKETS:
+                        _batter(wicket["player_out"])[5] = 1
+                    if wicket.get("kind") not in NOT_BOWLER_WICKETS:
+                        figures[3] += 1
+
+            for bowler_name, (legal_balls, charged) in over_figures.items():
+                if legal_balls >= 6 and charged == 0:
+                    bowling[bowler_name][1] += 1
+
+        out = batches[BATTING]
+        for name, (position, runs, balls, fours, sixes, dismissed) in batting.items():
+            for col, value in zip(BATTING_COLUMNS, (match_id, season, innings_number, team, position, name,
+                                                    runs, balls, fours, sixes, dismissed)):
+                out[col].append(value)
+        out = batches[BOWLING]
+        for name, (balls, maidens, runs, wickets) in bowling.items():
+            for col, value in zip(BOWLING_COLUMNS, (match_id, season, innings_number,
+                                                    fielding[0] if fielding else None, name,
+                                                    balls, maidens, runs, wickets)):
+                out[col].append(value)
+
+
+# Table Creation -> one batting and one bowling scorecard table across the match types.
+def create_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{BATTING_TABLE}` (
+        `match_id` VARCHAR(20) NOT NULL,
+        `format` VARCHAR(10) NOT NULL,
+        `season` VARCHAR(50),
+        `innings` TINYINT NOT NULL,
+        `team` VARCHAR(100),
+        `position` TINYINT,
+        `batter` VARCHAR(100) NOT NULL,
+        `runs` SMALLINT,
+        `balls` SMALLINT,
+        `fours` SMALLINT,
+        `sixes` SMALLINT,
+        `dismissed` TINYINT,
+        PRIMARY KEY (`match_id`, `innings`, `batter`)
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{BOWLING_TABLE}` (
+        `match_id` VARCHAR(20) NOT NULL,
+        `format` VARCHAR(10) NOT NULL,
+        `season` VARCHAR(50),
+        `innings` TINYINT NOT NULL,
+        `team` VARCHAR(100),
+        `bowler` VARCHAR(100) NOT NULL,
+        `balls` SMALLINT,
+        `maidens` SMALLINT,
+        `runs` SMALLINT,
+        `wickets` TINYINT,
+        PRIMARY KEY (`match_id`, `innings`, `bowler`)
+    )
+    """)
+    # the lookups of the insights : centuries / highest scores and player totals per format #
+    indexes = {
+        "ix_batting_format_runs": (BATTING_TABLE, "`format`, `runs`"),
+        "ix_batting_format_batter": (BATTING_TABLE, "`format`, `batter`"),
+        "ix_bowling_format_wickets": (BOWLING_TABLE, "`format`, `wickets`, `runs`"),
+        "ix_bowling_format_bowler": (BOWLING_TABLE, "`format`, `bowler`"),
+        # the season / team filters of the parameterized insights, covering the columns they sum #
+        "ix_batting_format_season_team": (BATTING_TABLE, "`format`, `season`, `team`, `batter`, `runs`"),
+        "ix_bowling_format_season_team": (BOWLING_TABLE, "`format`, `season`, `team`, `bowler`, `wickets`, `runs`"),
+    }
+    db_loader.create_indexes(conn, indexes)
+    cursor.close()
+    conn.commit()
+
+
+def load_scorecards(conn, store_dir, match_type, match_ids=None,
+                    batch_size=db_loader.DEFAULT_BATCH_SIZE, commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Loads the batting and bowling scorecards of one match type from the match store,
+    replacing the given matches (all matches of that type when match_ids is None).
+    Returns the number of scorecard rows loaded."""
+    start = time.perf_counter()
+    rows = 0
+    ph = db_loader._placeholder(conn)
+    for name, table_name, columns in ((BATTING, BATTING_TABLE, BATTING_COLUMNS),
+                                      (BOWLING, BOWLING_TABLE, BOWLING_COLUMNS)):
+        if match_ids is None:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM `{table_name}` WHERE `format` = {ph}", (match_type,))
+            cursor.close()
+        else:
+            db_loader.delete_matches(conn, table_name, match_ids)
+        for chunk in match_store.iter_chunks(store_dir, columns=columns, formats=[match_type],
+                                             match_ids=match_ids, name=name):
+            chunk.insert(1, "format", match_type)
+            rows += db_loader.bulk_insert(conn, table_name, chunk, batch_size, commit_every)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    print(f"{rows} {match_type} scorecard rows loaded in {elapsed:.1f}s.")
+    return rows
+
+
+def load_all_scorecards(conn, store_dir, full=False, batch_size=db_loader.DEFAULT_BATCH_SIZE,
+                        commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Loads the scorecards of every match type, the matches of the last ingest run by default
+    or every match with full=True. Returns the number of scorecard rows loaded for each match type."""
+    create_tables(conn)
+    delta = None if full else cricsheet_ingest.last_run_matches(store_dir)
+    loaded = {}
+    for match_type in db_loader.TABLES:
+        match_ids = None if full else delta[match_type]
+        if match_ids == []:
+            continue
+        loaded[match_type] = load_scorecards(conn, store_dir, match_type, match_ids, batch_size, commit_every)
+    return loaded
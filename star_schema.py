@@ -0,0 +1,482 @@
+### Normalized star schema for the match data ###
+# An alternative to the four wide test/odi/t20/ipl_matches tables, where every delivery
+# repeats the venue, teams, toss and winner of its match and stores player names as text.
+    # formats, teams, players, venues -> small integer keyed dimensions
+    # matches                         -> one row per match (season, venue, teams, toss, winner)
+    # player_of_match                 -> the player of the match award(s) of each match
+    # deliveries                      -> one compact row of small integers per ball, partitioned by format
+# The innings scorecards of scorecards.py and the rollups of rollups.py are loaded next to it.
+
+# Tools used:
+    # match_store -> to read the ingested deliveries from the Parquet match store in chunks
+    # pandas -> to map names to dimension ids
+    # db_loader -> batched multi-row inserts (MySQL, or SQLite as a local stand-in)
+
+# Usage : python db_loader.py --store-dir <match store directory> --schema star [--full]
+
+import time
+
+import pandas as pd
+
+import cricsheet_ingest
+import db_loader
+import match_store
+import rollups
+import scorecards
+
+# format_id of each match type, also the partition of the deliveries table #
+FORMATS = {
+    "Test": 1,
+    "ODI": 2,
+    "T20": 3,
+    "IPL": 4
+}
+
+STAR_TABLES = ["formats", "teams", "players", "venues", "matches", "player_of_match", "deliveries"]
+
+_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS `formats` (
+        `format_id` TINYINT UNSIGNED PRIMARY KEY,
+        `name` VARCHAR(10) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `teams` (
+        `team_id` SMALLINT UNSIGNED PRIMARY KEY,
+        `name` VARCHAR(100) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `players` (
+        `player_id` MEDIUMINT UNSIGNED PRIMARY KEY,
+        `name` VARCHAR(100) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `venues` (
+        `venue_id` SMALLINT UNSIGNED PRIMARY KEY,
+        `name` VARCHAR(255) NOT NULL UNIQUE,
+        `city` VARCHAR(50)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `matches` (
+        `match_id` INT UNSIGNED PRIMARY KEY,
+        `format_id` TINYINT UNSIGNED NOT NULL,
+        `season` VARCHAR(10),
+        `venue_id` SMALLINT UNSIGNED,
+        `team1_id` SMALLINT UNSIGNED,
+        `team2_id` SMALLINT UNSIGNED,
+        `toss_winner_id` SMALLINT UNSIGNED,
+        `toss_decision` VARCHAR(10),
+        `winner_id` SMALLINT UNSIGNED
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `player_of_match` (
+        `match_id` INT UNSIGNED NOT NULL,
+        `player_id` MEDIUMINT UNSIGNED NOT NULL,
+        PRIMARY KEY (`match_id`, `player_id`)
+    )
+    """,
+]
+
+# winner_id is NULL for a draw, tie or no result, player_out_id is NULL when no wicket fell #
+_DELIVERIES_DDL = """
+    CREATE TABLE IF NOT EXISTS `deliveries` (
+        `format_id` TINYINT UNSIGNED NOT NULL,
+        `match_id` INT UNSIGNED NOT NULL,
+        `innings` TINYINT UNSIGNED NOT NULL,
+        `over_no` SMALLINT UNSIGNED NOT NULL,
+        `ball` TINYINT UNSIGNED NOT NULL,
+        `batting_team_id` SMALLINT UNSIGNED,
+        `batter_id` MEDIUMINT UNSIGNED,
+        `bowler_id` MEDIUMINT UNSIGNED,
+        `non_striker_id` MEDIUMINT UNSIGNED,
+        `runs_batter` TINYINT UNSIGNED NOT NULL,
+        `runs_extras` TINYINT UNSIGNED NOT NULL,
+        `runs_total` TINYINT UNSIGNED NOT NULL,
+        `player_out_id` MEDIUMINT UNSIGNED,
+        PRIMARY KEY (`format_id`, `match_id`, `innings`, `over_no`, `ball`)
+    )
+"""
+
+_DELIVERIES_PARTITIONS = """
+    PARTITION BY LIST (`format_id`) (
+        PARTITION p_test VALUES IN (1),
+        PARTITION p_odi VALUES IN (2),
+        PARTITION p_t20 VALUES IN (3),
+        PARTITION p_ipl VALUES IN (4)
+    )
+"""
+
+# the lookups of STAR_SQL_QUERIES : per format player totals, per format match counts and per match runs #
+INDEXES = {
+    "ix_deliveries_batter": ("deliveries", "`format_id`, `batter_id`, `runs_batter`"),
+    "ix_deliveries_bowler": ("deliveries", "`format_id`, `bowler_id`, `player_out_id`"),
+    "ix_deliveries_match_runs": ("deliveries", "`match_id`, `runs_total`"),
+    "ix_matches_format_venue": ("matches", "`format_id`, `venue_id`"),
+    "ix_matches_format_toss": ("matches", "`format_id`, `toss_winner_id`, `toss_decision`, `winner_id`"),
+    "ix_matches_format_season": ("matches", "`format_id`, `season`"),
+    "ix_player_of_match_player": ("player_of_match", "`player_id`, `match_id`"),
+}
+
+
+def create_tables(conn):
+    """Creates the star schema tables (the deliveries partitions are MySQL only) and the format rows."""
+    cursor = conn.cursor()
+    for statement in _DDL:
+        cursor.execute(statement)
+    deliveries_ddl = _DELIVERIES_DDL if db_loader._is_sqlite(conn) else _DELIVERIES_DDL + _DELIVERIES_PARTITIONS
+    cursor.execute(deliveries_ddl)
+    db_loader.create_indexes(conn, INDEXES)
+    cursor.execute("SELECT `format_id` FROM `formats`")
+    existing = {row[0] for row in cursor.fetchall()}
+    ph = db_loader._placeholder(conn)
+    for name, format_id in FORMATS.items():
+        if format_id not in existing:
+            cursor.execute(f"INSERT INTO `formats` (`format_id`, `name`) VALUES ({ph}, {ph})", (format_id, name))
+    conn.commit()
+    cursor.close()
+
+
+def load_dimensions(conn):
+    """Returns the {name: id} mapping of the teams, players and venues dimensions."""
+    cursor = conn.cursor()
+    dims = {}
+    for table, id_col in (("teams", "team_id"), ("players", "player_id"), ("venues", "venue_id")):
+        cursor.execute(f"SELECT `name`, `{id_col}` FROM `{table}`")
+        dims[table] = dict(cursor.fetchall())
+    cursor.close()
+    return dims
+
+
+def _add_names(conn, dims, table, names, cities=None):
+    """Gives every name not yet in the dimension the next free id and inserts it."""
+    mapping = dims[table]
+    new_names = [name for name in pd.unique(names) if isinstance(name, str) and name and name not in mapping]
+    if not new_names:
+        return
+    next_id = max(mapping.values(), default=0) + 1
+    id_col = {"teams": "team_id", "players": "player_id", "venues": "venue_id"}[table]
+    rows = {id_col: range(next_id, next_id + len(new_names)), "name": new_names}
+    if table == "venues":
+        rows["city"] = [cities.get(name) for name in new_names]
+    db_loader.bulk_insert(conn, table, pd.DataFrame(rows), commit_every=None)
+    mapping.update(zip(new_names, rows[id_col]))
+
+
+def _split_names(series):
+    return series.dropna().str.split(", ").explode()
+
+
+def _load_chunk(conn, chunk, match_type, dims, seen, batch_size, commit_every):
+    format_id = FORMATS[match_type]
+    chunk = chunk.astype({col: object for col in chunk.select_dtypes("category").columns})
+    players, teams, venues = dims["players"], dims["teams"], dims["venues"]
+
+    # new names first, so every name below maps to an id #
+    wickets = chunk["wicket"][chunk["wicket"] != "None"]
+    _add_names(conn, dims, "players", pd.concat([chunk["batter"], chunk["bowler"], chunk["non_striker"],
+                                                  wickets, _split_names(chunk["player_of_match"])]))
+    winners = chunk["winner"][chunk["winner"] != "draw"]
+    _add_names(conn, dims, "teams", pd.concat([chunk["team"], chunk["toss_winner"], winners,
+                                                _split_names(chunk["teams"])]))
+    cities = chunk.dropna(subset=["city"]).drop_duplicates("venue").set_index("venue")["city"].to_dict()
+    _add_names(conn, dims, "venues", chunk["venue"], cities)
+
+    # one row per match, matches already written from an earlier chunk are skipped #
+    match_rows = chunk.drop_duplicates("match_id")
+    match_rows = match_rows[~match_rows["match_id"].isin(seen)]
+    seen.update(match_rows["match_id"])
+    if not match_rows.empty:
+        sides = match_rows["teams"].fillna("").str.split(", ", n=1, expand=True).reindex(columns=[0, 1])
+        matches = pd.DataFrame({
+            "match_id": match_rows["match_id"].astype(int),
+            "format_id": format_id,
+            "season": match_rows["season"],
+            "venue_id": match_rows["venue"].map(venues).astype("Int64"),
+            "team1_id": sides[0].map(teams).astype("Int64"),
+            "team2_id": sides[1].map(teams).astype("Int64"),
+            "toss_winner_id": match_rows["toss_winner"].map(teams).astype("Int64"),
+            "toss_decision": match_rows["toss_decision"],
+            "winner_id": match_rows["winner"].map(teams).astype("Int64"),
+        })
+        db_loader.bulk_insert(conn, "matches", matches, batch_size, commit_every=None)
+
+        awards = match_rows[["match_id", "player_of_match"]].dropna()
+        awards = awards.assign(player_of_match=awards["player_of_match"].str.split(", ")).explode("player_of_match")
+        awards = pd.DataFrame({
+            "match_id": awards["match_id"].astype(int),
+            "player_id": awards["player_of_match"].map(players).astype("Int64"),
+        }).dropna().drop_duplicates()
+        db_loader.bulk_insert(conn, "player_of_match", awards, batch_size, commit_every=None)
+
+    deliveries = pd.DataFrame({
+        "format_id": format_id,
+        "match_id": chunk["match_id"].astype(int),
+        "innings": chunk["innings"],
+        "over_no": chunk["over"],
+        "ball": chunk["ball"],
+        "batting_team_id": chunk["team"].map(teams).astype("Int64"),
+        "batter_id": chunk["batter"].map(players).astype("Int64"),
+        "bowler_id": chunk["bowler"].map(players).astype("Int64"),
+        "non_striker_id": chunk["non_striker"].map(players).astype("Int64"),
+        "runs_batter": chunk["runs_batter"],
+        "runs_extras": chunk["runs_extras"],
+        "runs_total": chunk["runs_total"],
+        "player_out_id": chunk["wicket"].map(players).astype("Int64"),
+    })
+    return db_loader.bulk_insert(conn, "deliveries", deliveries, batch_size, commit_every)
+
+
+def delete_matches(conn, match_ids, chunk_size=1000):
+    """Removes every row of the given matches from the fact tables."""
+    match_ids = [int(match_id) for match_id in match_ids]
+    for table_name in ("deliveries", "player_of_match", "matches"):
+        db_loader.delete_matches(conn, table_name, match_ids, chunk_size)
+
+
+def load_star(conn, store_dir, match_type, match_ids=None, dims=None,
+              batch_size=db_loader.DEFAULT_BATCH_SIZE, commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Loads the deliveries of one match type from the match store into the star schema,
+    replacing the given matches (all matches of that type when match_ids is None).
+    Returns the number of deliveries loaded."""
+    dims = dims if dims is not None else load_dimensions(conn)
+    start = time.perf_counter()
+    if match_ids is None:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT `match_id` FROM `matches` WHERE `format_id` = {FORMATS[match_type]}")
+        delete_matches(conn, [row[0] for row in cursor.fetchall()])
+        cursor.close()
+    else:
+        delete_matches(conn, match_ids)
+
+    rows = 0
+    seen = set()
+    for chunk in match_store.iter_chunks(store_dir, columns=cricsheet_ingest.COLUMNS,
+                                         formats=[match_type], match_ids=match_ids):
+        rows += _load_chunk(conn, chunk, match_type, dims, seen, batch_size, commit_every)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed else float(rows)
+    print(f"{rows} {match_type} deliveries loaded into 'deliveries' in {elapsed:.1f}s ({rate:,.0f} rows/sec).")
+    return rows
+
+
+def load_all_star(conn, store_dir, full=False, batch_size=db_loader.DEFAULT_BATCH_SIZE,
+                  commit_every=db_loader.DEFAULT_COMMIT_EVERY):
+    """Loads every match type from the match store into the star schema, the matches of the
+    last ingest run by default or every match with full=True.
+    Returns the number of deliveries loaded for each match type."""
+    create_tables(conn)
+    dims = load_dimensions(conn)
+    delta = None if full else cricsheet_ingest.last_run_matches(store_dir)
+    loaded = {}
+    for match_type in FORMATS:
+        match_ids = None if full else delta[match_type]
+        if match_ids == []:
+            print(f"No new or changed {match_type} matches to load.")
+            continue
+        loaded[match_type] = load_star(conn, store_dir, match_type, match_ids, dims, batch_size, commit_every)
+    scorecards.load_all_scorecards(conn, store_dir, full, batch_size, commit_every)
+    rollups.load_all_rollups(conn, store_dir, full, batch_size, commit_every)
+    db_loader.bump_data_version(conn)
+    return loaded
+
+
+# The 20 insights of insights.py written against the star schema.
+# Counts "of matches" are counted once per match from the matches table, not once per delivery,
+# and individual scores / centuries / bowler's wickets / bowling averages come from the innings scorecards
+# (run outs, retirements, ... are not bowler's wickets, see scorecards.py).
+# Every query ends on an ORDER BY of the columns it returns, so a page of it (insights.page) keeps its order.
+STAR_SQL_QUERIES = {
+    "Top 10 batsmen by total runs in ODI matches": """
+        SELECT p.name AS batter, t.total_runs
+        FROM (
+            SELECT batter_id, SUM(runs_batter) AS total_runs
+            FROM deliveries
+            WHERE format_id = 2
+            GROUP BY batter_id
+            ORDER BY total_runs DESC, batter_id
+            LIMIT 10
+        ) AS t
+        JOIN players p ON p.player_id = t.batter_id
+        ORDER BY total_runs DESC, batter;
+    """,
+    "Leading wicket-takers in T20 matches": """
+        SELECT bowler, SUM(wickets) AS total_wickets
+        FROM bowling_scorecards
+        WHERE format = 'T20'
+        GROUP BY bowler
+        HAVING SUM(wickets) > 0
+        ORDER BY total_wickets DESC, bowler
+        LIMIT 10;
+    """,
+    "Team with the highest win percentage in Test cricket": """
+        SELECT
+            t.name AS team,
+            100.0 * SUM(CASE WHEN m.winner_id = t.team_id THEN 1 ELSE 0 END) / COUNT(*) AS win_percentage
+        FROM matches m
+        JOIN teams t ON t.team_id IN (m.team1_id, m.team2_id)
+        WHERE m.format_id = 1
+        GROUP BY t.team_id, t.name
+        ORDER BY win_percentage DESC, team
+        LIMIT 1;
+    """,
+    "Total number of centuries across all match types": """
+        SELECT format AS match_type, batter, COUNT(*) AS centuries
+        FROM batting_scorecards
+        WHERE runs >= 100
+        GROUP BY format, batter
+        ORDER BY centuries DESC, match_type, batter;
+    """,
+    "Most frequent player of the match across all formats": """
+        SELECT p.name AS player_of_match, COUNT(*) AS count
+        FROM player_of_match pom
+        JOIN players p ON p.player_id = pom.player_id
+        GROUP BY p.player_id, p.name
+        ORDER BY count DESC, player_of_match
+        LIMIT 1;
+    """,
+    "Bowlers with the best average in ODI (min 50 wickets)": """
+        SELECT
+            bowler,
+            SUM(runs) AS runs_conceded,
+            SUM(wickets) AS wickets_taken,
+            1.0 * SUM(runs) / SUM(wickets) AS bowling_average
+        FROM bowling_scorecards
+        WHERE format = 'ODI'
+        GROUP BY bowler
+        HAVING SUM(wickets) >= 50
+        ORDER BY bowling_average ASC, bowler
+        LIMIT 10;
+    """,
+    "Most common venue for IPL matches": """
+        SELECT v.name AS venue, COUNT(*) AS match_count
+        FROM matches m
+        JOIN venues v ON v.venue_id = m.venue_id
+        WHERE m.format_id = 4
+        GROUP BY v.venue_id, v.name
+        ORDER BY match_count DESC, venue
+        LIMIT 1;
+    """,
+    "Teams that have won the most tosses in Test matches": """
+        SELECT t.name AS toss_winner, COUNT(*) AS tosses_won
+        FROM matches m
+        JOIN teams t ON t.team_id = m.toss_winner_id
+        WHERE m.format_id = 1
+        GROUP BY t.team_id, t.name
+        ORDER BY tosses_won DESC, toss_winner
+        LIMIT 5;
+    """,
+    "Most frequent toss decision in ODI matches": """
+        SELECT toss_decision, COUNT(*) AS decision_count
+        FROM matches
+        WHERE format_id = 2
+        GROUP BY toss_decision
+        ORDER BY decision_count DESC, toss_decision
+        LIMIT 1;
+    """,
+    "Number of matches played in each season across all formats": """
+        SELECT m.season, f.name AS match_type, COUNT(*) AS matches_played
+        FROM matches m
+        JOIN formats f ON f.format_id = m.format_id
+        GROUP BY m.season, f.name
+        ORDER BY season, match_type;
+    """,
+    "City with the most number of cricket matches": """
+        SELECT v.city, COUNT(*) AS match_count
+        FROM matches m
+        JOIN venues v ON v.venue_id = m.venue_id
+        WHERE v.city IS NOT NULL
+        GROUP BY v.city
+        ORDER BY match_count DESC, city
+        LIMIT 1;
+    """,
+    "Teams that have won after losing the toss in T20 matches": """
+        SELECT t.name AS winner, COUNT(*) AS wins_after_losing_toss
+        FROM matches m
+        JOIN teams t ON t.team_id = m.winner_id
+        WHERE m.format_id = 3 AND m.toss_winner_id <> m.winner_id
+        GROUP BY t.team_id, t.name
+        ORDER BY wins_after_losing_toss DESC, winner;
+    """,
+    "Average runs scored per over in IPL matches": """
+        SELECT 1.0 * SUM(over_runs) / COUNT(*) AS average_runs_per_over
+        FROM (
+            SELECT SUM(runs_total) AS over_runs
+            FROM deliveries
+            WHERE format_id = 4
+            GROUP BY match_id, innings, over_no
+        ) AS overs;
+    """,
+    "Players who have been player of the match in the most number of seasons": """
+        SELECT p.name AS player_of_match, COUNT(DISTINCT m.season) AS seasons_as_pom
+        FROM player_of_match pom
+        JOIN matches m ON m.match_id = pom.match_id
+        JOIN players p ON p.player_id = pom.player_id
+        GROUP BY p.player_id, p.name
+        ORDER BY seasons_as_pom DESC, player_of_match
+        LIMIT 10;
+    """,
+    "Number of drawn matches in Test cricket": """
+        SELECT COUNT(*) AS drawn_matches
+        FROM matches
+        WHERE format_id = 1 AND winner_id IS NULL;
+    """,
+    "Top 5 batsmen with most runs in IPL": """
+        SELECT p.name AS batter, t.total_runs
+        FROM (
+            SELECT batter_id, SUM(runs_batter) AS total_runs
+            FROM deliveries
+            WHERE format_id = 4
+            GROUP BY batter_id
+            ORDER BY total_runs DESC, batter_id
+            LIMIT 5
+        ) AS t
+        JOIN players p ON p.player_id = t.batter_id
+        ORDER BY total_runs DESC, batter;
+    """,
+    "Top 5 bowlers with most wickets in IPL": """
+        SELECT bowler, SUM(wickets) AS total_wickets
+        FROM bowling_scorecards
+        WHERE format = 'IPL'
+        GROUP BY bowler
+        HAVING SUM(wickets) > 0
+        ORDER BY total_wickets DESC, bowler
+        LIMIT 5;
+    """,
+    "Match with the highest total runs scored (across all formats)": """
+        SELECT f.name AS match_type, m.season, t1.name AS team1, t2.name AS team2, r.total_runs
+        FROM (
+            SELECT match_id, SUM(runs_total) AS total_runs
+            FROM deliveries
+            GROUP BY match_id
+            ORDER BY total_runs DESC, match_id
+            LIMIT 1
+        ) AS r
+        JOIN matches m ON m.match_id = r.match_id
+        JOIN formats f ON f.format_id = m.format_id
+        LEFT JOIN teams t1 ON t1.team_id = m.team1_id
+        LEFT JOIN teams t2 ON t2.team_id = m.team2_id
+        ORDER BY total_runs DESC, match_type;
+    """,
+    "Venue with the most number of Test matches": """
+        SELECT v.name AS venue, COUNT(*) AS match_count
+        FROM matches m
+        JOIN venues v ON v.venue_id = m.venue_id
+        WHERE m.format_id = 1
+        GROUP BY v.venue_id, v.name
+        ORDER BY match_count DESC, venue
+        LIMIT 1;
+    """,
+    "Batsman with the highest individual score in ODI": """
+        SELECT batter, runs AS highest_score
+        FROM batting_scorecards
+        WHERE format = 'ODI'
+        ORDER BY highest_score DESC, batter
+        LIMIT 1;
+    """,
+}
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the root of the repository #
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus_generator  # noqa: E402
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A small synthetic Cricsheet corpus (no Test matches, they are the slowest to ingest)."""
+    directory = tmp_path / "corpus"
+    corpus_generator.generate(str(directory), matches=4, formats=["ODI", "T20", "IPL"], seasons=3, seed=7)
+    return directory
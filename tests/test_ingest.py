@@ -0,0 +1,87 @@
+import json
+import zipfile
+
+import pytest
+
+import cricsheet_ingest
+import match_store
+import scorecards
+
+
+def _add_match(zip_path, match_id, match):
+    with zipfile.ZipFile(zip_path, "a") as zip_ref:
+        zip_ref.writestr(f"{match_id}.json", json.dumps(match))
+
+
+def test_malformed_match_is_skipped(corpus, tmp_path):
+    with zipfile.ZipFile(corpus / "t20s_json.zip") as zip_ref:
+        name = zip_ref.namelist()[0]
+        match = json.loads(zip_ref.read(name))
+    # fails part way, after some of its deliveries were parsed #
+    match["innings"][0]["overs"][2]["deliveries"][3]["runs"] = None
+    _add_match(corpus / "t20s_json.zip", "999", match)
+
+    store = tmp_path / "store"
+    written = cricsheet_ingest.ingest_to_store(str(corpus), str(store), workers=1)
+
+    assert "999" not in cricsheet_ingest.load_manifest(str(store))
+    for name in match_store.SCHEMAS:
+        match_ids = set(match_store.read(str(store), columns=["match_id"], name=name)["match_id"])
+        assert "999" not in match_ids
+    assert written["T20"] == len(match_store.read(str(store), columns=["match_id"], formats=["T20"]))
+    batting = match_store.read(str(store), columns=["match_id"], name=scorecards.BATTING)
+    assert len(batting)
+
+
+def _snapshot(store):
+    """The deliveries, scorecards and rollups of a store, in a comparable order."""
+    import rollups
+    snapshot = {}
+    for name in match_store.SCHEMAS:
+        frame = match_store.read(str(store), name=name)
+        frame = frame.astype({col: str for col in frame.columns if str(frame[col].dtype) == "category"})
+        snapshot[name] = frame.sort_values(list(frame.columns)).reset_index(drop=True)
+    for name in rollups.ROLLUPS:
+        frame = rollups.read(str(store), name)
+        snapshot[name] = frame.sort_values(list(frame.columns)).reset_index(drop=True)
+    return snapshot
+
+
+def _assert_same(left, right):
+    import pandas as pd
+    assert left.keys() == right.keys()
+    for name in left:
+        pd.testing.assert_frame_equal(left[name], right[name], check_dtype=False, check_categorical=False)
+
+
+@pytest.mark.parametrize("failing", ["match_store.compact", "rollups.update"])
+def test_interrupted_run_is_recovered(corpus, tmp_path, monkeypatch, failing):
+    store = tmp_path / "store"
+    names = sorted(zipfile.ZipFile(corpus / "odis_json.zip").namelist())
+    # a first run without the last ODI, the interrupted run adds it #
+    with zipfile.ZipFile(corpus / "odis_json.zip") as zip_ref:
+        last = json.loads(zip_ref.read(names[-1]))
+    _remove_member(corpus / "odis_json.zip", names[-1])
+    cricsheet_ingest.ingest_to_store(str(corpus), str(store), workers=1)
+    _add_match(corpus / "odis_json.zip", cricsheet_ingest.match_id_for(names[-1]), last)
+
+    module, function = failing.split(".")
+    def _crash(*args, **kwargs):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(getattr(cricsheet_ingest, module), function, _crash)
+        with pytest.raises(KeyboardInterrupt):
+            cricsheet_ingest.ingest_to_store(str(corpus), str(store), workers=1)
+
+    cricsheet_ingest.ingest_to_store(str(corpus), str(store), workers=1)
+    rebuilt = tmp_path / "rebuilt"
+    cricsheet_ingest.ingest_to_store(str(corpus), str(rebuilt), workers=1, full=True)
+    _assert_same(_snapshot(store), _snapshot(rebuilt))
+
+
+def _remove_member(zip_path, name):
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        members = {info.filename: zip_ref.read(info) for info in zip_ref.infolist() if info.filename != name}
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for member, content in members.items():
+            zip_ref.writestr(member, content)
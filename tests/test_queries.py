@@ -0,0 +1,112 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import corpus_generator
+import cricsheet_ingest
+import db_loader
+import insights
+import query_backends
+
+
+def _load(corpus, store, database, full=True):
+    cricsheet_ingest.ingest_to_store(str(corpus), str(store), workers=1, full=full)
+    conn = sqlite3.connect(str(database))
+    try:
+        db_loader.load_all(conn, str(store), full=full)
+    finally:
+        conn.close()
+
+
+def _results(backend):
+    """{insight: result} of every insight with its default parameters."""
+    conn = backend.connect()
+    try:
+        results = {}
+        for name, insight in insights.queries_for("wide").items():
+            sql, params = insight.compile(placeholder=backend.placeholder)
+            results[name] = backend.run(conn, sql, params)
+        return results
+    finally:
+        backend.close(conn)
+
+
+def _comparable(frame):
+    """frame as strings in a fixed row order, numbers as rounded floats (the engines type them differently)."""
+    frame = frame.copy()
+    for col in frame.columns:
+        numbers = pd.to_numeric(frame[col], errors="coerce")
+        if numbers.notna().sum() == frame[col].notna().sum():
+            frame[col] = numbers.astype(float).round(6)
+    frame = frame.astype(str)
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def _assert_same_results(left, right):
+    assert left.keys() == right.keys()
+    for name in left:
+        pd.testing.assert_frame_equal(_comparable(left[name]), _comparable(right[name]), obj=name)
+
+
+@pytest.fixture
+def loaded(corpus, tmp_path):
+    store, database = tmp_path / "store", tmp_path / "cricket.db"
+    _load(corpus, store, database)
+    return store, database
+
+
+def test_incremental_refresh_matches_full_rebuild(corpus, tmp_path):
+    store, database = tmp_path / "store", tmp_path / "cricket.db"
+    _load(corpus, store, database)
+    # more matches per format : new matches, and the same match ids with other contents #
+    corpus_generator.generate(str(corpus), matches=6, formats=["ODI", "T20", "IPL"], seasons=3, seed=11)
+    _load(corpus, store, database, full=False)
+
+    rebuilt_store, rebuilt_database = tmp_path / "rebuilt", tmp_path / "rebuilt.db"
+    _load(corpus, rebuilt_store, rebuilt_database)
+    _assert_same_results(_results(query_backends.SQLiteBackend(str(database))),
+                         _results(query_backends.SQLiteBackend(str(rebuilt_database))))
+
+
+def test_pages_add_up_to_the_full_result(loaded):
+    backend = query_backends.SQLiteBackend(str(loaded[1]))
+    conn = backend.connect()
+    try:
+        for name, insight in insights.queries_for("wide").items():
+            sql, params = insight.compile({"limit": 50}, placeholder=backend.placeholder)
+            full = backend.run(conn, sql, params)
+            # the page query repeats the ORDER BY, on the columns the insight returns #
+            keys = insights.order_keys(sql.strip().rstrip(";"))
+            assert keys is None or all(column in full.columns for column, _ in keys), name
+            pages, after, offset = [], None, 0
+            while True:
+                page_sql, page_params = insights.page(sql, params, 3, after, offset, backend.placeholder)
+                rows = backend.run(conn, page_sql, page_params)
+                if rows.empty:
+                    break
+                pages.append(rows)
+                offset += len(rows)
+                after = insights.after_values(sql, rows) if insight.unique_order else None
+            paged = pd.concat(pages, ignore_index=True) if pages else full.iloc[:0]
+            if insight.unique_order:
+                pd.testing.assert_frame_equal(paged, full, obj=name)
+            else:
+                pd.testing.assert_frame_equal(_comparable(paged), _comparable(full), obj=name)
+    finally:
+        backend.close(conn)
+
+
+@pytest.mark.parametrize("schema", ["wide", "star"])
+def test_every_ordered_insight_has_order_keys(schema):
+    for name, insight in insights.queries_for(schema).items():
+        for sql in filter(None, [insight.sql, insight.detail_sql]):
+            if "ORDER BY" in sql.upper():
+                assert insights.order_keys(sql.strip().rstrip(";")), name
+
+
+def test_duckdb_matches_sqlite(loaded):
+    pytest.importorskip("duckdb")
+    store, database = loaded
+    _assert_same_results(_results(query_backends.DuckDBBackend(str(store))),
+                         _results(query_backends.SQLiteBackend(str(database))))
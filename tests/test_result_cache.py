@@ -0,0 +1,26 @@
+import pandas as pd
+
+import result_cache
+
+
+def test_parameter_types_are_distinct_keys():
+    cache = result_cache.ResultCache()
+    cache.put("sqlite", "v1", "SELECT ?", pd.DataFrame({"x": [1]}), [2019])
+    cache.put("sqlite", "v1", "SELECT ?", pd.DataFrame({"x": [2]}), [None])
+    assert cache.get("sqlite", "v1", "SELECT ?", ["2019"]) is None
+    assert cache.get("sqlite", "v1", "SELECT ?", ["None"]) is None
+    assert cache.get("sqlite", "v1", "SELECT ?", [2019])["x"][0] == 1
+    assert cache.get("sqlite", "v1", "SELECT ?", [None])["x"][0] == 2
+
+
+def test_older_version_does_not_evict_newer(tmp_path):
+    cache = result_cache.ResultCache(disk_dir=str(tmp_path))
+    cache.put("sqlite", "v1", "SELECT 1", pd.DataFrame({"x": [1]}))
+    cache.put("sqlite", "v2", "SELECT 1", pd.DataFrame({"x": [2]}))
+    # a session that read the data version before the load #
+    cache.put("sqlite", "v1", "SELECT 2", pd.DataFrame({"x": [3]}))
+
+    assert cache.get("sqlite", "v2", "SELECT 1")["x"][0] == 2
+    assert cache.get("sqlite", "v1", "SELECT 2") is None
+    restarted = result_cache.ResultCache(disk_dir=str(tmp_path))
+    assert restarted.get("sqlite", "v2", "SELECT 1")["x"][0] == 2
@@ -0,0 +1,37 @@
+import pytest
+
+import scorecards
+
+
+def _delivery(batter, bowler, kind=None):
+    delivery = {"batter": batter, "non_striker": "B", "bowler": bowler,
+                "runs": {"batter": 0, "extras": 0, "total": 0}}
+    if kind:
+        delivery["wickets"] = [{"player_out": batter, "kind": kind}]
+    return delivery
+
+
+def _scorecards(kind):
+    match = {"info": {"season": "2020", "teams": ["X", "Y"]},
+             "innings": [{"team": "X", "overs": [{"over": 0, "deliveries": [_delivery("A", "Z", kind)]}]}]}
+    batches = scorecards.empty_batches()
+    scorecards.add_match(match, "1", batches)
+    batting = batches[scorecards.BATTING]
+    dismissed = dict(zip(batting["batter"], batting["dismissed"]))["A"]
+    return dismissed, batches[scorecards.BOWLING]["wickets"][0]
+
+
+@pytest.mark.parametrize("kind, dismissed, wickets", [
+    ("bowled", 1, 1),
+    ("caught", 1, 1),
+    ("run out", 1, 0),
+    ("retired out", 1, 0),
+    ("obstructing the field", 1, 0),
+    ("handled the ball", 1, 0),
+    ("hit the ball twice", 1, 0),
+    ("timed out", 1, 0),
+    ("retired hurt", 0, 0),
+    ("retired not out", 0, 0),
+])
+def test_wicket_kinds(kind, dismissed, wickets):
+    assert _scorecards(kind) == (dismissed, wickets)